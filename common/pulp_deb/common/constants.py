@@ -82,6 +82,11 @@ CONTENTS_FILENAME = 'Contents-%(arch)s.gz'
 PACKAGES_FILENAME = 'Packages.gz'
 SOURCES_FILENAME = 'Sources.gz'
 
+# Names of the file listing the indexes of a distribution, in the order they
+# are looked for. InRelease is left out as long as the signature it wraps is
+# not verified.
+RELEASE_FILENAMES = ('Release',)
+
 # -- progress states ----------------------------------------------------------
 
 STATE_NOT_STARTED = 'not-started'
@@ -89,8 +94,9 @@ STATE_RUNNING = 'running'
 STATE_SUCCESS = 'success'
 STATE_FAILED = 'failed'
 STATE_SKIPPED = 'skipped'
+STATE_CANCELLED = 'cancelled'
 
-COMPLETE_STATES = (STATE_SUCCESS, STATE_FAILED, STATE_SKIPPED)
+COMPLETE_STATES = (STATE_SUCCESS, STATE_FAILED, STATE_SKIPPED, STATE_CANCELLED)
 
 CONFIG_REPO = [CONFIG_URL, CONFIG_DIST, CONFIG_COMPONENT, CONFIG_ARCH]
 
@@ -98,7 +104,8 @@ URL_BASE = '%(url)s/dists/%(dist)s'
 URL_COMPONENT_BASE = URL_BASE + '/%(component)s'
 URLS = {
     'packages': URL_COMPONENT_BASE + '/binary-%(arch)s/' + PACKAGES_FILENAME,
-    'sources': URL_COMPONENT_BASE + '/source/' + SOURCES_FILENAME
+    'sources': URL_COMPONENT_BASE + '/source/' + SOURCES_FILENAME,
+    'release': URL_BASE + '/%(filename)s'
 }
 
 DEB_FILENAME = 'pool/%(component)s/%(prefix)s/%(source_name)s/%(name)s'
@@ -115,6 +122,82 @@ CONFIG_QUERIES = 'queries'
 CONFIG_REMOVE_MISSING = 'remove_missing'
 DEFAULT_REMOVE_MISSING = False
 
+# Maximum number of files downloaded in parallel, in total and from a single
+# host
+CONFIG_MAX_DOWNLOADS = 'max_downloads'
+DEFAULT_MAX_DOWNLOADS = 5
+CONFIG_MAX_DOWNLOADS_PER_HOST = 'max_downloads_per_host'
+DEFAULT_MAX_DOWNLOADS_PER_HOST = 2
+
+# Bandwidth limits in bytes per second, for a single sync and for all syncs
+# running in the same worker process; unlimited if not specified
+CONFIG_MAX_SPEED = 'max_speed'
+CONFIG_WORKER_MAX_SPEED = 'worker_max_speed'
+
+# Number of times a transfer failing for a transient reason is retried, and
+# the bound of the randomized wait before the first retry in seconds, which
+# doubles with each retry
+CONFIG_MAX_RETRIES = 'max_retries'
+DEFAULT_MAX_RETRIES = 3
+CONFIG_RETRY_DELAY = 'retry_delay'
+DEFAULT_RETRY_DELAY = 2
+
+# Variant of the downloader to use for the repository URL's type, e.g.
+# "event" for the epoll driven HTTP downloader; the plain downloader of the
+# type is used if not specified
+CONFIG_DOWNLOAD_DRIVER = 'download_driver'
+
+# Whether indexes cached by the previous sync are updated with the diffs
+# published next to them (Packages.diff/Index) instead of being retrieved
+# whole
+CONFIG_PDIFFS = 'pdiffs'
+DEFAULT_PDIFFS = True
+
+# Directory of the cache of indexes and package files keyed by their
+# checksum, which never need to be retrieved again once cached; all
+# repositories using the same directory share it. By default all
+# repositories use the directory below, relative to the storage root of the
+# Pulp server, so the files are hardlinked in and out of it. It is created
+# when the first file is added to the cache.
+CONFIG_CACHE_DIR = 'cache_dir'
+DEFAULT_CACHE_SUBDIR = 'cache/deb'
+
+# Size in bytes the cache may take before its least recently used files are
+# removed. Only the files the cache holds alone count: those still hardlinked
+# to the storage or a working directory take no space of their own, and
+# removing them would free nothing.
+CONFIG_CACHE_SIZE = 'cache_size'
+DEFAULT_CACHE_SIZE = 10 * 1024 * 1024 * 1024
+
+# Whether the network timings of the transfers are written to a JSON file in
+# the repository working directory at the end of the sync, in addition to
+# their summary in the sync report
+CONFIG_DUMP_TIMINGS = 'dump_timings'
+DEFAULT_DUMP_TIMINGS = False
+
+# Number of worker processes parsing the indexes of the distribution in
+# parallel. The workers are forked from the Pulp server process, so this is
+# opt-in: the indexes are parsed in the sync's own process if not specified
+# or set to 1.
+CONFIG_PARSE_WORKERS = 'parse_workers'
+
+# URLs of mirrors equivalent to the distribution's URL; transfers are spread
+# across all of them and moved to another one when they fail
+CONFIG_MIRRORS = 'mirrors'
+
+# How files of a local (file://) feed are brought into the storage. The
+# configured method is tried first and the later ones are used when the
+# filesystems do not support it: hardlink, reflink (shared data blocks),
+# copy_range (copied by the kernel) and finally copy.
+CONFIG_LOCAL_INGEST = 'local_ingest'
+LOCAL_INGEST_HARDLINK = 'hardlink'
+LOCAL_INGEST_REFLINK = 'reflink'
+LOCAL_INGEST_COPY_RANGE = 'copy_range'
+LOCAL_INGEST_COPY = 'copy'
+LOCAL_INGEST_METHODS = (LOCAL_INGEST_HARDLINK, LOCAL_INGEST_REFLINK,
+                        LOCAL_INGEST_COPY_RANGE, LOCAL_INGEST_COPY)
+DEFAULT_LOCAL_INGEST = LOCAL_INGEST_HARDLINK
+
 # -- distributor configuration keys -------------------------------------------
 
 # Controls if packages will be served insecurely or not
@@ -1,10 +1,19 @@
 import copy
+import logging
 from debian.deb822 import Packages, Sources
 
+try:
+    import apt_pkg
+except ImportError:
+    apt_pkg = None
+
 from pulp.common.compat import json
 from pulp_deb.common import constants, utils
 
 
+_LOG = logging.getLogger(__name__)
+
+
 UNIT_KEYS = ['package', 'version', 'maintainer']
 
 
@@ -16,12 +25,21 @@ SUPPORTED = {
 KEY_TO_NAME = [('source', 'Packages'), ('binary', 'Sources')]
 
 
+# Fields of a package kept apart from its paragraph, by the class of its
+# index; the others are parsed from the paragraph when asked for
+PACKAGE_FIELDS = {
+    Packages: ('package', 'version', 'maintainer', 'source', 'architecture',
+               'filename', 'size', 'md5sum', 'sha1', 'sha256'),
+    Sources: ('package', 'version', 'maintainer', 'directory'),
+}
+
+
 def get_deb822_cls(obj):
     """
     Get the deb822 class to use based on obj
     """
     if isinstance(obj, basestring):
-        key = obj.split('/')[-1][:-len('.gz')]
+        key = obj.split('/')[-1].split('.')[0]
     elif isinstance(obj, dict):
         # NOTE: Support a resource object
         if 'type' in obj:
@@ -34,9 +52,13 @@ def get_deb822_cls(obj):
     return SUPPORTED[key]
 
 
-def get_index_content(obj, **kw):
+def get_index_content(obj, empty_on_io=False):
     """
     Get the index content based on obj
+
+    :return: iterable over the lines of the index; a file object that
+             decompresses the index as it is read if obj refers to a file,
+             which the caller should close
     """
     path = obj
 
@@ -44,24 +66,195 @@ def get_index_content(obj, **kw):
     if isinstance(obj, list):
         return obj
     elif isinstance(obj, dict):
-        # NOTE: It's a resource with content inside...
+        # NOTE: It's a resource with content inside, as an iterable over its
+        # lines (e.g. a list or the in memory content of a downloader)
         if 'content' in obj:
             return obj['content']
         # NOTE: It's a resource with a path that should be read.
         elif 'path' in obj:
             path = obj['path']
-    # NOTE: It's just a path, read it
-    return utils._read(path, **kw)
+    # NOTE: It's just a path, open it
+    try:
+        return utils.open_index(path)
+    except IOError:
+        if empty_on_io:
+            return []
+        raise
 
 
 def _iter_paragraphs_path(obj, empty_on_io=False):
     # NOTE: Add exception here?
     type_cls = get_deb822_cls(obj)
     content = get_index_content(obj, empty_on_io=empty_on_io)
-    return type_cls.iter_paragraphs(content)
+    # The paragraphs are parsed as the lines are read; apt_pkg would read
+    # the descriptor of a compressed file as it is
+    try:
+        for paragraph in type_cls.iter_paragraphs(content, use_apt_pkg=False):
+            yield paragraph
+    finally:
+        if hasattr(content, 'read'):
+            content.close()
+
+
+# Parsers of indexes, see parse_index
+PARSER_APT = 'apt_pkg'
+PARSER_PYTHON = 'python'
+PARSERS = (PARSER_APT, PARSER_PYTHON)
+
+
+def parse_index(obj, empty_on_io=False, parser=None):
+    """
+    Parse an index into the text of its paragraphs and the values of their
+    PACKAGE_FIELDS, which can be passed between processes
+
+    The index is parsed by apt_pkg.TagFile when python-apt is installed and
+    can read the index file, and line by line in Python otherwise; both
+    give the same result.
+
+    :param obj: the index, see index_source
+
+    :param parser: one of PARSERS to use it only; the first of them that
+                   can parse the index if not given
+    :type parser: str
+
+    :return: (paragraph, fields) tuple of each paragraph, in the order of the
+             index; see Package.from_paragraph
+    :rtype: list
+    """
+    deb822_cls = get_deb822_cls(obj)
+    if parser in (None, PARSER_APT):
+        path = _index_path(obj)
+        if parser == PARSER_APT or (apt_pkg is not None and _apt_readable(path)):
+            try:
+                return _parse_apt(deb822_cls, path)
+            except (SystemError, TypeError), e:
+                if parser == PARSER_APT:
+                    raise
+                _LOG.warn('Parsing <%s> in Python, apt_pkg could not: %s' % (path, e))
+
+    content = get_index_content(obj, empty_on_io=empty_on_io)
+    try:
+        return list(_iter_package_paragraphs(deb822_cls, content))
+    finally:
+        if hasattr(content, 'read'):
+            content.close()
+
+
+def parse_index_source(source):
+    """
+    Parse an index in a worker process, see
+    Distribution.update_from_resources
+
+    :param source: the index, see index_source
+    :type source: dict
+
+    :return: the deb822 class of the index and its parsed paragraphs, see
+             parse_index
+    :rtype: tuple
+    """
+    return get_deb822_cls(source), parse_index(source)
+
+
+def _iter_package_paragraphs(deb822_cls, lines):
+    """
+    Split the lines of an index into paragraphs, picking the values of the
+    PACKAGE_FIELDS of each on the way. Values spanning several lines are
+    not picked; none of those fields does.
+    """
+    names = PACKAGE_FIELDS[deb822_cls]
+    paragraph = []
+    values = {}
+    for line in lines:
+        if not line or line.isspace():
+            if paragraph:
+                yield ''.join(paragraph), tuple([values.get(n) for n in names])
+                paragraph = []
+                values = {}
+            continue
+        if line[0] not in ' \t':
+            name, sep, value = line.partition(':')
+            name = name.lower()
+            if sep and name in names:
+                values[name] = _field_value(value)
+        paragraph.append(line)
+    if paragraph:
+        yield ''.join(paragraph), tuple([values.get(n) for n in names])
+
+
+def _index_path(obj):
+    """
+    Get the path of the index file obj refers to, None if it has its content
+    """
+    if isinstance(obj, basestring):
+        return obj
+    elif isinstance(obj, dict) and 'content' not in obj:
+        return obj.get('path')
+    return None
+
+
+def _apt_readable(path):
+    """
+    Tell whether apt_pkg can read an index file, whose decompressor it
+    picks by the extension of its name rather than by its content
+    """
+    if path is None:
+        return False
+    try:
+        compression = utils.detect_compression(path)
+    except IOError:
+        return False
+    return path[len(utils.strip_extension(path)):] == compression
+
+
+def _parse_apt(deb822_cls, path):
+    """
+    Parse an index file with apt_pkg.TagFile, see parse_index
+    """
+    if apt_pkg is None:
+        raise SystemError('python-apt is not installed')
+    names = PACKAGE_FIELDS[deb822_cls]
+    paragraphs = []
+    for section in apt_pkg.TagFile(path):
+        # The text of a section ends with the line separating it from the
+        # next one
+        text = str(section)
+        if text.endswith('\n\n'):
+            text = text[:-1]
+        values = [section.get(n) for n in names]
+        paragraphs.append((text, tuple([None if v is None else _field_value(v) for v in values])))
+    return paragraphs
+
+
+def _field_value(value):
+    """
+    Strip a value read from an index, decoding it only if it is not plain
+    ASCII, which compares equal to its unicode counterpart anyway
+    """
+    value = value.strip()
+    try:
+        value.decode('ascii')
+    except UnicodeDecodeError:
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+def index_source(resource):
+    """
+    Get the part of an index resource needed to parse it, without what
+    cannot be passed to another process
+
+    :return: dict with the 'type' and the 'path' or 'content' of the index
+    :rtype: dict
+    """
+    source = dict([(k, resource[k]) for k in ('type', 'path') if k in resource])
+    if 'content' in resource:
+        source['content'] = list(resource['content'])
+    return source
 
 
 class Model(object):
+    __slots__ = ()
+
     def __init__(self, **kw):
         self.data = kw
 
@@ -178,14 +371,31 @@ class Distribution(Model):
         kw['components'] = components
         super(Distribution, self).__init__(**kw)
 
-    def update_from_resources(self, resources):
+    def update_from_resources(self, resources, map_call=None):
         """
         Update each component in this Distribution from it's own indexes
+
+        :param resources: the retrieved indexes
+        :type resources: list
+
+        :param map_call: map function to parse the indexes with, e.g. the map
+                         method of a process pool to parse them in parallel;
+                         the packages are added in the order of the indexes
+                         either way. The indexes are parsed one after another
+                         if not given.
+        :type map_call: callable
         """
-        for resource in resources:
-            cmpt_name = resource['component']
-            cmpt = self.get_component(cmpt_name)
-            cmpt.update_from_index(resource)
+        if map_call is None:
+            for resource in resources:
+                cmpt_name = resource['component']
+                cmpt = self.get_component(cmpt_name)
+                cmpt.update_from_index(resource)
+            return
+
+        parsed = map_call(parse_index_source, [index_source(r) for r in resources])
+        for resource, (deb822_cls, paragraphs) in zip(resources, parsed):
+            cmpt = self.get_component(resource['component'])
+            cmpt.add_paragraphs(deb822_cls, paragraphs)
 
     def get_package_resources(self):
         resources = []
@@ -230,6 +440,21 @@ class Distribution(Model):
             indexes.extend(c.get_indexes())
         return indexes
 
+    def get_release_resources(self):
+        """
+        Get the resources of the files listing the indexes of this
+        Distribution, in the order they should be tried
+
+        :return: List of resources
+        :rtype: list
+        """
+        resources = []
+        for filename in constants.RELEASE_FILENAMES:
+            data = self.get_resource_data(type='release', filename=filename)
+            data['url'] = constants.URLS['release'] % data
+            resources.append(data)
+        return resources
+
     def get_component(self, name):
         """
         Get a component by name
@@ -294,6 +519,20 @@ class Component(Model):
         for p in packages:
             self.add_package(p)
 
+    def add_paragraphs(self, deb822_cls, paragraphs):
+        """
+        Add the packages of parsed paragraphs
+
+        :param deb822_cls: class of the index the paragraphs come from
+        :type deb822_cls: type
+
+        :param paragraphs: (paragraph, fields) tuples, see parse_index
+        :type paragraphs: list
+        """
+        self.data['packages'].extend([
+            Package.from_paragraph(deb822_cls, paragraph, fields, component=self)
+            for paragraph, fields in paragraphs])
+
     def update_from_index(self, data, **kw):
         """
         Updates this instance with packages in the given Packages file.
@@ -301,8 +540,7 @@ class Component(Model):
         :return: object representing the repository and all it's packages
         :rtype: Repository
         """
-        packages = _iter_paragraphs_path(data, **kw)
-        self.add_packages([{'deb822': p} for p in packages])
+        self.add_paragraphs(get_deb822_cls(data), parse_index(data, **kw))
 
     def update_from_indexes(self, data, **kw):
         """
@@ -365,26 +603,134 @@ class Component(Model):
 
 class Package(Model):
     """
-    A Pulp object sitting ontop of a deb822 object
+    A Pulp object sitting ontop of a deb822 paragraph
+
+    Only the PACKAGE_FIELDS are kept as values of their own. A package read
+    from an index keeps its paragraph as the text it was read from, and the
+    other fields are parsed from it on each access, see data; the text takes
+    a fraction of the memory of the parsed paragraph.
+
+    The views derived from the fields (key, unit_key, unit_metadata, files
+    and the normalized fields of to_dict) are computed once and kept until
+    the package is changed or clear_views is called.
     """
+    __slots__ = ('component', 'deb822_cls', 'paragraph', 'fields', 'views')
+
     def __init__(self, component=None, deb822=None, **kw):
         self.component = component
-        if isinstance(deb822, (Packages, Sources)):
-            self.data = deb822
-        else:
-            type_cls = get_deb822_cls(kw)
-            self.data = type_cls(kw)
+        if not isinstance(deb822, (Packages, Sources)):
+            deb822 = get_deb822_cls(kw)(kw)
+        self.deb822_cls = type(deb822)
+        self._set_paragraph(deb822)
+
+    @classmethod
+    def from_paragraph(cls, deb822_cls, paragraph, fields, component=None):
+        """
+        Create a package from the paragraph of an index
+
+        :param deb822_cls: class of the index, Packages or Sources
+        :type deb822_cls: type
+
+        :param paragraph: text of the paragraph
+        :type paragraph: str
+
+        :param fields: values of the PACKAGE_FIELDS of the class in the
+                       paragraph, None for those it does not have
+        :type fields: tuple
+
+        :rtype: Package
+        """
+        package = cls.__new__(cls)
+        package.component = component
+        package.deb822_cls = deb822_cls
+        package.paragraph = paragraph
+        package.fields = fields
+        package.views = None
+        return package
+
+    @property
+    def data(self):
+        """
+        All fields of the package; parsed again on each access if the
+        package was read from an index
+
+        :rtype: Packages or Sources
+        """
+        if isinstance(self.paragraph, basestring):
+            return self.deb822_cls(self.paragraph)
+        return self.paragraph
+
+    def field(self, key):
+        """
+        Get the value of one of the PACKAGE_FIELDS without parsing the
+        paragraph
+
+        :return: the value; None if the package does not have the field or
+                 it is not one of the PACKAGE_FIELDS
+        """
+        names = PACKAGE_FIELDS[self.deb822_cls]
+        key = key.lower()
+        if key in names:
+            return self.fields[names.index(key)]
+        return None
+
+    def __getitem__(self, key):
+        value = self.field(key)
+        if value is not None:
+            return value
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        data = self.data
+        data[key] = value
+        self._set_paragraph(data)
+
+    def update(self, data):
+        """
+        Updates the fields with the values in the given dict.
+        """
+        fields = self.data
+        fields.update(data)
+        self._set_paragraph(fields)
+
+    def _set_paragraph(self, deb822):
+        self.paragraph = deb822
+        self.fields = tuple([deb822.get(n) for n in PACKAGE_FIELDS[self.deb822_cls]])
+        self.clear_views()
+
+    def _view(self, name, compute):
+        """
+        Get a view derived from the fields, calling compute to get it the
+        first time
+        """
+        if self.views is None:
+            self.views = {}
+        elif name in self.views:
+            return self.views[name]
+        value = self.views[name] = compute()
+        return value
+
+    def clear_views(self):
+        """
+        Forget the views derived from the fields, e.g. to free their memory
+        once the package is imported
+        """
+        self.views = None
+
+    def __contains__(self, key):
+        return self.field(key) is not None or key.lower() in self.data
 
     @property
     def package_type(self):
-        if 'source' in self:
-            return 'package'
-        elif 'binary' in self:
-            return 'source'
+        return 'package' if self.deb822_cls is Packages else 'source'
 
     @property
     def source_name(self):
-        return self['source'] if self.package_type == 'package' else self.name
+        if self.package_type == 'package':
+            # Binary packages built from a source of the same name do not
+            # tell it
+            return self.field('source') or self.name
+        return self.name
 
     @property
     def name(self):
@@ -401,7 +747,8 @@ class Package(Model):
         """
         Get the key representing this package
         """
-        return constants.DEB_KEY % self.to_dict()
+        return self._view('key', lambda: constants.DEB_KEY % dict(
+            [(k, self[k]) for k in UNIT_KEYS]))
 
     @property
     def files(self):
@@ -414,6 +761,9 @@ class Package(Model):
             Example:
                 {'name': .., 'size': .., 'sha1': .., 'sha256': .., 'md5sum': ..}
         """
+        return [f.copy() for f in self._view('files', self._files)]
+
+    def _files(self):
         files = []
         if self.package_type == 'package':
             file_data = dict([(k, self[k]) \
@@ -421,20 +771,36 @@ class Package(Model):
             file_data['name'] = self['filename'].split('/')[-1]
             files.append(file_data)
         else:
-            for d in self['files']:
+            data = self._normalized()
+            for d in data['files']:
                 file_data = d.copy()
                 # Get checksum data as well...
                 for key in ['sha1', 'sha256']:
-                    for data in self['checksums-' + key]:
-                        if file_data['name'] == data['name']:
-                            file_data[key] = data[key]
+                    for checksum in data['checksums-' + key]:
+                        if file_data['name'] == checksum['name']:
+                            file_data[key] = checksum[key]
                 files.append(file_data)
         return files
 
+    @property
+    def size(self):
+        """
+        Total size in bytes of the files of this package as listed by the
+        index; a file without a listed size counts as empty
+        """
+        return sum([int(f.get('size') or 0) for f in self._view('files', self._files)])
+
     def data_to_dict(self):
         return dict(self.data)
 
-    def to_dict(self, full=True, **kw):
+    def _normalized(self):
+        """
+        Get the fields keyed by their lowercased name
+        """
+        return self._view('normalized',
+                          lambda: dict([(k.lower(), v) for k, v in self.data.items()]))
+
+    def to_dict(self, full=True, exclude=[], **kw):
         """
         Returns a dict view on the package in the same format as was parsed from
         update_from_dict.
@@ -442,8 +808,8 @@ class Package(Model):
         :return: dict view on the package
         :rtype: dict
         """
-        data = super(Package, self).to_dict(**kw)
-        data = dict([(k.lower(), v) for k, v in data.items()])
+        data = dict([(k, v) for k, v in self._normalized().items() if k not in exclude])
+        data.update([(k.lower(), v) for k, v in kw.items()])
 
         return data
 
@@ -476,17 +842,16 @@ class Package(Model):
         Returns the unit key for this package that will uniquely identify
         it in Pulp. This is the unique key for the inventoried package in Pulp.
         """
-        data = self.to_dict()
-        return self.generate_unit_key(*[data[key] for key in UNIT_KEYS])
+        return self._view('unit_key', lambda: self.generate_unit_key(
+            *[self[key] for key in UNIT_KEYS])).copy()
 
     def unit_metadata(self):
         """
         Returns all non-unit key metadata that should be stored in Pulp
         for this package. This is how the package will be inventoried in Pulp.
         """
-        data = self.to_dict()
-        metadata = [(k, v) for k, v in data.items() if k not in UNIT_KEYS]
-        return metadata
+        return list(self._view('unit_metadata', lambda: [
+            (k, v) for k, v in self._normalized().items() if k not in UNIT_KEYS]))
 
     def get_resources(self, resource_data=None):
         """
@@ -16,9 +16,15 @@ Contains classes and functions related to tracking the progress of the package
 importer.
 """
 
+import time
+
 from pulp_deb.common import reporting
 from pulp_deb.common.constants import STATE_NOT_STARTED, STATE_SUCCESS
 
+# Number of seconds of package downloads the throughput is measured over
+THROUGHPUT_WINDOW = 30
+
+
 class SyncProgressReport(object):
     """
     Used to carry the state of the sync run as it proceeds. This object is used
@@ -64,6 +70,10 @@ class SyncProgressReport(object):
         r.packages_total_count = m['total_count']
         r.packages_finished_count = m['finished_count']
         r.packages_error_count = m['error_count']
+        # Not sent by servers predating byte based progress
+        r.packages_total_bytes = m.get('total_bytes')
+        r.packages_finished_bytes = m.get('finished_bytes')
+        r.packages_throughput = m.get('throughput')
         r.packages_individual_errors = m['individual_errors']
         r.packages_error_message = m['error_message']
         r.packages_exception = m['error']
@@ -71,8 +81,9 @@ class SyncProgressReport(object):
 
         return r
 
-    def __init__(self, conduit):
+    def __init__(self, conduit, clock=time.time):
         self.conduit = conduit
+        self.clock = clock
 
         # Metadata download & parsing
         self.metadata_state = STATE_NOT_STARTED
@@ -90,11 +101,23 @@ class SyncProgressReport(object):
         self.packages_total_count = None
         self.packages_finished_count = None
         self.packages_error_count = None
+        self.packages_total_bytes = None
+        self.packages_finished_bytes = None
+        self.packages_throughput = None # bytes per second, see add_finished_bytes
         self.packages_individual_errors = None # mapping of package to its error
         self.packages_error_message = None # overall execution error
         self.packages_exception = None
         self.packages_traceback = None
 
+        # (time, finished bytes) pairs the throughput is computed from
+        self._byte_samples = []
+
+        # Statistics collected by the downloader over the whole sync
+        self.download_stats = None
+
+        # Number of files and bytes written into the storage per method
+        self.ingest_stats = {}
+
     # -- public methods -------------------------------------------------------
 
     def update_progress(self):
@@ -125,6 +148,10 @@ class SyncProgressReport(object):
             'total_count' : self.packages_total_count,
             'finished_count' : self.packages_finished_count,
             'error_count' : self.packages_error_count,
+            'total_bytes' : self.packages_total_bytes,
+            'finished_bytes' : self.packages_finished_bytes,
+            'download_stats' : self.download_stats,
+            'ingest_stats' : self.ingest_stats,
         }
 
         # Determine if the report was successful or failed
@@ -153,13 +180,51 @@ class SyncProgressReport(object):
         }
         return report
 
+    def set_packages_total_bytes(self, total_bytes):
+        """
+        Sets the number of bytes of the packages to retrieve, once they are
+        known, and starts measuring the throughput.
+        """
+        self.packages_total_bytes = total_bytes
+        self.packages_finished_bytes = 0
+        self.packages_throughput = None
+        self._byte_samples = [(self.clock(), 0)]
+
+    def add_finished_bytes(self, count):
+        """
+        Records that the given number of bytes of the packages were retrieved,
+        or given up on, and updates the throughput over the last
+        THROUGHPUT_WINDOW seconds.
+        """
+        now = self.clock()
+        self.packages_finished_bytes = (self.packages_finished_bytes or 0) + count
+        self._byte_samples.append((now, self.packages_finished_bytes))
+
+        # Keep the last sample before the window, it marks where it starts
+        while len(self._byte_samples) > 2 and self._byte_samples[1][0] <= now - THROUGHPUT_WINDOW:
+            self._byte_samples.pop(0)
+
+        start_time, start_bytes = self._byte_samples[0]
+        if now > start_time:
+            self.packages_throughput = float(self.packages_finished_bytes - start_bytes) / \
+                                       (now - start_time)
+
+    def retract_finished_bytes(self, count):
+        """
+        Records that bytes counted by add_finished_bytes are to be retrieved
+        again, e.g. the files of a package attempted again later. The
+        throughput is not changed, those bytes were retrieved all the same.
+        """
+        self.packages_finished_bytes = (self.packages_finished_bytes or 0) - count
+        self._byte_samples = [(t, b - count) for t, b in self._byte_samples]
+
     def add_failed_package(self, package, exception, traceback):
         """
         Updates the progress report that a package failed to be imported.
         """
         self.packages_error_count += 1
         self.packages_individual_errors = self.packages_individual_errors or {}
-        self.packages_individual_errors[package.key()] = {
+        self.packages_individual_errors[package.key] = {
             'exception' : reporting.format_exception(exception),
             'traceback' : reporting.format_traceback(traceback),
         }
@@ -186,6 +251,9 @@ class SyncProgressReport(object):
             'total_count' : self.packages_total_count,
             'finished_count' : self.packages_finished_count,
             'error_count' : self.packages_error_count,
+            'total_bytes' : self.packages_total_bytes,
+            'finished_bytes' : self.packages_finished_bytes,
+            'throughput' : self.packages_throughput,
             'individual_errors' : self.packages_individual_errors,
             'error_message' : self.packages_error_message,
             'error' : reporting.format_exception(self.packages_exception),
@@ -1,11 +1,130 @@
+import bz2
 import gzip
+import io
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+
+# Extensions of the compressed variants of an index, the empty one being the
+# uncompressed index; xz needs the lzma module
+COMPRESSION_EXTENSIONS = ('.xz', '.bz2', '.gz', '')
+
+# Leading bytes of the compressed formats an index may be stored in
+COMPRESSION_MAGIC = (
+    ('\x1f\x8b', '.gz'),
+    ('BZh', '.bz2'),
+    ('\xfd7zXZ\x00', '.xz'),
+)
+
+
+def supported_extensions():
+    """
+    Get the extensions of the index variants that can be read
+
+    :return: subset of COMPRESSION_EXTENSIONS
+    :rtype: tuple
+    """
+    return tuple([e for e in COMPRESSION_EXTENSIONS if e != '.xz' or lzma is not None])
+
+
+def strip_extension(path):
+    """
+    Strip the compression extension, if any, from a path or URL
+
+    :rtype: str
+    """
+    for extension in COMPRESSION_EXTENSIONS:
+        if extension and path.endswith(extension):
+            return path[:-len(extension)]
+    return path
+
+
+def open_compressed(path, mode='rb', fast=False):
+    """
+    Open a file, compressing or decompressing it according to its extension
+
+    :param path: path of the file
+    :type path: str
+
+    :param mode: mode to open the file in
+    :type mode: str
+
+    :param fast: when writing, favor speed over size
+    :type fast: bool
+
+    :return: file object
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, fast and 1 or 9)
+    elif path.endswith('.bz2'):
+        return bz2.BZ2File(path, mode, compresslevel=fast and 1 or 9)
+    elif path.endswith('.xz'):
+        if lzma is None:
+            raise IOError('No lzma module to open %s' % path)
+        if 'w' in mode:
+            return lzma.LZMAFile(path, mode, preset=fast and 0 or 6)
+        return lzma.LZMAFile(path, mode)
+    return open(path, mode)
+
+
+def detect_compression(path):
+    """
+    Detect the compression of a file from its leading bytes, whatever its
+    name
+
+    :param path: path of the file
+    :type path: str
+
+    :return: extension of the format, one of COMPRESSION_EXTENSIONS
+    :rtype: str
+    """
+    f = open(path, 'rb')
+    try:
+        head = f.read(6)
+    finally:
+        f.close()
+    for magic, extension in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return extension
+    return ''
+
+
+def open_index(path):
+    """
+    Open an index for reading, decompressing it as it is read according to
+    its content. Iterating the returned file object yields the lines of the
+    index without ever holding more than a buffer of it in memory.
+
+    :param path: path of the index
+    :type path: str
+
+    :return: file object
+    """
+    extension = detect_compression(path)
+    if extension == '.gz':
+        # Buffered, GzipFile reads lines in small pieces otherwise
+        return io.BufferedReader(gzip.GzipFile(path, 'rb'))
+    elif extension == '.bz2':
+        return bz2.BZ2File(path, 'rb')
+    elif extension == '.xz':
+        if lzma is None:
+            raise IOError('No lzma module to open %s' % path)
+        return lzma.LZMAFile(path, 'rb')
+    return open(path, 'rb')
 
 
 def _read(f, empty_on_io=False, as_list=True):
     """
     Read a file to a string or a list
 
-    :param f: Either a 'file' object or a filename
+    :param f: Either a 'file' object or a filename, which is decompressed
+              according to its content
     :type f: str or file
 
     :param empty_on_io: Return empty on IOError
@@ -18,12 +137,8 @@ def _read(f, empty_on_io=False, as_list=True):
     :rtype: list or string
     """
     try:
-        fh = None
         if isinstance(f, basestring):
-            fh = open(f)
-
-        if fh is not None and f.endswith('.gz'):
-            fh = gzip.GzipFile(fileobj=fh)
+            fh = open_index(f)
         elif isinstance(f, file):
             fh = f
         else:
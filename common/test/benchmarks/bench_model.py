@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Compares the memory taken by the packages of a large generated Packages
+index, kept as Package records and as the parsed deb822 paragraphs the
+packages used to hold. Each variant loads the index in its own process, so
+the peak memory reported is its own.
+
+Usage:
+    python bench_model.py [--packages N]
+"""
+
+import gzip
+import multiprocessing
+import optparse
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+from debian.deb822 import Packages
+
+from pulp_deb.common import model
+
+
+PARAGRAPH = """Package: %(name)s
+Priority: optional
+Section: libs
+Installed-Size: 84
+Maintainer: Ubuntu Developers <ubuntu-devel-discuss@lists.ubuntu.com>
+Original-Maintainer: Utopia Maintenance Team <pkg-utopia-maintainers@lists.alioth.debian.org>
+Architecture: amd64
+Source: %(source)s
+Version: 0.14-2
+Replaces: %(source)s-old
+Depends: libc6 (>= 2.8), libgcc1 (>= 1:4.1.1), zlib1g (>= 1:1.1.4)
+Filename: pool/main/%(prefix)s/%(source)s/%(name)s_0.14-2_amd64.deb
+Size: 18916
+MD5sum: c714e7fec80be42a0d4b54ab88c2c08a
+SHA1: 6d10e81457f7dcd9c2c48fce797662246d8de947
+SHA256: 6081ce4e689934a0de2ff9525c11e35b604d2b1b695dcad3cf12e95830611be8
+Description: lightweight C library for daemons - runtime library
+ libdaemon is a leightweight C library which eases the writing of UNIX daemons.
+ It consists of the following parts:
+ .
+  * Wrapper around fork() for correct daemonization of a process
+  * Wrapper around syslog() for simple log output to syslog or STDERR
+  * An API for writing PID files
+ .
+ This package includes the libdaemon run time shared library.
+Homepage: http://0pointer.de/lennart/projects/libdaemon/
+Bugs: https://bugs.launchpad.net/ubuntu/+filebug
+Origin: Ubuntu
+Supported: 5y
+Task: ubuntu-desktop
+
+"""
+
+
+# -- variants -----------------------------------------------------------------
+
+
+def load_records(path):
+    cmpt = model.Component(name='main', arch=['amd64'])
+    cmpt.update_from_index({'type': 'packages', 'path': path})
+    return cmpt.packages
+
+
+def load_deb822(path):
+    f = model.utils.open_index(path)
+    try:
+        return list(Packages.iter_paragraphs(f, use_apt_pkg=False))
+    finally:
+        f.close()
+
+
+VARIANTS = (
+    ('records', load_records),
+    ('deb822', load_deb822),
+)
+
+
+# -- benchmark ----------------------------------------------------------------
+
+
+def max_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_variant(load, path, result_queue):
+    before = max_rss()
+    start = time.time()
+    packages = load(path)
+    elapsed = time.time() - start
+    result_queue.put((len(packages), elapsed, max_rss() - before))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--packages', type='int', default=60000)
+    options, args = parser.parse_args()
+
+    working_dir = tempfile.mkdtemp(prefix='bench-model-')
+    try:
+        path = os.path.join(working_dir, 'Packages.gz')
+        f = gzip.open(path, 'wb')
+        for i in range(options.packages):
+            source = 'libdaemon%05d' % i
+            f.write(PARAGRAPH % {'name': source + '-0', 'source': source, 'prefix': 'libd'})
+        f.close()
+
+        print '%s packages, %.1f MB index' % (options.packages,
+                                              os.path.getsize(path) / 1024.0 / 1024)
+        for name, load in VARIANTS:
+            result_queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=run_variant,
+                                              args=(load, path, result_queue))
+            process.start()
+            count, elapsed, rss = result_queue.get()
+            process.join()
+
+            print '%-8s %6s packages %7.2fs %8.1f MB peak RSS growth %8.0f bytes/package' % (
+                name, count, elapsed, rss / 1024.0, rss * 1024.0 / count)
+    finally:
+        shutil.rmtree(working_dir)
+
+
+if __name__ == '__main__':
+    main()
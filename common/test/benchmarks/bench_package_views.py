@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Measures the views of the packages (key, size, unit key and metadata,
+resources) as the sync uses them when importing all packages of a
+distribution, with the views kept once computed and computed on each use.
+Binary and source packages are measured apart; the files of a source
+package are listed in several fields, which all have to be parsed.
+
+Usage:
+    python bench_package_views.py [--packages N] [--sources N]
+"""
+
+import optparse
+import time
+
+from debian.deb822 import Packages, Sources
+
+from pulp_deb.common import model
+
+from bench_model import PARAGRAPH
+
+
+SOURCE_PARAGRAPH = """Package: %(name)s
+Binary: %(name)s0, %(name)s-dev, %(name)s-doc
+Version: 0.14-2
+Maintainer: Ubuntu Developers <ubuntu-devel-discuss@lists.ubuntu.com>
+Original-Maintainer: Utopia Maintenance Team <pkg-utopia-maintainers@lists.alioth.debian.org>
+Build-Depends: debhelper (>= 7), cdbs, autotools-dev, lynx, doxygen
+Architecture: any
+Standards-Version: 3.8.3
+Format: 1.0
+Directory: pool/main/libd/%(name)s
+Files:
+ b6ea3d4b6bc9a6b6f1a33aa8c5e61e89 1862 %(name)s_0.14-2.dsc
+ 509dc27107c21bcd9fbf2f95f5669563 340768 %(name)s_0.14.orig.tar.gz
+ 9b4a4ee0e6e9a83e7c98ed7c5dd6cf8d 4027 %(name)s_0.14-2.diff.gz
+Checksums-Sha1:
+ 0e19ad4d3b0c5ab2a8a2c0d0ea1f8fc4ecf7e5a3 1862 %(name)s_0.14-2.dsc
+ 78a7b2b9bd63a59f6e2a8b6d7c0ff5b1b2b2b5a6 340768 %(name)s_0.14.orig.tar.gz
+ b1c7e3d6bcfd0bb0a46e2a4d4cf6d3e3a08f5b1c 4027 %(name)s_0.14-2.diff.gz
+Checksums-Sha256:
+ 0b0f0c8e6b4a8b3ea7d1e6f1a8d7f1f3c3b1b8f0e4b7e3d2f6c8a6b0c7e2d1a9 1862 %(name)s_0.14-2.dsc
+ c3b2e1f5f6a3b1d9e0c7f4a2b6d8e1c3f9a0b7d2e5c4f1a8b3d6e9c2f5a7b0d4 340768 %(name)s_0.14.orig.tar.gz
+ e7d4a1b8c5f2e9d6a3b0c7f4e1d8a5b2c9f6e3d0a7b4c1f8e5d2a9b6c3f0e7d4 4027 %(name)s_0.14-2.diff.gz
+Homepage: http://0pointer.de/lennart/projects/libdaemon/
+
+"""
+
+
+RESOURCE_DATA = {'url': 'http://ubuntu.uib.no/archive', 'dist': 'precise', 'component': 'main'}
+
+
+def import_packages(packages, clear):
+    """
+    The uses of the views by the sync; clear is called before each of them
+    """
+    for p in packages:
+        clear(p)
+        p.key
+    for use in range(3):
+        # Ordering, total size and free space check
+        for p in packages:
+            clear(p)
+            p.size
+    for p in packages:
+        clear(p)
+        for resource in p.get_resources(RESOURCE_DATA):
+            clear(p)
+            p.unit_key()
+            clear(p)
+            p.unit_metadata()
+        if p.package_type == 'source':
+            # Parent unit
+            clear(p)
+            p.unit_key()
+            clear(p)
+            p.unit_metadata()
+        clear(p)
+        p.key
+        p.clear_views()
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--packages', type='int', default=100000)
+    parser.add_option('--sources', type='int', default=30000)
+    options, args = parser.parse_args()
+
+    binary = [PARAGRAPH % {'name': 'libdaemon%06d-0' % i, 'source': 'libdaemon%06d' % i,
+                           'prefix': 'libd'} for i in range(options.packages)]
+    source = [SOURCE_PARAGRAPH % {'name': 'libdaemon%06d' % i} for i in range(options.sources)]
+
+    for deb822_cls, texts in ((Packages, binary), (Sources, source)):
+        lines = ''.join(texts).splitlines(True)
+        paragraphs = list(model._iter_package_paragraphs(deb822_cls, lines))
+        print '%s %s' % (len(paragraphs), deb822_cls.__name__)
+        for name, clear in (('kept', lambda p: None), ('computed', model.Package.clear_views)):
+            packages = [model.Package.from_paragraph(deb822_cls, *p) for p in paragraphs]
+            start = time.time()
+            import_packages(packages, clear)
+            elapsed = time.time() - start
+            print '  %-9s %7.2fs %8.1f us/package' % (name, elapsed,
+                                                      elapsed * 1000000 / len(packages))
+
+
+if __name__ == '__main__':
+    main()
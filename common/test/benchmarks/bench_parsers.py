@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Compares the throughput of the index parsers on a large generated Packages
+index, compressed and not. The apt_pkg parser is skipped if python-apt is
+not installed.
+
+Usage:
+    python bench_parsers.py [--packages N] [--rounds N]
+"""
+
+import gzip
+import optparse
+import os
+import shutil
+import tempfile
+import time
+
+from pulp_deb.common import model
+
+from bench_model import PARAGRAPH
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--packages', type='int', default=60000)
+    parser.add_option('--rounds', type='int', default=3)
+    options, args = parser.parse_args()
+
+    working_dir = tempfile.mkdtemp(prefix='bench-parsers-')
+    try:
+        plain = os.path.join(working_dir, 'Packages')
+        f = open(plain, 'wb')
+        for i in range(options.packages):
+            source = 'libdaemon%05d' % i
+            f.write(PARAGRAPH % {'name': source + '-0', 'source': source, 'prefix': 'libd'})
+        f.close()
+        size = os.path.getsize(plain)
+
+        compressed = plain + '.gz'
+        f = gzip.open(compressed, 'wb')
+        f.write(open(plain, 'rb').read())
+        f.close()
+
+        print '%s packages, %.1f MB index' % (options.packages, size / 1024.0 / 1024)
+        for path in (plain, compressed):
+            for name in model.PARSERS:
+                if name == model.PARSER_APT and model.apt_pkg is None:
+                    print '%-12s %-8s skipped, python-apt is not installed' % (
+                        os.path.basename(path), name)
+                    continue
+
+                # Best of the rounds
+                elapsed = None
+                for i in range(options.rounds):
+                    start = time.time()
+                    paragraphs = model.parse_index(path, parser=name)
+                    round_elapsed = time.time() - start
+                    if elapsed is None or round_elapsed < elapsed:
+                        elapsed = round_elapsed
+
+                print '%-12s %-8s %7.2fs %9.0f packages/s %7.1f MB/s' % (
+                    os.path.basename(path), name, elapsed, len(paragraphs) / elapsed,
+                    size / elapsed / 1024 / 1024)
+    finally:
+        shutil.rmtree(working_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,12 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import bz2
+import glob
+import os
+import pickle
+import shutil
+import tempfile
 import unittest
 from debian.deb822 import Packages, Sources
 
@@ -47,6 +53,101 @@ class UtilTests(unittest.TestCase):
     def test_cls_from_string(self):
         self.assertEqual(Packages, model.get_deb822_cls('Packages.gz'))
         self.assertEqual(Sources, model.get_deb822_cls('Sources.gz'))
+        self.assertEqual(Packages, model.get_deb822_cls('Packages.bz2'))
+        self.assertEqual(Packages, model.get_deb822_cls('Packages'))
+
+    def test_strip_extension(self):
+        self.assertEqual(utils.strip_extension('a/Packages.xz'), 'a/Packages')
+        self.assertEqual(utils.strip_extension('a/Packages.bz2'), 'a/Packages')
+        self.assertEqual(utils.strip_extension('a/Packages'), 'a/Packages')
+
+    def test_read_compressed(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'Packages.bz2')
+            f = bz2.BZ2File(path, 'w')
+            f.write('Package: a\n')
+            f.close()
+            self.assertEqual(utils._read(path), ['Package: a\n'])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_index_content_streamed(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            # Compressed whatever the name says
+            path = os.path.join(tmp_dir, 'Packages')
+            f = bz2.BZ2File(path, 'w')
+            f.write('Package: a\nVersion: 1\n\nPackage: b\nVersion: 2\n')
+            f.close()
+            self.assertEqual(utils.detect_compression(path), '.bz2')
+
+            content = model.get_index_content({'type': 'packages', 'path': path})
+            self.assertTrue(hasattr(content, 'read'))
+            self.assertEqual(content.readline(), 'Package: a\n')
+            content.close()
+
+            paragraphs = model._iter_paragraphs_path({'type': 'packages', 'path': path})
+            self.assertEqual([p['package'] for p in paragraphs], ['a', 'b'])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_index_content_missing(self):
+        self.assertEqual(model.get_index_content('/nonexistent/Packages', empty_on_io=True), [])
+        self.assertRaises(IOError, model.get_index_content, '/nonexistent/Packages')
+
+
+class ParserTests(unittest.TestCase):
+    def setUp(self):
+        pattern = os.path.join(samples.DATA_PATH, 'repos', '*', 'dists', '*', '*', '*', '%s*')
+        self.indexes = sorted(glob.glob(pattern % 'Packages') + glob.glob(pattern % 'Sources'))
+
+    @unittest.skipIf(model.apt_pkg is None, 'python-apt is not installed')
+    def test_parsers_identical(self):
+        self.assertTrue(self.indexes)
+        for path in self.indexes:
+            apt = model.parse_index(path, parser=model.PARSER_APT)
+            python = model.parse_index(path, parser=model.PARSER_PYTHON)
+            self.assertEqual(apt, python)
+
+            deb822_cls = model.get_deb822_cls(path)
+            for apt_paragraph, python_paragraph in zip(apt, python):
+                apt_pkg = model.Package.from_paragraph(deb822_cls, *apt_paragraph)
+                python_pkg = model.Package.from_paragraph(deb822_cls, *python_paragraph)
+                self.assertEqual(apt_pkg.key, python_pkg.key)
+                self.assertEqual(apt_pkg.files, python_pkg.files)
+                self.assertEqual(apt_pkg.to_dict(), python_pkg.to_dict())
+
+    def test_parser_fallback(self):
+        class FailingApt(object):
+            @staticmethod
+            def TagFile(path):
+                raise SystemError('E:Unable to parse package file %s' % path)
+
+        path = [i for i in self.indexes if i.endswith('Packages.gz')][0]
+        apt_pkg = model.apt_pkg
+        model.apt_pkg = FailingApt
+        try:
+            self.assertEqual(model.parse_index(path),
+                             model.parse_index(path, parser=model.PARSER_PYTHON))
+            self.assertRaises(SystemError, model.parse_index, path, parser=model.PARSER_APT)
+        finally:
+            model.apt_pkg = apt_pkg
+
+    def test_apt_readable(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'Packages')
+            f = bz2.BZ2File(path, 'w')
+            f.write('Package: a\n')
+            f.close()
+            # apt_pkg would take it for an uncompressed index
+            self.assertFalse(model._apt_readable(path))
+            os.rename(path, path + '.bz2')
+            self.assertTrue(model._apt_readable(path + '.bz2'))
+            self.assertFalse(model._apt_readable(path))
+        finally:
+            shutil.rmtree(tmp_dir)
 
 
 class DistributionTests(unittest.TestCase):
@@ -72,6 +173,41 @@ class DistributionTests(unittest.TestCase):
         indexes = dist.get_indexes()
         self.assertEquals(len(indexes), 3)
 
+    def test_update_from_resources_map_call(self):
+        def resources(dist):
+            indexes = dist.get_indexes()
+            for resource in indexes:
+                resource['path'] = resource['url'][len('file://'):]
+            return indexes
+
+        serial = samples.get_valid_repo()
+        serial.update_from_resources(resources(serial))
+        mapped = samples.get_valid_repo()
+        calls = []
+
+        def map_call(f, items):
+            calls.append(items)
+            # Both ways between processes, as by a pool
+            items = pickle.loads(pickle.dumps(items))
+            return pickle.loads(pickle.dumps(map(f, reversed(items))))[::-1]
+        mapped.update_from_resources(resources(mapped), map_call=map_call)
+
+        self.assertEquals(len(calls), 1)
+        self.assertTrue(all(sorted(i.keys()) == ['path', 'type'] for i in calls[0]))
+        self.assertEquals([p.key for p in mapped.packages], [p.key for p in serial.packages])
+        self.assertEquals([p.package_type for p in mapped.packages],
+                          ['source', 'package', 'package'])
+        # The source package of the Sources index
+        self.assertTrue(isinstance(mapped.packages[0].data, Sources))
+        self.assertEquals(mapped.packages[0].files, serial.packages[0].files)
+
+    def test_get_release_resources(self):
+        dist = samples.get_valid_repo()
+        resources = dist.get_release_resources()
+        self.assertEquals([r['url'].split('/')[-1] for r in resources],
+                          list(constants.RELEASE_FILENAMES))
+        self.assertTrue(resources[0]['url'].endswith('/dists/precise/Release'))
+
 
 class ComponentTests(unittest.TestCase):
     def setUp(self):
@@ -129,3 +265,60 @@ class PackageTests(unittest.TestCase):
 
     def test_prefix(self):
         self.assertEquals(PACKAGE['package'][0:4], self.pkg.prefix)
+
+    def test_size(self):
+        self.assertEquals(18916, self.pkg.size)
+
+    def test_from_paragraph(self):
+        paragraph = ('Package: libdaemon0\nVersion: 0.14-2\nMaintainer: J\xc3\xb6rg <j@example.com>\n'
+                     'Architecture: amd64\nFilename: pool/main/libd/libdaemon/libdaemon0.deb\n'
+                     'Size: 18916\nMD5sum: c714\nSHA1: 6d10\nSHA256: 6081\n'
+                     'Description: library\n more text\n')
+        [(text, fields)] = list(model._iter_package_paragraphs(Packages, paragraph.splitlines(True)))
+        self.assertEquals(text, paragraph)
+
+        pkg = model.Package.from_paragraph(Packages, text, fields)
+        self.assertFalse(hasattr(pkg, '__dict__'))
+        self.assertEquals(pkg.field('maintainer'), u'J\xf6rg <j@example.com>')
+        self.assertEquals(pkg.field('description'), None)
+        self.assertEquals(pkg.key, u'libdaemon0-0.14-2-J\xf6rg <j@example.com>')
+        self.assertEquals(pkg.source_name, 'libdaemon0')
+        self.assertEquals(pkg.size, 18916)
+        self.assertEquals(pkg['description'], 'library\n more text')
+        self.assertTrue('description' in pkg)
+        self.assertFalse('source' in pkg)
+
+    def test_views_memoized(self):
+        # Setup
+        metadata = self.pkg.unit_metadata()
+        files = self.pkg.files
+
+        # Test - the views handed out are copies
+        metadata.append(('extra', 1))
+        files[0]['url'] = 'http://ubuntu.uib.no/archive'
+
+        # Verify
+        self.assertEquals(sorted(self.pkg.views.keys()), ['files', 'normalized', 'unit_metadata'])
+        self.assertEquals(self.pkg.unit_metadata(), metadata[:-1])
+        self.assertTrue('url' not in self.pkg.files[0])
+        self.assertTrue(self.pkg.to_dict() is not self.pkg.to_dict())
+
+        self.pkg.clear_views()
+        self.assertTrue(self.pkg.views is None)
+
+    def test_views_invalidated(self):
+        # Setup
+        key = self.pkg.key
+        self.assertEquals(self.pkg.unit_key()['version'], PACKAGE['version'])
+
+        # Test
+        self.pkg['Version'] = '0.14-3'
+
+        # Verify
+        self.assertEquals(self.pkg.key, key.replace(PACKAGE['version'], '0.14-3'))
+        self.assertEquals(self.pkg.unit_key()['version'], '0.14-3')
+        self.assertEquals(dict(self.pkg.unit_metadata())['section'], PACKAGE['section'])
+
+        self.pkg.update({'Section': 'admin', 'Size': '20000'})
+        self.assertEquals(dict(self.pkg.unit_metadata())['section'], 'admin')
+        self.assertEquals(self.pkg.size, 20000)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import unittest
+
+from pulp_deb.common import sync_progress
+from pulp_deb.common.sync_progress import SyncProgressReport
+
+
+class SyncProgressReportTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 100.0
+        self.report = SyncProgressReport(None, clock=lambda: self.now)
+
+    def test_finished_bytes(self):
+        # Setup
+        self.report.set_packages_total_bytes(1000)
+
+        # Test
+        self.now += 2
+        self.report.add_finished_bytes(300)
+        self.now += 2
+        self.report.add_finished_bytes(100)
+
+        # Verify
+        section = self.report.build_progress_report()['packages']
+        self.assertEqual(section['total_bytes'], 1000)
+        self.assertEqual(section['finished_bytes'], 400)
+        self.assertEqual(section['throughput'], 100.0)
+
+    def test_throughput_window(self):
+        # Setup
+        self.report.set_packages_total_bytes(10000)
+        self.now += 2
+        self.report.add_finished_bytes(5000)
+
+        # Test - only the last window counts once the early burst is old
+        for i in range(4):
+            self.now += sync_progress.THROUGHPUT_WINDOW / 2
+            self.report.add_finished_bytes(150)
+
+        # Verify
+        self.assertEqual(self.report.packages_finished_bytes, 5600)
+        self.assertEqual(self.report.packages_throughput,
+                         300.0 / sync_progress.THROUGHPUT_WINDOW)
+
+    def test_retract_finished_bytes(self):
+        # Setup
+        self.report.set_packages_total_bytes(1000)
+        self.now += 2
+        self.report.add_finished_bytes(300)
+
+        # Test
+        self.report.retract_finished_bytes(100)
+        self.now += 2
+        self.report.add_finished_bytes(100)
+
+        # Verify - the bytes retrieved twice count in the throughput
+        self.assertEqual(self.report.packages_finished_bytes, 300)
+        self.assertEqual(self.report.packages_throughput, 100.0)
+
+    def test_from_progress_dict(self):
+        # Setup
+        self.report.set_packages_total_bytes(1000)
+        self.now += 1
+        self.report.add_finished_bytes(10)
+        progress = self.report.build_progress_report()
+
+        # Test
+        parsed = SyncProgressReport.from_progress_dict(progress)
+
+        # Verify
+        self.assertEqual(parsed.packages_total_bytes, 1000)
+        self.assertEqual(parsed.packages_finished_bytes, 10)
+        self.assertEqual(parsed.packages_throughput, 10.0)
+
+        # Reports of older servers have no byte counts
+        for key in ('total_bytes', 'finished_bytes', 'throughput'):
+            del progress['packages'][key]
+        self.assertTrue(SyncProgressReport.from_progress_dict(progress).packages_total_bytes
+                        is None)
@@ -79,6 +79,10 @@ class StatusRenderer(StatusRenderer):
             self._render_itemized_in_progress_state(items_done, items_total,
                 item_type, self.sync_metadata_bar, sync_report.metadata_state)
 
+        elif sync_report.metadata_state == constants.STATE_CANCELLED:
+            self.prompt.write(_('... cancelled'))
+            self.prompt.render_spacer()
+
         # The only state left to handle is if it failed
         else:
             self.prompt.render_failure_message(_('... failed'))
@@ -107,8 +111,15 @@ class StatusRenderer(StatusRenderer):
             items_total = sync_report.packages_total_count
             item_type = _('package')
 
-            self._render_itemized_in_progress_state(items_done, items_total, item_type,
-                self.sync_packages_bar, sync_report.packages_state)
+            if sync_report.packages_total_bytes:
+                self._render_bytes_in_progress_state(items_done, items_total, sync_report)
+            else:
+                self._render_itemized_in_progress_state(items_done, items_total, item_type,
+                    self.sync_packages_bar, sync_report.packages_state)
+
+        elif sync_report.packages_state == constants.STATE_CANCELLED:
+            self.prompt.write(_('... cancelled'))
+            self.prompt.render_spacer()
 
         # The only state left to handle is if it failed
         else:
@@ -257,6 +268,39 @@ class StatusRenderer(StatusRenderer):
             self.prompt.write(_('... completed'))
             self.prompt.render_spacer()
 
+    def _render_bytes_in_progress_state(self, items_done, items_total, sync_report):
+        """
+        Renders the package download progress by the bytes retrieved, along
+        with the throughput and the estimated time left when known.
+        """
+        bytes_done = min(sync_report.packages_finished_bytes or 0,
+                         sync_report.packages_total_bytes)
+        bytes_total = sync_report.packages_total_bytes
+
+        message_data = {
+            'items_done': items_done,
+            'items_total': items_total,
+            'bytes_done': _format_size(bytes_done),
+            'bytes_total': _format_size(bytes_total),
+            }
+        template = _('Packages: %(items_done)s/%(items_total)s items, '
+                     '%(bytes_done)s/%(bytes_total)s')
+        bar_message = template % message_data
+
+        throughput = sync_report.packages_throughput
+        if throughput and sync_report.packages_state == constants.STATE_RUNNING:
+            eta = int((bytes_total - bytes_done) / throughput)
+            bar_message += _(' (%(speed)s/s, %(eta)s left)') % {
+                'speed': _format_size(throughput),
+                'eta': '%d:%02d:%02d' % (eta / 3600, eta / 60 % 60, eta % 60),
+                }
+
+        self.sync_packages_bar.render(bytes_done, bytes_total, message=bar_message)
+
+        if sync_report.packages_state == constants.STATE_SUCCESS:
+            self.prompt.write(_('... completed'))
+            self.prompt.render_spacer()
+
     def _render_package_errors(self, individual_errors):
         """
         :param individual_errors:   dictionary where keys are package names and
@@ -286,3 +330,16 @@ class StatusRenderer(StatusRenderer):
         self.context.logger.error(error_message)
         self.context.logger.error(exception)
         self.context.logger.error(traceback)
+
+
+def _format_size(count):
+    """
+    :param count: number of bytes
+    :return: human readable rendering of the given number of bytes
+    :rtype:  str
+    """
+    for unit in ('B', 'KiB', 'MiB'):
+        if count < 1024:
+            return '%.1f %s' % (count, unit)
+        count /= 1024.0
+    return '%.1f GiB' % count
@@ -12,10 +12,12 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
 
+import os
 from gettext import gettext as _
 
 from pulp_deb.common import constants
 from pulp_deb.plugins.importers.downloaders import factory
+from pulp_deb.plugins.importers.downloaders.exceptions import UnsupportedURLType
 from pulp_deb.plugins.importers.downloaders import url_utils
 
 
@@ -32,8 +34,19 @@ def validate(config):
 
     validations = (
         _validate_resources,
+        _validate_mirrors,
+        _validate_download_driver,
         _validate_remove_missing,
+        _validate_pdiffs,
+        _validate_dump_timings,
+        _validate_cache_dir,
+        _validate_cache_size,
         _validate_queries,
+        _validate_max_downloads,
+        _validate_max_speed,
+        _validate_retries,
+        _validate_parse_workers,
+        _validate_local_ingest,
     )
 
     for validator in validations:
@@ -65,6 +78,51 @@ def _validate_resources(config):
     return True, None
 
 
+def _validate_mirrors(config):
+    """
+    Validates the mirrors of the repo if they are specified.
+    """
+
+    # The mirrors are optional
+    if constants.CONFIG_MIRRORS not in config.keys():
+        return True, None
+
+    mirrors = config.get(constants.CONFIG_MIRRORS)
+    if not isinstance(mirrors, (list, tuple)):
+        msg = 'The value for <%(m)s> must be specified as a list'
+        return False, _(msg) % {'m': constants.CONFIG_MIRRORS}
+
+    for url in mirrors:
+        if not isinstance(url, basestring) or not factory.is_valid_url(url):
+            msg = 'Mirror URL %(url)s is errorous'
+            return False, _(msg) % {'url': url}
+
+    return True, None
+
+
+def _validate_download_driver(config):
+    """
+    Validates that the download driver, if specified, exists for the type of
+    the repo URL.
+    """
+
+    # The driver is optional
+    if not config.get(constants.CONFIG_DOWNLOAD_DRIVER):
+        return True, None
+
+    repo = url_utils.get_repo(config)
+    if not repo.get(constants.CONFIG_URL, None):
+        return True, None
+
+    url_type = url_utils.determine_url_type(repo['url'])
+    try:
+        factory.get_url_type_downloader(factory.driver_name(url_type, config))
+    except UnsupportedURLType:
+        msg = 'The value for <%(k)s> is not a download driver for %(t)s URLs'
+        return False, _(msg) % {'k': constants.CONFIG_DOWNLOAD_DRIVER, 't': url_type}
+    return True, None
+
+
 def _validate_queries(config):
     """
     Validates the query parameters to apply to the source repo.
@@ -87,13 +145,162 @@ def _validate_remove_missing(config):
     Validates the remove missing packages value if it is specified.
     """
 
+    return _validate_boolean(config, constants.CONFIG_REMOVE_MISSING)
+
+
+def _validate_pdiffs(config):
+    """
+    Validates the flag for updating indexes with diffs if it is specified.
+    """
+    return _validate_boolean(config, constants.CONFIG_PDIFFS)
+
+
+def _validate_dump_timings(config):
+    """
+    Validates the flag for writing the transfer timings if it is specified.
+    """
+    return _validate_boolean(config, constants.CONFIG_DUMP_TIMINGS)
+
+
+def _validate_max_downloads(config):
+    """
+    Validates the concurrent download limits if they are specified.
+    """
+
+    for key in (constants.CONFIG_MAX_DOWNLOADS, constants.CONFIG_MAX_DOWNLOADS_PER_HOST):
+        # The limits are optional
+        if key not in config.keys():
+            continue
+
+        result, msg = _validate_positive_int(config, key)
+        if not result:
+            return result, msg
+
+    return True, None
+
+
+def _validate_max_speed(config):
+    """
+    Validates the bandwidth limits if they are specified.
+    """
+
+    for key in (constants.CONFIG_MAX_SPEED, constants.CONFIG_WORKER_MAX_SPEED):
+        # The limits are optional
+        if key not in config.keys():
+            continue
+
+        result, msg = _validate_positive_int(config, key)
+        if not result:
+            return result, msg
+
+    return True, None
+
+
+def _validate_retries(config):
+    """
+    Validates the retry settings if they are specified.
+    """
+
+    # Retries can be turned off with a count of 0
+    if constants.CONFIG_MAX_RETRIES in config.keys():
+        try:
+            parsed = int(config.get(constants.CONFIG_MAX_RETRIES))
+        except (TypeError, ValueError):
+            parsed = None
+
+        if parsed is None or parsed < 0:
+            msg = 'The value for <%(k)s> must be zero or a positive integer'
+            return False, _(msg) % {'k': constants.CONFIG_MAX_RETRIES}
+
+    if constants.CONFIG_RETRY_DELAY in config.keys():
+        return _validate_positive_int(config, constants.CONFIG_RETRY_DELAY)
+
+    return True, None
+
+
+def _validate_cache_dir(config):
+    """
+    Validates that the cache directory, if specified, is an absolute path.
+    """
+
+    # The directory is optional
+    if not config.get(constants.CONFIG_CACHE_DIR):
+        return True, None
+
+    cache_dir = config.get(constants.CONFIG_CACHE_DIR)
+    if not isinstance(cache_dir, basestring) or not os.path.isabs(cache_dir):
+        msg = 'The value for <%(k)s> must be an absolute path'
+        return False, _(msg) % {'k': constants.CONFIG_CACHE_DIR}
+    return True, None
+
+
+def _validate_cache_size(config):
+    """
+    Validates the maximum size of the cache if it is specified.
+    """
+
+    # The size is optional
+    if constants.CONFIG_CACHE_SIZE not in config.keys():
+        return True, None
+
+    return _validate_positive_int(config, constants.CONFIG_CACHE_SIZE)
+
+
+def _validate_parse_workers(config):
+    """
+    Validates the number of index parsing processes if it is specified.
+    """
+
+    # The number is optional
+    if constants.CONFIG_PARSE_WORKERS not in config.keys():
+        return True, None
+
+    return _validate_positive_int(config, constants.CONFIG_PARSE_WORKERS)
+
+
+def _validate_local_ingest(config):
+    """
+    Validates the ingest method for local feeds if it is specified.
+    """
+
+    # The method is optional
+    if constants.CONFIG_LOCAL_INGEST not in config.keys():
+        return True, None
+
+    if config.get(constants.CONFIG_LOCAL_INGEST) not in constants.LOCAL_INGEST_METHODS:
+        msg = 'The value for <%(k)s> must be one of %(m)s'
+        return False, _(msg) % {'k': constants.CONFIG_LOCAL_INGEST,
+                                'm': ', '.join(constants.LOCAL_INGEST_METHODS)}
+    return True, None
+
+
+def _validate_boolean(config, key):
+    """
+    Validates that the value for the given key, if specified, is a boolean.
+    """
+
     # The flag is optional
-    if constants.CONFIG_REMOVE_MISSING not in config.keys():
+    if key not in config.keys():
         return True, None
 
     # Make sure it's a boolean
-    parsed = config.get_boolean(constants.CONFIG_REMOVE_MISSING)
+    parsed = config.get_boolean(key)
     if parsed is None:
         msg = 'The value for <%(r)s> must be either "true" or "false"'
-        return False, _(msg) % {'r': constants.CONFIG_REMOVE_MISSING}
+        return False, _(msg) % {'r': key}
+    return True, None
+
+
+def _validate_positive_int(config, key):
+    """
+    Validates that the value for the given key is a positive integer.
+    """
+    try:
+        parsed = int(config.get(key))
+    except (TypeError, ValueError):
+        parsed = None
+
+    if parsed is None or parsed < 1:
+        msg = 'The value for <%(k)s> must be a positive integer'
+        return False, _(msg) % {'k': key}
     return True, None
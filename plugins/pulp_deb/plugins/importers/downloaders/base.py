@@ -11,6 +11,8 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+from pulp_deb.plugins.importers.downloaders import exceptions
+
 
 class BaseDownloader(object):
     """
@@ -25,17 +27,74 @@ class BaseDownloader(object):
         self.config = config
         self.is_cancelled_call = is_cancelled_call
 
-    def download_resources(self, resources, progress_report):
+    def download_resources(self, resources, progress_report, in_memory=False,
+                           raise_on_error=True):
         """
         Retrieve all given resources
 
         :param: resources: Resources to download
         :type   resources: list
 
-        :param progress_report: used to communicate the progress of this operation
+        :param progress_report: used to communicate the progress of this operation;
+               the size of each package file retrieved is passed to its
+               add_finished_bytes method
         :type  progress_report: pulp_deb.importer.sync_progress.ProgressReport
 
-        :return: list of resources containing the original dict with added destination path
+        :param in_memory: store the content of each resource under 'content'
+               instead of writing it to disk, as an iterable over its lines
+        :type  in_memory: bool
+
+        :param raise_on_error: if true, the first failure is raised; otherwise
+               the exception is stored under the 'error' key of the failed
+               resource and the remaining resources are still retrieved
+        :type  raise_on_error: bool
+
+        :return: list of resources containing the original dict with added
+                 destination path; if the file at that path was created for
+                 the caller, which may move or delete it, the 'temporary' key
+                 is set to true
         :rtype:  list
         """
         raise NotImplementedError()
+
+    def close(self):
+        """
+        Releases anything the downloader keeps open between calls to
+        download_resources. The downloader must not be used afterwards.
+        """
+        pass
+
+    def statistics(self):
+        """
+        Returns statistics gathered by the downloader over its lifetime, to be
+        included in the final sync report.
+
+        :rtype: dict
+        """
+        return {}
+
+    def is_cancelled(self):
+        """
+        Polls the importer to find out if the sync was cancelled.
+
+        :rtype: bool
+        """
+        return self.is_cancelled_call is not None and bool(self.is_cancelled_call())
+
+    def _check_cancelled(self):
+        """
+        Raises a CancelledException if the sync was cancelled.
+        """
+        if self.is_cancelled():
+            raise exceptions.CancelledException()
+
+    def _get_config_int(self, key, default):
+        """
+        Returns the integer value of the given key in the importer
+        configuration, or the default if it is not specified.
+
+        :rtype: int
+        """
+        if self.config is None or self.config.get(key) is None:
+            return default
+        return int(self.config.get(key))
@@ -0,0 +1,531 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Caches used by the downloaders to avoid retrieving content that is already
+available locally.
+"""
+
+import logging
+import os
+import threading
+import time
+import urlparse
+
+from pulp.common.compat import json
+
+try:
+    from pulp.server.config import config as pulp_config
+except ImportError:
+    # Outside of the Pulp server, e.g. the benchmarks
+    pulp_config = None
+
+from pulp_deb.common import constants
+from pulp_deb.plugins.importers import storage
+
+
+# -- constants ----------------------------------------------------------------
+
+# Directory under the repository working directory holding the cached indexes
+METADATA_CACHE_DIR = 'metadata-cache'
+
+# Suffix of the file stored next to each cached index describing it
+VALIDATORS_SUFFIX = '.validators'
+
+# Directory under the repository working directory holding the blobs when the
+# storage root of the Pulp server is not known
+BLOB_CACHE_DIR = 'blob-cache'
+
+# Share of the maximum size the blob cache is brought down to when it
+# outgrows it
+EVICT_RATIO = 0.9
+
+# Seconds after which the blob cache reads the links of its entries from the
+# directory again, since the files sharing them are removed by others
+ENTRIES_RELOAD_INTERVAL = 60 * 60
+
+_LOG = logging.getLogger(__name__)
+
+
+# -- caches -------------------------------------------------------------------
+
+
+class MetadataCache(object):
+    """
+    Keeps the index files (Packages.gz, Sources.gz) retrieved by the previous
+    syncs of a repository along with the validators the server sent for
+    them (ETag and Last-Modified). The validators are sent back on the next
+    request so an unchanged index is answered with a 304 and the cached copy
+    is used instead.
+
+    The checksum the Release file listed for an index is recorded as well,
+    so the next sync can tell the cached copy is still current without
+    asking the server.
+
+    The cache lives in the repository's working directory, so it persists
+    across syncs of that repository.
+    """
+
+    def __init__(self, working_dir):
+        self.cache_dir = os.path.join(working_dir, METADATA_CACHE_DIR)
+
+    def filename(self, url):
+        """
+        :return: path of the cached copy of the given URL
+        :rtype:  str
+        """
+        return os.path.join(self.cache_dir, url_to_filename(url))
+
+    def validators(self, url):
+        """
+        Returns the validators stored for the cached copy of the given URL.
+        Nothing is returned if there is no usable cached copy.
+
+        :return: dict possibly containing the keys 'etag' and 'last_modified'
+        :rtype:  dict
+        """
+        stored = self._load(url)
+        return dict([(k, stored[k]) for k in ('etag', 'last_modified') if stored.get(k)])
+
+    def checksum(self, url):
+        """
+        Returns the checksum recorded for the cached copy of the given URL,
+        as listed by the Release file it was retrieved for.
+
+        :rtype: str or None
+        """
+        return self._load(url).get('checksum')
+
+    def request_headers(self, url):
+        """
+        Returns the headers making the request for the given URL conditional
+        on the cached copy being out of date.
+
+        :return: list of header lines; empty if there is no usable cached copy
+        :rtype:  list
+        """
+        validators = self.validators(url)
+        headers = []
+        if 'etag' in validators:
+            headers.append('If-None-Match: %s' % validators['etag'])
+        if 'last_modified' in validators:
+            headers.append('If-Modified-Since: %s' % validators['last_modified'])
+        return headers
+
+    def store(self, url, filename, validators, checksum=None):
+        """
+        Moves the freshly downloaded copy of the given URL into the cache and
+        records its validators.
+
+        :param url: location the file was downloaded from
+        :type  url: str
+
+        :param filename: downloaded file; it is moved into the cache
+        :type  filename: str
+
+        :param validators: may contain the keys 'etag' and 'last_modified'
+        :type  validators: dict
+
+        :param checksum: checksum identifying the version of the document,
+               see checksum
+        :type  checksum: str or None
+
+        :return: path of the cached copy
+        :rtype:  str
+        """
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        # Drop the old validators first so they never describe the new copy
+        cached = self.filename(url)
+        if os.path.exists(cached + VALIDATORS_SUFFIX):
+            os.remove(cached + VALIDATORS_SUFFIX)
+        os.rename(filename, cached)
+
+        stored = {'url': url}
+        stored.update(validators)
+        if checksum:
+            stored['checksum'] = checksum
+        f = open(cached + VALIDATORS_SUFFIX, 'w')
+        try:
+            json.dump(stored, f)
+        finally:
+            f.close()
+
+        return cached
+
+    def _load(self, url):
+        """
+        Reads what was recorded along with the cached copy of the given URL.
+
+        :return: recorded values; empty if there is no usable cached copy
+        :rtype:  dict
+        """
+        filename = self.filename(url)
+        if not os.path.exists(filename):
+            return {}
+
+        try:
+            f = open(filename + VALIDATORS_SUFFIX, 'r')
+            try:
+                stored = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return {}
+
+        # The name only covers the path, make sure it is the same document
+        if stored.get('url') != url:
+            return {}
+        return stored
+
+
+class BlobCache(object):
+    """
+    Files keyed by the SHA256 checksum of their content, as listed by the
+    Release file or the indexes. Since an entry can only ever hold that
+    content, it is used as is without asking any server.
+
+    Entries are hardlinked (or else reflinked) into the cache; a file that
+    can only be copied, e.g. from another filesystem, is not added since it
+    would take its space twice. Entries are hardlinked out of the cache
+    where the filesystem allows it. The files handed out must therefore
+    never be modified in place, only replaced.
+
+    The cache lives in the directory configured with the cache_dir setting,
+    which all repositories share by default (see blob_cache_dir). The
+    directory is only created when the first entry is added; nothing is
+    added to it if it cannot be written. The syncs of a worker process use a
+    single instance per directory (see worker_blob_cache).
+
+    If a maximum size is given, the least recently used entries are removed
+    once the cache grows beyond it. Only the unshared bytes count against
+    it, i.e. the entries with no other hardlink: the others take no space of
+    their own and removing them would free nothing. The time of last use is
+    kept as the access time of the entries, so it carries over to the next
+    process using the directory.
+    """
+
+    def __init__(self, cache_dir, max_size=None):
+        """
+        :param cache_dir: directory holding the entries
+        :type  cache_dir: str
+
+        :param max_size: size in bytes the entries may take in total; no
+               entry is ever removed if not specified
+        :type  max_size: int or None
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+        # Time of last use and unshared size of each entry keyed by
+        # checksum, read from the directory the first time an entry is added
+        # and again every ENTRIES_RELOAD_INTERVAL
+        self.entries = None
+        self.loaded = None
+        self.size = 0
+        self.evicted = 0
+
+        # Whether the directory can be written, checked on the first addition
+        self.writable = None
+
+    def filename(self, digest):
+        """
+        :param digest: hex SHA256 checksum of the content
+        :type  digest: str
+
+        :return: path of the entry for the given checksum
+        :rtype:  str
+        """
+        digest = digest.lower()
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def get(self, digest):
+        """
+        Returns the entry for the given checksum, which counts as a use of it.
+
+        :return: path of the entry for the given checksum; None if there is
+                 none
+        :rtype:  str or None
+        """
+        filename = self.filename(digest)
+        if not os.path.exists(filename):
+            return None
+        self._touch(digest.lower(), filename)
+        return filename
+
+    def add(self, digest, filename):
+        """
+        Adds the given file to the cache, leaving it in place, if it can be
+        linked. The caller is responsible for having verified its checksum.
+        The least recently used entries are removed if the cache grows
+        beyond its maximum size.
+
+        :param digest: hex SHA256 checksum of the file
+        :type  digest: str
+
+        :param filename: file to add
+        :type  filename: str
+        """
+        if self.get(digest) is not None:
+            return
+        if not self._check_dir():
+            return
+        try:
+            size = os.path.getsize(filename)
+            if self.max_size is not None and size > self.max_size:
+                return
+            if storage.link_into_place(filename, self.filename(digest)) is None:
+                _LOG.debug('Cannot link <%s> into the cache, not adding it' % filename)
+                return
+        except (IOError, OSError), e:
+            # The cache only saves transfers, the sync goes on without it
+            _LOG.warn('Cannot add <%s> to the cache: %s' % (filename, e))
+            return
+
+        if self.max_size is None:
+            return
+
+        self.lock.acquire()
+        try:
+            if self.entries is None or time.time() - self.loaded > ENTRIES_RELOAD_INTERVAL:
+                # Picks up the new entry as well
+                self._load_entries()
+            else:
+                self._restat(digest.lower())
+            self._evict()
+        finally:
+            self.lock.release()
+
+    def copy_to(self, digest, destination):
+        """
+        Places the entry for the given checksum at the given path.
+
+        :return: whether there was an entry to place
+        :rtype:  bool
+        """
+        filename = self.get(digest)
+        if filename is None:
+            return False
+        try:
+            storage.ingest(filename, destination)
+        except (IOError, OSError), e:
+            # Removed in the meantime, e.g. by another process sharing it
+            _LOG.warn('Cannot copy <%s> from the cache: %s' % (filename, e))
+            return False
+
+        # A linked entry is shared again
+        self.lock.acquire()
+        try:
+            if self.entries is not None:
+                self._restat(digest.lower())
+        finally:
+            self.lock.release()
+        return True
+
+    def _check_dir(self):
+        """
+        Creates the directory of the cache the first time it is called.
+
+        :return: whether entries can be added to the directory
+        :rtype:  bool
+        """
+        if self.writable is None:
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError:
+                # Already created, by another sync or earlier
+                pass
+            self.writable = os.path.isdir(self.cache_dir) and \
+                os.access(self.cache_dir, os.W_OK | os.X_OK)
+            if not self.writable:
+                _LOG.warn('Cannot write to the blob cache directory <%s>, no file is '
+                          'added to it' % self.cache_dir)
+        return self.writable
+
+    def _touch(self, digest, filename):
+        """
+        Records the use of an entry, without changing its modification time
+        which hardlinks to it share.
+        """
+        now = time.time()
+        try:
+            os.utime(filename, (now, os.stat(filename).st_mtime))
+        except OSError:
+            # Files linked from the storage may belong to another user; the
+            # entry is only evicted earlier than it should
+            pass
+
+        self.lock.acquire()
+        try:
+            if self.entries is not None and digest in self.entries:
+                self.entries[digest][0] = now
+        finally:
+            self.lock.release()
+
+    def _record(self, digest, size, last_used):
+        if digest in self.entries:
+            self.size -= self.entries[digest][1]
+        self.entries[digest] = [last_used, size]
+        self.size += size
+
+    def _restat(self, digest):
+        """
+        Records the unshared size of an entry as it is now in the directory.
+        """
+        try:
+            stat = os.stat(self.filename(digest))
+        except OSError:
+            # Removed by another process sharing the directory
+            return
+        if digest in self.entries:
+            last_used = self.entries[digest][0]
+        else:
+            last_used = time.time()
+        self._record(digest, _unshared_size(stat), last_used)
+
+    def _load_entries(self):
+        """
+        Reads the unshared size and time of last use of the entries in the
+        directory.
+        """
+        self.entries = {}
+        self.loaded = time.time()
+        self.size = 0
+        if not os.path.isdir(self.cache_dir):
+            return
+        for prefix in os.listdir(self.cache_dir):
+            directory = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for digest in os.listdir(directory):
+                try:
+                    stat = os.stat(os.path.join(directory, digest))
+                except OSError:
+                    continue
+                self._record(digest, _unshared_size(stat), stat.st_atime)
+
+    def _evict(self):
+        """
+        Removes the least recently used unshared entries until the cache is
+        below its maximum size. It is brought down to EVICT_RATIO of it so
+        that the entries are not sorted again with every addition.
+        """
+        if self.size <= self.max_size:
+            return
+
+        target = self.max_size * EVICT_RATIO
+        unshared = [item for item in self.entries.items() if item[1][1]]
+        by_use = sorted(unshared, key=lambda item: item[1][0])
+        for digest, (last_used, size) in by_use:
+            if self.size <= target:
+                break
+            filename = self.filename(digest)
+            try:
+                if os.stat(filename).st_nlink > 1:
+                    # Linked since it was counted, removing it frees nothing
+                    self._record(digest, 0, last_used)
+                    continue
+                os.remove(filename)
+            except OSError:
+                # Already removed by another process sharing the directory
+                pass
+            del self.entries[digest]
+            self.size -= size
+            self.evicted += 1
+
+
+# -- utilities ----------------------------------------------------------------
+
+
+def blob_cache_dir(config, working_dir):
+    """
+    Returns the configured cache directory, or else the one shared by all
+    repositories under the storage root of the Pulp server. The repository
+    keeps its own cache in its working directory if that root is not known
+    (e.g. when not running as the Pulp server). The directory is not
+    accessed, see BlobCache.add.
+
+    :param config: importer configuration; may be None
+    :param working_dir: working directory of the repository being synced
+
+    :return: directory of the blob cache to use
+    :rtype:  str
+    """
+    if config is not None and config.get(constants.CONFIG_CACHE_DIR):
+        return config.get(constants.CONFIG_CACHE_DIR)
+
+    storage_dir = pulp_storage_dir()
+    if storage_dir is None:
+        return os.path.join(working_dir, BLOB_CACHE_DIR)
+    return os.path.join(storage_dir, constants.DEFAULT_CACHE_SUBDIR)
+
+
+def pulp_storage_dir():
+    """
+    :return: storage root configured for the Pulp server; None if there is
+             no server configuration
+    :rtype:  str or None
+    """
+    if pulp_config is None or not pulp_config.has_option('server', 'storage_dir'):
+        return None
+    return pulp_config.get('server', 'storage_dir')
+
+
+def worker_blob_cache(cache_dir, max_size=None):
+    """
+    Returns the blob cache of the given directory shared by the syncs of
+    this worker process, so they agree on the size of the cache and the use
+    of its entries. The maximum size of the latest sync applies.
+
+    :rtype: BlobCache
+    """
+    _WORKER_BLOB_CACHES_LOCK.acquire()
+    try:
+        blob_cache = WORKER_BLOB_CACHES.get(cache_dir)
+        if blob_cache is None:
+            blob_cache = BlobCache(cache_dir, max_size)
+            WORKER_BLOB_CACHES[cache_dir] = blob_cache
+        blob_cache.max_size = max_size
+        return blob_cache
+    finally:
+        _WORKER_BLOB_CACHES_LOCK.release()
+
+
+def _unshared_size(stat):
+    """
+    :return: size of the file with the given status if no other hardlink
+             shares it, else 0
+    :rtype:  int
+    """
+    if stat.st_nlink > 1:
+        return 0
+    return stat.st_size
+
+
+def url_to_filename(url):
+    """
+    Returns a flat file name identifying the given URL. The name is derived
+    from the full URL path since many documents share a basename (e.g.
+    Packages.gz of each architecture).
+
+    :rtype: str
+    """
+    path = urlparse.urlparse(url).path.strip('/')
+    return path.replace('/', '_')
+
+
+# Blob caches of the syncs running in this process, keyed by directory
+WORKER_BLOB_CACHES = {}
+_WORKER_BLOB_CACHES_LOCK = threading.Lock()
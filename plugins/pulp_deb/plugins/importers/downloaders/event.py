@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Event driven variant of the HTTP downloader, registered as the "event"
+download driver for http URLs (see factory.get_downloader).
+"""
+
+import logging
+import select
+import time
+
+import pycurl
+
+from pulp_deb.plugins.importers.downloaders import web
+
+
+# -- constants ----------------------------------------------------------------
+
+# curl's interest in a socket mapped to epoll events
+_POLL_EVENTS = {
+    pycurl.POLL_IN: select.EPOLLIN,
+    pycurl.POLL_OUT: select.EPOLLOUT,
+    pycurl.POLL_INOUT: select.EPOLLIN | select.EPOLLOUT,
+}
+
+_LOG = logging.getLogger(__name__)
+
+
+# -- downloader implementations -----------------------------------------------
+
+
+class EventHttpDownloader(web.HttpDownloader):
+    """
+    HTTP downloader driving its transfers from an epoll event loop instead of
+    having curl select() over all of them.
+
+    curl tells the downloader which sockets it waits on and when it next
+    needs to be woken up; only the sockets with activity are handed back to
+    curl, so the work per wake up does not grow with the number of
+    transfers in flight, nor is it limited by the 1024 descriptors select()
+    can watch. This makes the driver suited for running hundreds or
+    thousands of transfers at once (see the max_downloads and
+    max_downloads_per_host settings). Everything else (resume, verification,
+    throttling, mirrors, retries) behaves as in HttpDownloader.
+
+    epoll is only available on Linux.
+    """
+
+    def __init__(self, repo, conduit, config, is_cancelled_call):
+        super(EventHttpDownloader, self).__init__(repo, conduit, config, is_cancelled_call)
+
+        # Created along with the multi handle, see _get_multi
+        self.poller = None
+
+        # Sockets registered with the poller keyed by their descriptor, the
+        # events found on them by the last wait, and the time curl asked to
+        # be woken up at regardless of socket activity
+        self.sockets = {}
+        self.ready = []
+        self.deadline = None
+
+    def close(self):
+        super(EventHttpDownloader, self).close()
+        if self.poller is not None:
+            self.poller.close()
+            self.poller = None
+            self.sockets = {}
+
+    def _get_multi(self):
+        """
+        :return: multi handle shared by all transfers of this downloader,
+                 reporting its sockets and timeouts to the downloader
+        :rtype:  pycurl.CurlMulti
+        """
+        if self.multi is None:
+            self.poller = select.epoll()
+            self.multi = pycurl.CurlMulti()
+            self.multi.setopt(pycurl.M_SOCKETFUNCTION, self._socket_callback)
+            self.multi.setopt(pycurl.M_TIMERFUNCTION, self._timer_callback)
+        return self.multi
+
+    def _perform(self, multi):
+        """
+        Hands the sockets with activity over to curl, and lets it handle its
+        timeouts once they are due.
+        """
+        ready, self.ready = self.ready, []
+        for fd, action in ready:
+            self._socket_action(multi, fd, action)
+
+        if self.deadline is not None and self.deadline <= time.time():
+            self.deadline = None
+            self._socket_action(multi, pycurl.SOCKET_TIMEOUT, 0)
+
+    def _wait(self, multi, timeout):
+        """
+        Blocks until one of the sockets curl is interested in has activity,
+        curl's next timeout is due or the given number of seconds passed.
+        """
+        if self.deadline is not None:
+            timeout = max(0, min(timeout, self.deadline - time.time()))
+
+        for fd, events in self.poller.poll(timeout):
+            action = 0
+            if events & select.EPOLLIN:
+                action |= pycurl.CSELECT_IN
+            if events & select.EPOLLOUT:
+                action |= pycurl.CSELECT_OUT
+            if events & (select.EPOLLERR | select.EPOLLHUP):
+                action |= pycurl.CSELECT_ERR
+            self.ready.append((fd, action))
+
+    def _socket_action(self, multi, fd, action):
+        while True:
+            ret, num_handles = multi.socket_action(fd, action)
+            if ret != pycurl.E_CALL_MULTI_PERFORM:
+                break
+
+    def _socket_callback(self, what, fd, multi, socketp):
+        """
+        Called by curl whenever the events it waits for on a socket change.
+        """
+        if what == pycurl.POLL_REMOVE:
+            if self.sockets.pop(fd, None) is not None:
+                try:
+                    self.poller.unregister(fd)
+                except (IOError, ValueError):
+                    # Already closed by curl
+                    pass
+            return
+
+        events = _POLL_EVENTS.get(what, 0)
+        if fd in self.sockets:
+            self.poller.modify(fd, events)
+        else:
+            self.poller.register(fd, events)
+        self.sockets[fd] = events
+
+    def _timer_callback(self, timeout_ms):
+        """
+        Called by curl with the number of milliseconds after which it needs
+        to be woken up, or -1 to cancel the previous request.
+        """
+        if timeout_ms < 0:
+            self.deadline = None
+        else:
+            self.deadline = time.time() + timeout_ms / 1000.0
@@ -23,6 +23,15 @@ class UnsupportedURLType(Exception):
         Exception.__init__(self, url_type, *args)
         self.url_type = url_type
 
+# -- sync control exceptions --------------------------------------------------
+
+class CancelledException(Exception):
+    """
+    Raised by a downloader once it stopped because the sync was cancelled.
+    The transfers in progress are aborted before it is raised.
+    """
+    pass
+
 # -- file retrieval exceptions ------------------------------------------------
 
 class FileRetrievalException(Exception):
@@ -58,3 +67,66 @@ class UnauthorizedException(FileRetrievalException):
     (e.g. 401 from a web request, no read perms for a local read).
     """
     pass
+
+
+class ServerErrorException(FileRetrievalException):
+    """
+    Raised if the server failed to serve a file for a reason that may go away
+    (e.g. 503 from an overloaded web server).
+    """
+    def __init__(self, location, status, retry_after=None, *args):
+        """
+        :param status: HTTP status of the response
+        :type  status: int
+
+        :param retry_after: seconds the server asked to wait before retrying
+        :type  retry_after: int or None
+        """
+        FileRetrievalException.__init__(self, location, status, *args)
+        self.status = status
+        self.retry_after = retry_after
+
+    def __str__(self):
+        template = '%s: %s (HTTP %s)'
+        return template % (self.__class__.__name__, self.location, self.status)
+
+
+class ConnectionException(FileRetrievalException):
+    """
+    Raised if no connection to the server could be established.
+    """
+    def __init__(self, location, message, *args):
+        FileRetrievalException.__init__(self, location, message, *args)
+        self.message = message
+
+    def __str__(self):
+        template = '%s: %s (%s)'
+        return template % (self.__class__.__name__, self.location, self.message)
+
+
+class TransferException(ConnectionException):
+    """
+    Raised if a transfer was interrupted after the server started answering.
+    """
+    pass
+
+
+class VerificationException(FileRetrievalException):
+    """
+    Raised if a retrieved file does not match the size or a checksum the
+    repository metadata lists for it.
+    """
+    def __init__(self, location, field, expected, actual, *args):
+        """
+        :param field: what did not match; 'size' or the checksum type
+        :type  field: str
+        """
+        FileRetrievalException.__init__(self, location, field, expected, actual, *args)
+        self.field = field
+        self.expected = expected
+        self.actual = actual
+
+    def __str__(self):
+        template = '%s: %s (%s expected %s, got %s)'
+        return template % (self.__class__.__name__, self.location, self.field,
+                           self.expected, self.actual)
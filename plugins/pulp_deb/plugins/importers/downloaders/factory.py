@@ -19,6 +19,7 @@ url type.
 import logging
 from stevedore import driver
 
+from pulp_deb.common import constants
 from pulp_deb.plugins.importers.downloaders.exceptions import UnsupportedURLType, InvalidURL
 from pulp_deb.plugins.importers.downloaders import url_utils
 
@@ -55,14 +56,34 @@ def get_downloader(url, repo, conduit, config, is_cancelled_call):
     :return: downloader instance to use for the given url
 
     :raise UnsupportedURLType: if there is no applicable downloader for the
-           given url
+           given url, or the configured download driver does not exist for
+           its type
     :raise InvalidURL: if the url cannot be parsed to determine the type
     """
     url_type = url_utils.determine_url_type(url)
-    downloader = get_url_type_downloader(url_type)
+    downloader = get_url_type_downloader(driver_name(url_type, config))
     return downloader(repo, conduit, config, is_cancelled_call)
 
 
+def driver_name(url_type, config):
+    """
+    Returns the name the downloader for the given url type is registered
+    under, taking the configured download driver into account. The variants
+    of a downloader are registered as "<url type>-<driver>", e.g. http-event.
+
+    :param url_type: type of the url as returned by determine_url_type
+    :type  url_type: str
+
+    :param config: configuration of the importer and call
+    :type  config: pulp.plugins.config.PluginCallConfiguration
+
+    :rtype: str
+    """
+    if config is not None and config.get(constants.CONFIG_DOWNLOAD_DRIVER):
+        return '%s-%s' % (url_type, config.get(constants.CONFIG_DOWNLOAD_DRIVER))
+    return url_type
+
+
 def is_valid_url(url):
     if not url or url is None:
         return False
@@ -24,25 +24,35 @@ class LocalDownloader(BaseDownloader):
     server.
     """
 
-    def download_resources(self, resources, progress_report, in_memory=False):
+    def download_resources(self, resources, progress_report, in_memory=False,
+                           raise_on_error=True):
         # Only do one query for this implementation
         progress_report.query_finished_count = 0
         progress_report.query_total_count = (len(resources))
         progress_report.update_progress()
 
         for resource in resources:
-            progress_report.current_query = resource['url']
-            path = resource['url'][len('file://'):]
+            self._check_cancelled()
+
+            # The variant of an index the Release file picked, if any
+            url = resource.get('variant_url', resource['url'])
+            progress_report.current_query = url
+            path = url[len('file://'):]
 
             if not os.path.exists(path):
                 # The caller will take care of stuffing this error into the
                 # progress report
-                raise FileNotFoundException(resource['url'])
+                if raise_on_error:
+                    raise FileNotFoundException(url)
+                resource['error'] = FileNotFoundException(url)
+                continue
 
             if in_memory:
                 resource['content'] = utils._read(path, as_list=True)
             else:
-                resource['path'] = resource['url'][len('file://'):]
+                resource['path'] = path
+                if resource.get('type') not in ('packages', 'sources'):
+                    progress_report.add_finished_bytes(os.path.getsize(path))
 
             progress_report.query_finished_count += 1
         progress_report.update_progress()
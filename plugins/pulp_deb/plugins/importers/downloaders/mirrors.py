@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Selection between equivalent mirrors of a repository. Every resource URL
+starts with the repository URL of the distribution; the same path is
+expected under each mirror URL.
+"""
+
+import urlparse
+
+
+# -- constants ----------------------------------------------------------------
+
+# Assumed until a mirror was measured, so unknown mirrors are tried as well
+DEFAULT_LATENCY = 0.5
+DEFAULT_SPEED = 1024 * 1024
+
+# Size assumed for a resource that does not list its size (e.g. an index)
+DEFAULT_SIZE = 1024 * 1024
+
+# Transfers smaller than this tell more about the latency than the speed of
+# a mirror, so they do not update its speed
+MIN_SPEED_SAMPLE = 64 * 1024
+
+# Weight of the newest measurement in the running averages
+SMOOTHING = 0.3
+
+# Number of failures in a row after which a mirror is only used for the
+# resources no healthy mirror could provide
+MAX_FAILURES = 3
+
+
+# -- mirrors ------------------------------------------------------------------
+
+
+class Mirror(object):
+    """
+    A single mirror along with what was measured of it during the sync.
+    """
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.host = urlparse.urlparse(self.url).netloc
+
+        # Running averages of the seconds until the first byte arrived and of
+        # the bytes per second of the transfers; None until measured
+        self.latency = None
+        self.speed = None
+
+        # Transfers currently in progress on the mirror
+        self.active = 0
+
+        self.healthy = True
+        self.consecutive_failures = 0
+
+        self.files = 0
+        self.bytes = 0
+        self.failures = 0
+
+    def cost(self, size):
+        """
+        Estimates how long a transfer of the given size would take on this
+        mirror, assuming the bandwidth is shared with the transfers already
+        in progress on it.
+
+        :param size: number of bytes to transfer
+        :type  size: int
+
+        :return: estimated duration in seconds
+        :rtype:  float
+        """
+        latency = self.latency
+        if latency is None:
+            latency = DEFAULT_LATENCY
+        speed = self.speed or DEFAULT_SPEED
+        return latency + (self.active + 1) * float(size) / speed
+
+    def statistics(self):
+        return {
+            'healthy': self.healthy,
+            'latency': self.latency,
+            'speed': self.speed,
+            'files': self.files,
+            'bytes': self.bytes,
+            'failures': self.failures,
+        }
+
+
+class MirrorSet(object):
+    """
+    The mirrors a repository can be retrieved from, the first of which is the
+    repository URL of the distribution.
+
+    Each transfer is started on the mirror expected to complete it first,
+    which spreads the transfers across the mirrors according to their
+    measured latency and speed. A transfer that fails on a mirror is
+    retried on one it has not been tried on yet. Mirrors failing repeatedly
+    are considered unhealthy and only used for resources the healthy ones
+    could not provide.
+    """
+
+    def __init__(self, urls):
+        """
+        :param urls: repository URL followed by the URLs of its mirrors
+        :type  urls: list of str
+        """
+        self.mirrors = []
+        for url in urls:
+            if url.rstrip('/') not in [m.url for m in self.mirrors]:
+                self.mirrors.append(Mirror(url))
+
+        # All resource URLs are built from the first one
+        self.primary = self.mirrors[0]
+
+        self.probed = False
+
+    def __len__(self):
+        return len(self.mirrors)
+
+    def mirror_url(self, url, mirror):
+        """
+        Translates a resource URL built from the repository URL to the same
+        resource on the given mirror.
+
+        :param url: URL of the resource under the repository URL
+        :type  url: str
+
+        :param mirror: mirror the resource will be retrieved from
+        :type  mirror: Mirror
+
+        :rtype: str
+        """
+        if mirror is self.primary or not url.startswith(self.primary.url):
+            return url
+        return mirror.url + url[len(self.primary.url):]
+
+    def select(self, size=None, exclude=(), is_full=None):
+        """
+        Picks the mirror to start a transfer on.
+
+        :param size: size of the resource, if known
+        :type  size: int or None
+
+        :param exclude: mirrors the resource was already tried on
+        :type  exclude: list of Mirror
+
+        :param is_full: returns whether a mirror cannot take another
+               transfer right now
+        :type  is_full: func
+
+        :return: mirror to use, or None if the transfer has to wait for one
+                 of the candidates to have room
+        :rtype:  Mirror or None
+        """
+        candidates = [m for m in self.mirrors if m not in exclude]
+
+        # Unhealthy mirrors are the last resort; rather wait for a healthy
+        # one to have room than use them
+        healthy = [m for m in candidates if m.healthy]
+        if healthy:
+            candidates = healthy
+
+        if is_full is not None:
+            candidates = [m for m in candidates if not is_full(m)]
+        if not candidates:
+            return None
+
+        size = size or DEFAULT_SIZE
+        best = candidates[0]
+        for mirror in candidates[1:]:
+            if mirror.cost(size) < best.cost(size):
+                best = mirror
+        return best
+
+    def has_untried(self, exclude):
+        """
+        :param exclude: mirrors a resource was already tried on
+        :type  exclude: list of Mirror
+
+        :return: whether there is a mirror left to try the resource on
+        :rtype:  bool
+        """
+        return len(exclude) < len(self.mirrors)
+
+    def started(self, mirror):
+        mirror.active += 1
+
+    def succeeded(self, mirror, size, latency, speed):
+        """
+        Records a transfer completed by the given mirror.
+
+        :param size: number of bytes received
+        :type  size: int
+
+        :param latency: seconds until the first byte was received
+        :type  latency: float
+
+        :param speed: average bytes per second of the transfer
+        :type  speed: float
+        """
+        mirror.active -= 1
+        mirror.files += 1
+        mirror.bytes += size
+        mirror.consecutive_failures = 0
+        mirror.healthy = True
+
+        mirror.latency = _smooth(mirror.latency, latency)
+        if size >= MIN_SPEED_SAMPLE and speed > 0:
+            mirror.speed = _smooth(mirror.speed, speed)
+
+    def failed(self, mirror):
+        """
+        Records a transfer the given mirror failed or stalled on.
+        """
+        mirror.active -= 1
+        mirror.failures += 1
+        mirror.consecutive_failures += 1
+        if mirror.consecutive_failures >= MAX_FAILURES:
+            mirror.healthy = False
+
+    def aborted(self, mirror):
+        """
+        Records a transfer stopped without a result, e.g. on cancel.
+        """
+        mirror.active -= 1
+
+    def probed_mirror(self, mirror, latency=None, speed=None):
+        """
+        Records the result of probing the given mirror at the start of the
+        sync; a mirror that could not be probed is considered unhealthy.
+        """
+        if latency is None:
+            mirror.healthy = False
+            mirror.failures += 1
+            return
+
+        mirror.latency = latency
+        if speed:
+            mirror.speed = speed
+
+    def statistics(self):
+        """
+        :return: statistics of each mirror keyed by its URL
+        :rtype:  dict
+        """
+        return dict([(m.url, m.statistics()) for m in self.mirrors])
+
+
+# -- utilities ----------------------------------------------------------------
+
+
+def _smooth(average, value):
+    if average is None:
+        return value
+    return (1 - SMOOTHING) * average + SMOOTHING * value
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Support for the incremental updates of the Packages and Sources indexes
+published next to them as "pdiffs": Packages.diff/Index lists the checksum
+of the current index, the checksums of its previous versions (the history)
+and, for each previous version, an ed script turning it into the next one.
+A merged index (X-Patch-Precedence: merged) has each script turn its
+version straight into the current one instead.
+
+The scripts are applied to the uncompressed index and are checked against
+the checksums of the index, as is the patched index.
+"""
+
+import hashlib
+import re
+import zlib
+
+from debian.deb822 import Deb822
+
+from pulp_deb.common import utils
+
+
+# -- constants ----------------------------------------------------------------
+
+# Name of the file describing the diffs, relative to the index's diff
+# directory (e.g. binary-amd64/Packages.diff/Index)
+DIFF_INDEX = 'Index'
+
+# Checksums of the diff index, strongest first
+ALGORITHMS = ('SHA256', 'SHA1')
+
+# Size of the blocks a cached index is read in to compute its checksum
+READ_BLOCK_SIZE = 1024 * 1024
+
+# Commands of the ed scripts, as written by diff --ed: "5a", "5,7c", "5d"
+_COMMAND = re.compile(r'^(\d+)(?:,(\d+))?([acd])$')
+
+
+# -- public -------------------------------------------------------------------
+
+
+class PatchError(Exception):
+    """
+    Raised when an index cannot be brought up to date with its diffs, in
+    which case the whole index has to be retrieved.
+    """
+    pass
+
+
+def diff_index_url(url):
+    """
+    :param url: URL of a compressed index, e.g. .../binary-amd64/Packages.gz
+    :type  url: str
+
+    :return: URL of the index's diff index, e.g. .../Packages.diff/Index
+    :rtype:  str
+    """
+    return '%s.diff/%s' % (utils.strip_extension(url), DIFF_INDEX)
+
+
+def patch_url(url, name):
+    """
+    :param url: URL of a compressed index
+    :type  url: str
+
+    :param name: name of a patch as listed by the diff index
+    :type  name: str
+
+    :return: URL of the compressed patch
+    :rtype:  str
+    """
+    return '%s.diff/%s.gz' % (utils.strip_extension(url), name)
+
+
+class DiffIndex(object):
+    """
+    Parsed Packages.diff/Index (or Sources.diff/Index) of an index.
+    """
+
+    def __init__(self, lines):
+        """
+        :param lines: lines of the diff index
+        :type  lines: iterable of str
+        """
+        fields = Deb822(lines)
+
+        for algorithm in ALGORITHMS:
+            if '%s-Current' % algorithm in fields:
+                break
+        else:
+            raise PatchError('The diff index lists no current checksum')
+
+        self.algorithm = algorithm.lower()
+        try:
+            digest, size = fields['%s-Current' % algorithm].split()
+            self.current = (digest, int(size))
+            # List of (checksum, size, patch name) of the previous versions,
+            # oldest first
+            self.history = _entries(fields.get('%s-History' % algorithm, ''))
+            # Checksum and size of each uncompressed patch keyed by its name
+            self.patches = dict([(name, (digest, size)) for digest, size, name in
+                                 _entries(fields.get('%s-Patches' % algorithm, ''))])
+        except ValueError:
+            raise PatchError('Malformed diff index')
+
+        self.merged = fields.get('X-Patch-Precedence', '').strip() == 'merged'
+
+    def patches_from(self, digest, size):
+        """
+        Returns the patches to apply, in order, to the version of the index
+        with the given checksum and size to turn it into the current one.
+
+        :param digest: hex checksum of the uncompressed index, computed with
+               the algorithm of the diff index
+        :type  digest: str
+
+        :param size: size of the uncompressed index
+        :type  size: int
+
+        :return: names of the patches; empty if the index is current
+        :rtype:  list of str
+
+        :raise PatchError: if the version is not one the diffs start from
+        """
+        if (digest, size) == self.current:
+            return []
+
+        for i, (history_digest, history_size, name) in enumerate(self.history):
+            if (history_digest, history_size) == (digest, size):
+                if self.merged:
+                    names = [name]
+                else:
+                    names = [entry[2] for entry in self.history[i:]]
+                break
+        else:
+            raise PatchError('The cached index is not in the diff history')
+
+        for name in names:
+            if name not in self.patches:
+                raise PatchError('The diff index does not describe patch %s' % name)
+        return names
+
+    def verify_patch(self, name, content):
+        """
+        Checks the uncompressed content of the given patch against the diff
+        index.
+
+        :raise PatchError: if it does not match
+        """
+        if digest_of([content], self.algorithm) != self.patches[name]:
+            raise PatchError('Patch %s does not match the diff index' % name)
+
+    def verify_result(self, lines):
+        """
+        Checks the patched index against the current checksum of the diff
+        index.
+
+        :raise PatchError: if it does not match
+        """
+        if digest_of(lines, self.algorithm) != self.current:
+            raise PatchError('The patched index does not match the diff index')
+
+
+def decompress_patch(data):
+    """
+    :param data: gzip compressed patch as retrieved
+    :type  data: str
+
+    :return: the patch
+    :rtype:  str
+    """
+    try:
+        return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+    except zlib.error, e:
+        raise PatchError('Corrupt patch: %s' % e)
+
+
+def parse_ed(lines):
+    """
+    Parses an ed script as written by diff --ed into the list of changes it
+    makes. The commands of such a script are ordered from the end of the
+    file to its start, so each applies to the line numbers of the original.
+
+    :param lines: lines of the script
+    :type  lines: iterable of str
+
+    :return: list of (start, end, new lines) tuples, ordered from the start
+             of the file; lines [start, end) of the original (0 based) are
+             replaced by the new lines
+    :rtype:  list
+
+    :raise PatchError: if the script uses commands other than a, c and d
+    """
+    changes = []
+    lines = iter(lines)
+    for line in lines:
+        match = _COMMAND.match(line.rstrip('\n'))
+        if match is None:
+            raise PatchError('Unsupported ed command: %r' % line)
+
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        action = match.group(3)
+
+        text = []
+        if action in 'ac':
+            for text_line in lines:
+                if text_line.rstrip('\n') == '.':
+                    break
+                text.append(text_line)
+            else:
+                raise PatchError('Unterminated text of ed command: %r' % line)
+
+        if action == 'a':
+            changes.append((first, first, text))
+        else:
+            changes.append((first - 1, last, text))
+
+    changes.reverse()
+    return changes
+
+
+def apply_ed(lines, changes):
+    """
+    Applies the changes of an ed script to the given lines. The result is
+    assembled in a single pass, so the cost does not depend on the number of
+    changes.
+
+    :param lines: lines of the file to patch
+    :type  lines: list of str
+
+    :param changes: changes as returned by parse_ed
+    :type  changes: list
+
+    :return: lines of the patched file
+    :rtype:  list of str
+
+    :raise PatchError: if the changes do not fit the file
+    """
+    result = []
+    position = 0
+    for start, end, text in changes:
+        if start < position or end > len(lines) or end < start:
+            raise PatchError('Patch does not apply to the index')
+        result.extend(lines[position:start])
+        result.extend(text)
+        position = end
+    result.extend(lines[position:])
+    return result
+
+
+def digest_of(lines, algorithm):
+    """
+    :param lines: content to compute the checksum of, in pieces
+    :type  lines: iterable of str
+
+    :param algorithm: hashlib name of the checksum, e.g. sha256
+    :type  algorithm: str
+
+    :return: hex checksum and size of the content
+    :rtype:  tuple
+    """
+    checksum = hashlib.new(algorithm)
+    size = 0
+    for line in lines:
+        checksum.update(line)
+        size += len(line)
+    return checksum.hexdigest(), size
+
+
+def file_digest(filename, algorithm):
+    """
+    :return: hex checksum and size of the uncompressed content of the given
+             cached index
+    :rtype:  tuple
+    """
+    f = utils.open_index(filename)
+    try:
+        return digest_of(iter(lambda: f.read(READ_BLOCK_SIZE), ''), algorithm)
+    finally:
+        f.close()
+
+
+# -- utilities ----------------------------------------------------------------
+
+
+def _entries(value):
+    """
+    Parses the lines of a multi-line field of the diff index, each of which
+    holds a checksum, a size and a name.
+    """
+    entries = []
+    for line in value.splitlines():
+        if not line.strip():
+            continue
+        digest, size, name = line.split()
+        entries.append((digest, int(size), name))
+    return entries
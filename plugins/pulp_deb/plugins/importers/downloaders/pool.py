@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Pool of reusable curl handles used by the HTTP downloader for the duration
+of a sync.
+"""
+
+import pycurl
+
+
+class ConnectionPool(object):
+    """
+    Keeps idle curl handles around, keyed by the host they last talked to,
+    so the next transfer to that host picks up the handle along with its
+    keep-alive connection. All handles share a single DNS and TLS session
+    cache, so even a new handle skips the lookup and full handshake for a
+    host that was already contacted.
+
+    The pool also keeps track of how many connections its transfers had to
+    open versus how many were served from an existing connection.
+    """
+
+    def __init__(self, create_call, configure_call):
+        """
+        :param create_call: creates and configures a new curl handle
+        :type  create_call: func
+
+        :param configure_call: applies the downloader options to a handle
+               that was reset before being reused
+        :type  configure_call: func
+        """
+        self.create_call = create_call
+        self.configure_call = configure_call
+
+        self.share = pycurl.CurlShare()
+        self.share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+        self.share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+
+        self.idle = {}
+
+        self.connections_opened = 0
+        self.connections_reused = 0
+
+    def acquire(self, host):
+        """
+        Returns a configured curl handle for a transfer from the given host,
+        reusing an idle one if possible.
+
+        :param host: host (and port) the transfer will connect to
+        :type  host: str
+
+        :rtype: pycurl.Curl
+        """
+        idle = self.idle.get(host)
+        if idle:
+            # The reset keeps the live connections and the share
+            curl = idle.pop()
+            curl.reset()
+            self.configure_call(curl)
+        else:
+            curl = self.create_call()
+            curl.setopt(pycurl.SHARE, self.share)
+        return curl
+
+    def release(self, host, curl):
+        """
+        Returns the handle of a finished transfer to the pool and records
+        whether the transfer needed a new connection.
+
+        :param host: host (and port) the transfer connected to
+        :type  host: str
+
+        :param curl: handle the transfer was performed with
+        :type  curl: pycurl.Curl
+        """
+        num_connects = curl.getinfo(pycurl.NUM_CONNECTS)
+        if num_connects:
+            self.connections_opened += num_connects
+        else:
+            self.connections_reused += 1
+
+        self.idle.setdefault(host, []).append(curl)
+
+    def close(self):
+        """
+        Closes every idle handle and the shared caches. The pool must not be
+        used after this call.
+        """
+        for handles in self.idle.values():
+            for curl in handles:
+                curl.close()
+        self.idle = {}
+        self.share.close()
+
+    def statistics(self):
+        """
+        :return: counts of the connections opened and reused by the transfers
+        :rtype:  dict
+        """
+        return {
+            'opened': self.connections_opened,
+            'reused': self.connections_reused,
+        }
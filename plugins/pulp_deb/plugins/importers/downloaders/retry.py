@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Handling of transient download failures: which failures are worth another
+attempt, how long to wait before it, and when to stop sending requests to a
+host that keeps failing.
+"""
+
+import logging
+import random
+import time
+
+from pulp_deb.plugins.importers.downloaders import exceptions
+
+
+# -- constants ----------------------------------------------------------------
+
+# Kinds of transient failures
+FAILURE_CONNECT = 'connect'
+FAILURE_TRANSFER = 'transfer'
+FAILURE_SERVER = 'server'
+
+# Upper bound of the wait before a retry, in seconds
+MAX_RETRY_DELAY = 60
+
+# Number of failures in a row after which a host is paused, and how long it
+# is paused for; the pause doubles each time the first request after it
+# fails as well
+BREAKER_THRESHOLD = 5
+BREAKER_PAUSE = 30
+BREAKER_MAX_PAUSE = 5 * 60
+
+_LOG = logging.getLogger(__name__)
+
+
+# -- public -------------------------------------------------------------------
+
+
+def failure_kind(error):
+    """
+    Tells apart the transient failures from those another attempt will not
+    fix (e.g. a missing file or a checksum mismatch).
+
+    :param error: exception a transfer failed with
+    :type  error: Exception
+
+    :return: one of the FAILURE_* kinds, or None if the failure is permanent
+    :rtype:  str or None
+    """
+    # Checked first, it is a subclass of ConnectionException
+    if isinstance(error, exceptions.TransferException):
+        return FAILURE_TRANSFER
+    if isinstance(error, exceptions.ConnectionException):
+        return FAILURE_CONNECT
+    if isinstance(error, exceptions.ServerErrorException):
+        return FAILURE_SERVER
+    return None
+
+
+def is_transient(error):
+    """
+    :return: whether the given failure may not happen again on a later attempt
+    :rtype:  bool
+    """
+    return failure_kind(error) is not None
+
+
+class RetryPolicy(object):
+    """
+    Decides whether a failed transfer is attempted again and how long to wait
+    before the attempt.
+
+    The wait grows exponentially with the number of attempts made and is
+    spread randomly between zero and that bound ("full jitter"), so the
+    transfers failed by the same outage do not all come back at once. A
+    transfer interrupted midway is retried right away the first time: it
+    resumes from what was received and the connection is usually what
+    failed, not the server.
+    """
+
+    def __init__(self, max_retries, base_delay, max_delay=MAX_RETRY_DELAY,
+                 random=random.random):
+        """
+        :param max_retries: number of attempts made after the first one
+        :type  max_retries: int
+
+        :param base_delay: bound of the wait before the first retry, in seconds
+        :type  base_delay: float
+
+        :param max_delay: bound of the wait before any retry, in seconds
+        :type  max_delay: float
+
+        :param random: returns a random float in [0, 1)
+        :type  random: func
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.random = random
+
+    def should_retry(self, error, retries):
+        """
+        :param error: exception the last attempt failed with
+        :type  error: Exception
+
+        :param retries: number of retries already made
+        :type  retries: int
+
+        :rtype: bool
+        """
+        return retries < self.max_retries and is_transient(error)
+
+    def delay(self, error, retries):
+        """
+        :param error: exception the last attempt failed with
+        :type  error: Exception
+
+        :param retries: number of retries already made
+        :type  retries: int
+
+        :return: seconds to wait before the next attempt
+        :rtype:  float
+        """
+        exponent = retries
+        if failure_kind(error) == FAILURE_TRANSFER:
+            if retries == 0:
+                return 0.0
+            exponent -= 1
+
+        bound = min(self.max_delay, self.base_delay * (2 ** exponent))
+        delay = self.random() * bound
+
+        # The server knows best when it will be back
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+class CircuitBreaker(object):
+    """
+    Keeps track of the hosts failing to connect or answering with server
+    errors. Once a host failed a number of times in a row, no new transfers
+    are started on it for a while; the transfers already running are left
+    alone. The first transfer completed after the pause closes the circuit
+    again, while a failure pauses the host once more for twice as long.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, pause=BREAKER_PAUSE,
+                 max_pause=BREAKER_MAX_PAUSE, clock=time.time):
+        self.threshold = threshold
+        self.pause = pause
+        self.max_pause = max_pause
+        self.clock = clock
+
+        # Host to [consecutive failures, paused until, last pause]
+        self.hosts = {}
+
+        self.trips = 0
+
+    def allows(self, host):
+        """
+        :return: whether a transfer may be started on the given host
+        :rtype:  bool
+        """
+        return self.delay(host) == 0
+
+    def delay(self, host):
+        """
+        :return: seconds until transfers may be started on the host again
+        :rtype:  float
+        """
+        state = self.hosts.get(host)
+        if state is None:
+            return 0
+        return max(0, state[1] - self.clock())
+
+    def record(self, host, error):
+        """
+        Records the outcome of a transfer performed on the given host.
+
+        :param error: exception the transfer failed with, None if it succeeded
+        :type  error: Exception or None
+        """
+        if error is None:
+            self.hosts.pop(host, None)
+            return
+
+        if failure_kind(error) not in (FAILURE_CONNECT, FAILURE_SERVER):
+            return
+
+        state = self.hosts.setdefault(host, [0, 0, 0])
+        state[0] += 1
+        if state[0] < self.threshold or not self.allows(host):
+            return
+
+        if state[2]:
+            pause = min(self.max_pause, state[2] * 2)
+        else:
+            pause = self.pause
+        state[1] = self.clock() + pause
+        state[2] = pause
+        self.trips += 1
+        _LOG.warn('Pausing transfers from <%s> for %s seconds after %s failures' %
+                  (host, pause, state[0]))
+
+    def statistics(self):
+        """
+        :return: number of times a host was paused and the hosts still failing
+        :rtype:  dict
+        """
+        return {
+            'trips': self.trips,
+            'failing_hosts': sorted(self.hosts.keys()),
+        }
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Bandwidth limiting for the downloaders. Every transfer of a sync draws from
+the same token bucket, so the limit applies to the sync as a whole no matter
+how many files are retrieved in parallel. Syncs running in the same worker
+process can additionally share a worker wide limit, which is split evenly
+between them.
+"""
+
+import threading
+import time
+
+
+# -- limiters -----------------------------------------------------------------
+
+
+class TokenBucket(object):
+    """
+    Classic token bucket: tokens (bytes) are added at a fixed rate up to a
+    capacity, and each byte transferred takes one. Consuming more tokens than
+    are available is allowed; the debt is paid back by the refill before any
+    more data may be transferred.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.time):
+        """
+        :param rate: number of bytes allowed per second
+        :type  rate: int
+
+        :param capacity: maximum number of bytes that can be transferred in
+               a burst after the bucket was idle; defaults to one second
+               worth of transfer
+        :type  capacity: int
+
+        :param clock: returns the current time in seconds
+        :type  clock: func
+        """
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        self.rate = float(rate)
+        self.capacity = capacity
+        self.tokens = float(self._capacity())
+        self.last = clock()
+
+    def set_rate(self, rate):
+        """
+        Changes the rate of the bucket; the tokens gathered so far at the
+        previous rate are kept.
+        """
+        self.lock.acquire()
+        try:
+            self._refill()
+            self.rate = float(rate)
+            self.tokens = min(self.tokens, self._capacity())
+        finally:
+            self.lock.release()
+
+    def available(self):
+        """
+        :return: whether data may be transferred right now
+        :rtype:  bool
+        """
+        self.lock.acquire()
+        try:
+            self._refill()
+            return self.tokens > 0
+        finally:
+            self.lock.release()
+
+    def consume(self, count):
+        """
+        Takes the given number of tokens from the bucket.
+        """
+        self.lock.acquire()
+        try:
+            self._refill()
+            self.tokens -= count
+        finally:
+            self.lock.release()
+
+    def delay(self):
+        """
+        :return: number of seconds until data may be transferred again
+        :rtype:  float
+        """
+        self.lock.acquire()
+        try:
+            self._refill()
+            if self.tokens > 0:
+                return 0.0
+            return (1 - self.tokens) / self.rate
+        finally:
+            self.lock.release()
+
+    def _capacity(self):
+        if self.capacity is None:
+            return self.rate
+        return self.capacity
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self._capacity(), self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+
+class BandwidthLimiter(TokenBucket):
+    """
+    Limits the bandwidth of a single sync. The rate is the sync's own limit
+    or, if a worker wide limit is given, its share of that limit, whichever
+    is lower. The limiter must be closed once the sync is done so the other
+    syncs of the worker get its share back.
+    """
+
+    def __init__(self, max_speed=None, worker_max_speed=None, clock=time.time):
+        """
+        :param max_speed: limit of the sync in bytes per second, if any
+        :type  max_speed: int or None
+
+        :param worker_max_speed: limit of all syncs in the worker process in
+               bytes per second, if any
+        :type  worker_max_speed: int or None
+        """
+        self.max_speed = max_speed
+        self.worker_max_speed = worker_max_speed
+
+        TokenBucket.__init__(self, max_speed or worker_max_speed, clock=clock)
+
+        if worker_max_speed is not None:
+            WORKER_BANDWIDTH.join(self)
+
+    def update_share(self, share):
+        """
+        Called by the worker bandwidth whenever the share of this limiter
+        changes.
+
+        :param share: bytes per second this limiter may use of the worker limit
+        :type  share: float
+        """
+        rate = share
+        if self.max_speed is not None:
+            rate = min(rate, self.max_speed)
+        self.set_rate(rate)
+
+    def close(self):
+        """
+        Gives the share of the worker limit back to the other syncs.
+        """
+        if self.worker_max_speed is not None:
+            WORKER_BANDWIDTH.leave(self)
+
+
+class WorkerBandwidth(object):
+    """
+    Keeps track of the limiters of the syncs currently running in the worker
+    process and splits the worker limit evenly between them. If the syncs
+    were configured with different worker limits, the lowest one is used.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.limiters = []
+
+    def join(self, limiter):
+        self.lock.acquire()
+        try:
+            self.limiters.append(limiter)
+            self._split()
+        finally:
+            self.lock.release()
+
+    def leave(self, limiter):
+        self.lock.acquire()
+        try:
+            if limiter in self.limiters:
+                self.limiters.remove(limiter)
+                self._split()
+        finally:
+            self.lock.release()
+
+    def _split(self):
+        if not self.limiters:
+            return
+        worker_max_speed = min([l.worker_max_speed for l in self.limiters])
+        share = float(worker_max_speed) / len(self.limiters)
+        for limiter in self.limiters:
+            limiter.update_share(share)
+
+
+# Shared by every sync running in this process
+WORKER_BANDWIDTH = WorkerBandwidth()
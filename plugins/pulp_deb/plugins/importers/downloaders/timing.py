@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Network timings of the transfers, as measured by curl, gathered per host to
+tell where the time of a slow sync goes: name lookup, connection, TLS
+handshake, waiting for the server or the transfer itself.
+"""
+
+import math
+
+import pycurl
+from pulp.common.compat import json
+
+
+# -- constants ----------------------------------------------------------------
+
+# Values read from curl for each transfer. The times are the seconds from the
+# start of the transfer until each phase completed.
+CURL_INFO = (
+    ('namelookup_time', pycurl.NAMELOOKUP_TIME),
+    ('connect_time', pycurl.CONNECT_TIME),
+    ('appconnect_time', pycurl.APPCONNECT_TIME),
+    ('starttransfer_time', pycurl.STARTTRANSFER_TIME),
+    ('total_time', pycurl.TOTAL_TIME),
+    ('speed_download', pycurl.SPEED_DOWNLOAD),
+    ('size_download', pycurl.SIZE_DOWNLOAD),
+)
+
+# Percentiles reported for each value
+PERCENTILES = (50, 90, 99)
+
+# Name of the file the timings are written to in the repository working
+# directory, when configured to
+DUMP_FILENAME = 'transfer-timings.json'
+
+
+# -- timings ------------------------------------------------------------------
+
+
+class TransferTimings(object):
+    """
+    Collects the values of CURL_INFO for each transfer, keyed by the host the
+    transfer was made to.
+    """
+
+    def __init__(self):
+        # Lists of the values of the transfers to each host, keyed by the
+        # host and then by the name of the value
+        self.hosts = {}
+
+    def record(self, host, values):
+        """
+        :param host: host the transfer was made to
+        :type  host: str
+
+        :param values: values of the transfer keyed by their name in
+               CURL_INFO; see curl_values
+        :type  values: dict
+        """
+        samples = self.hosts.setdefault(host, dict([(name, []) for name, i in CURL_INFO]))
+        for name, value in values.items():
+            samples[name].append(value)
+
+    def statistics(self):
+        """
+        Summarizes the values of each host: the number of transfers and of
+        bytes, and for each value its percentiles and maximum.
+
+        :return: summary keyed by host
+        :rtype:  dict
+        """
+        stats = {}
+        for host, samples in self.hosts.items():
+            host_stats = {
+                'transfers': len(samples['total_time']),
+                'bytes': int(sum(samples['size_download'])),
+            }
+            for name, values in samples.items():
+                if name == 'size_download' or not values:
+                    continue
+                values = sorted(values)
+                summary = dict([('p%s' % p, percentile(values, p)) for p in PERCENTILES])
+                summary['max'] = values[-1]
+                host_stats[name] = summary
+            stats[host] = host_stats
+        return stats
+
+    def dump(self, filename):
+        """
+        Writes the summary and the value of every transfer to the given file
+        as JSON.
+        """
+        f = open(filename, 'w')
+        try:
+            json.dump({'statistics': self.statistics(), 'transfers': self.hosts}, f)
+        finally:
+            f.close()
+
+
+# -- utilities ----------------------------------------------------------------
+
+
+def curl_values(curl):
+    """
+    Reads the values of CURL_INFO from a curl handle that completed a transfer.
+
+    :type curl: pycurl.Curl
+
+    :return: values keyed by their name in CURL_INFO
+    :rtype:  dict
+    """
+    return dict([(name, curl.getinfo(info)) for name, info in CURL_INFO])
+
+
+def percentile(values, p):
+    """
+    :param values: sorted values
+    :type  values: list
+
+    :param p: percentile, between 0 and 100
+    :type  p: int
+
+    :return: the smallest of the values that at least p percent of the values
+             do not exceed (nearest rank)
+    """
+    rank = int(math.ceil(len(values) * p / 100.0))
+    return values[max(rank, 1) - 1]
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Verification of downloaded files against the size and checksums listed for
+them in the repository indexes, computed while the data is being written.
+"""
+
+import hashlib
+
+from pulp_deb.plugins.importers.downloaders import exceptions
+
+
+# -- constants ----------------------------------------------------------------
+
+# Checksum types found on the resources, mapped to their hashlib name
+CHECKSUM_TYPES = {
+    'md5sum': 'md5',
+    'sha1': 'sha1',
+    'sha256': 'sha256',
+}
+
+
+# -- verifiers ----------------------------------------------------------------
+
+
+class StreamVerifier(object):
+    """
+    Computes the size and checksums of a file from the blocks of data fed to
+    it, and compares them to the expected values once the file is complete.
+    Only the checksum types that have an expected value are computed.
+    """
+
+    def __init__(self, location, expected):
+        """
+        :param location: where the file is retrieved from, used in errors
+        :type  location: str
+
+        :param expected: expected values keyed by 'size' and the checksum
+               types in CHECKSUM_TYPES; see expected_values
+        :type  expected: dict
+        """
+        self.location = location
+        self.expected = expected
+        self.reset()
+
+    def reset(self):
+        """
+        Discards the data fed so far, used when the file is written again
+        from its start.
+        """
+        self.size = 0
+        self.hashes = dict([(k, hashlib.new(CHECKSUM_TYPES[k]))
+                            for k in CHECKSUM_TYPES if k in self.expected])
+
+    def update(self, buffer):
+        """
+        Feeds the next block of the file.
+
+        :return: false if the data already exceeds the expected size
+        :rtype:  bool
+        """
+        self.size += len(buffer)
+        for h in self.hashes.values():
+            h.update(buffer)
+        return not self.exceeded()
+
+    def exceeded(self):
+        """
+        :return: whether more data than the expected size was fed
+        :rtype:  bool
+        """
+        return 'size' in self.expected and self.size > self.expected['size']
+
+    def verify(self):
+        """
+        Compares the data fed since the last reset to the expected values.
+
+        :return: the verified size and checksums, keyed like the expected values
+        :rtype:  dict
+
+        :raise exceptions.VerificationException: if any of them does not match
+        """
+        if 'size' in self.expected and self.size != self.expected['size']:
+            raise exceptions.VerificationException(
+                self.location, 'size', self.expected['size'], self.size)
+
+        verified = {'size': self.size}
+        for key, h in self.hashes.items():
+            digest = h.hexdigest()
+            if digest != self.expected[key]:
+                raise exceptions.VerificationException(
+                    self.location, key, self.expected[key], digest)
+            verified[key] = digest
+        return verified
+
+
+# -- utilities ----------------------------------------------------------------
+
+
+def expected_values(resource):
+    """
+    Extracts the size and checksums listed for a resource in the indexes.
+
+    :param resource: resource as returned by Package.get_resources
+    :type  resource: dict
+
+    :return: expected values keyed by 'size' and checksum type; empty if the
+             resource has none
+    :rtype:  dict
+    """
+    expected = {}
+    if resource.get('size'):
+        expected['size'] = int(resource['size'])
+    for key in CHECKSUM_TYPES:
+        if resource.get(key):
+            expected[key] = resource[key].lower()
+    return expected
@@ -14,12 +14,18 @@
 import copy
 import logging
 import os
+import time
+import urlparse
 
 import pycurl
+from pulp.common.compat import json
 from pulp.common.util import encode_unicode
 
-from pulp_deb.common import constants
-from pulp_deb.plugins.importers.downloaders import base, exceptions, url_utils
+from pulp_deb.common import constants, utils
+from pulp_deb.plugins.importers import storage
+from pulp_deb.plugins.importers.downloaders import (base, cache, exceptions, mirrors, pdiff,
+                                                    pool, retry, throttle, timing,
+                                                    url_utils, verification)
 
 
 # -- constants ----------------------------------------------------------------
@@ -27,6 +33,31 @@ from pulp_deb.plugins.importers.downloaders import base, exceptions, url_utils
 
 DOWNLOAD_TMP_DIR = 'http-downloads'
 
+# Suffix of the file stored next to a partial download to allow resuming it
+PARTIAL_SUFFIX = '.partial'
+
+# Size of the blocks a partial download is read back in to verify it
+VERIFY_BLOCK_SIZE = 64 * 1024
+
+# Number of bytes retrieved from each mirror to measure it, and how long the
+# probe may take
+PROBE_SIZE = 64 * 1024
+PROBE_TIMEOUT = 10
+
+# Seconds a transfer may stall before it is aborted; with mirrors configured,
+# the transfer moves to another mirror instead of waiting for a long time
+STALL_TIME = 5 * 60
+MIRROR_STALL_TIME = 30
+
+# curl errors raised before the server answered, and while it was answering
+CONNECT_ERRORS = (pycurl.E_COULDNT_RESOLVE_HOST, pycurl.E_COULDNT_RESOLVE_PROXY,
+                  pycurl.E_COULDNT_CONNECT, pycurl.E_SSL_CONNECT_ERROR)
+TRANSFER_ERRORS = (pycurl.E_PARTIAL_FILE, pycurl.E_OPERATION_TIMEDOUT, pycurl.E_GOT_NOTHING,
+                   pycurl.E_SEND_ERROR, pycurl.E_RECV_ERROR)
+
+# HTTP statuses for failures the server may recover from
+SERVER_ERROR_STATUSES = (408, 429)
+
 _LOG = logging.getLogger(__name__)
 
 
@@ -36,57 +67,289 @@ _LOG = logging.getLogger(__name__)
 class HttpDownloader(base.BaseDownloader):
     """
     Used when the source for deb packages is a remote source over HTTP.
+
+    All resources passed to a single download_resources call are retrieved
+    concurrently through a pycurl multi handle, bounded by the configured
+    maximum number of parallel transfers in total and per host.
+
+    The multi handle and a pool of curl handles are kept for the lifetime
+    of the downloader, so connections are reused across calls. The close
+    method must be called once the downloader is no longer needed.
+
+    Package files interrupted midway are kept in the working directory and
+    resumed with a range request by the next attempt, including one made by
+    a later sync (see StoredDownloadedContent).
+
+    If a bandwidth limit is configured, all transfers draw from a single
+    token bucket (see throttle.BandwidthLimiter). A transfer that runs out of
+    tokens is paused until the bucket has refilled.
+
+    The cancel hook is polled while transfers are running. Once the sync is
+    cancelled, the active transfers are aborted and a CancelledException is
+    raised, even if raise_on_error is false.
+
+    If mirrors of the repository are configured, each of them is probed with
+    a short request when the first resources are retrieved. Transfers are
+    then spread across the mirrors by their measured latency and speed, and
+    a transfer that fails or stalls on a mirror is retried on the next one
+    before its failure is reported (see mirrors.MirrorSet).
+
+    Transfers failing for a reason that may go away (connection errors,
+    interrupted transfers, 5xx responses) are retried after a growing,
+    randomized delay, up to the configured number of times. A host failing
+    too often in a row is paused for a while (see retry.CircuitBreaker).
+
+    An index whose cached copy has the checksum the Release file lists for
+    it (see the 'index_checksum' key of the resource) is not requested at
+    all. Other indexes cached by an earlier sync are brought up to date with
+    the diffs published next to them when possible, instead of being
+    retrieved whole (see pdiff). Indexes the diffs cannot be applied to are
+    retrieved as usual.
+
+    Indexes whose SHA256 checksum is known are kept in a cache keyed by the
+    checksum as well (see cache.BlobCache), which other repositories may
+    share; an index found there is not requested either. When the Release
+    file publishes the indexes under their checksum, they are retrieved
+    from that immutable location (see the 'by_hash_url' key of the resource),
+    falling back to the usual one if the server does not have it. Indexes
+    are retrieved in the compression the Release file picked (see the
+    'variant_url' key) but always cached under their usual URL.
+
+    Package files are kept in that cache as well once verified against
+    their SHA256 checksum. A package file found there, e.g. because another
+    repository retrieved it, is not requested.
+
+    The network timings curl measured for each completed transfer are
+    summarized per host in the statistics (see timing.TransferTimings), and
+    written to the working directory on close if configured to.
     """
 
-    def download_resources(self, resources, progress_report, in_memory=False):
+    def __init__(self, repo, conduit, config, is_cancelled_call):
+        super(HttpDownloader, self).__init__(repo, conduit, config, is_cancelled_call)
+
+        self.max_downloads = self._get_config_int(
+            constants.CONFIG_MAX_DOWNLOADS, constants.DEFAULT_MAX_DOWNLOADS)
+        self.max_downloads_per_host = self._get_config_int(
+            constants.CONFIG_MAX_DOWNLOADS_PER_HOST, constants.DEFAULT_MAX_DOWNLOADS_PER_HOST)
+
+        max_speed = self._get_config_int(constants.CONFIG_MAX_SPEED, None)
+        worker_max_speed = self._get_config_int(constants.CONFIG_WORKER_MAX_SPEED, None)
+        if max_speed is None and worker_max_speed is None:
+            self.limiter = None
+        else:
+            self.limiter = throttle.BandwidthLimiter(max_speed, worker_max_speed)
+
+        self.retry_policy = retry.RetryPolicy(
+            self._get_config_int(constants.CONFIG_MAX_RETRIES, constants.DEFAULT_MAX_RETRIES),
+            self._get_config_int(constants.CONFIG_RETRY_DELAY, constants.DEFAULT_RETRY_DELAY))
+        self.breaker = retry.CircuitBreaker()
+        self.retries = 0
+
+        self.mirrors = None
+        if self.config is not None and self.config.get(constants.CONFIG_MIRRORS):
+            dist = self.config.get(constants.CONFIG_DIST) or {}
+            if dist.get(constants.CONFIG_URL):
+                self.mirrors = mirrors.MirrorSet(
+                    [dist[constants.CONFIG_URL]] + list(self.config.get(constants.CONFIG_MIRRORS)))
+
+        self.pdiffs = constants.DEFAULT_PDIFFS
+        if self.config is not None and self.config.get(constants.CONFIG_PDIFFS) is not None:
+            self.pdiffs = self.config.get_boolean(constants.CONFIG_PDIFFS)
+        self.pdiff_stats = {'patched': 0, 'unchanged': 0, 'patches': 0, 'fallbacks': 0}
+
+        self.blob_cache = cache.worker_blob_cache(
+            cache.blob_cache_dir(self.config, repo.working_dir),
+            self._get_config_int(constants.CONFIG_CACHE_SIZE, constants.DEFAULT_CACHE_SIZE))
+        self.by_hash_stats = {'retrieved': 0, 'cached': 0, 'fallbacks': 0}
+        self.blob_cache_stats = {'hits': 0, 'misses': 0, 'bytes_saved': 0}
+
+        self.timings = timing.TransferTimings()
+        self.dump_timings = constants.DEFAULT_DUMP_TIMINGS
+        if self.config is not None and self.config.get(constants.CONFIG_DUMP_TIMINGS) is not None:
+            self.dump_timings = self.config.get_boolean(constants.CONFIG_DUMP_TIMINGS)
+
+        # Created on first use, see _get_multi and _get_pool
+        self.multi = None
+        self.pool = None
+
+    def download_resources(self, resources, progress_report, in_memory=False,
+                           raise_on_error=True):
         """
-        Retrieves all metadata documents needed to fulfill the configuration
-        set for the repository. The progress report will be updated as the
-        downloads take place.
+        Retrieves all of the given resources, either metadata documents or
+        package files. The progress report will be updated as the downloads
+        take place.
+
+        :param resources: resources to download
+        :type  resources: list
 
         :param progress_report: used to communicate the progress of this operation
         :type  progress_report: pulp_deb.importer.sync_progress.ProgressReport
 
+        :param in_memory: store the content of each resource under 'content'
+               instead of writing it to disk
+        :type  in_memory: bool
+
+        :param raise_on_error: if true, the remaining transfers are aborted
+               and the first failure is raised; otherwise the exception is
+               stored under the 'error' key of the failed resource
+        :type  raise_on_error: bool
+
         :return: Resources needed to download packages
         :rtype:  list
         """
+        self._check_cancelled()
+
+        if self.mirrors is not None and not self.mirrors.probed and resources:
+            self._probe_mirrors(resources[0]['url'])
+
         # Update the progress report to reflect the number of queries it will take
         progress_report.query_finished_count = 0
         progress_report.query_total_count = len(resources)
 
+        metadata_cache = cache.MetadataCache(self.repo.working_dir)
+
+        current = []
+        if not in_memory:
+            current = self._current_indexes(resources, metadata_cache)
+            found = set([id(r) for r in current])
+            current.extend(self._cached_indexes(
+                [r for r in resources if id(r) not in found], metadata_cache))
+            if self.pdiffs:
+                found = set([id(r) for r in current])
+                current.extend(self._patch_indexes(
+                    [r for r in resources if id(r) not in found], metadata_cache))
+            for resource in self._cached_packages(resources):
+                progress_report.add_finished_bytes(resource['verified']['size'])
+                current.append(resource)
+            progress_report.query_finished_count += len(current)
+        current = set([id(r) for r in current])
+
+        transfers = []
         for resource in resources:
-            _LOG.info('Retrieving URL <%s>' % resource['url'])
-            progress_report.current_query = resource['url']
-            progress_report.update_progress()
+            if id(resource) in current:
+                continue
 
-            # Let any exceptions from this bubble up, the caller will update
-            # the progress report as necessary
+            resumable = not in_memory and not _is_index(resource)
             if in_memory:
                 content = InMemoryDownloadedContent()
-                self._download_file(resource['url'], content)
-                resource['content'] = content.content.split('\n')
             else:
                 tmp_dir = _create_download_tmp_dir(self.repo.working_dir)
+                tmp_filename = _download_tmp_filename(tmp_dir, resource['url'])
+                # Package files can be large, keep what was retrieved of them
+                # if the transfer is interrupted
+                content = StoredDownloadedContent(tmp_filename,
+                                                  url=resumable and resource['url'] or None,
+                                                  size=_resource_size(resource))
+
+                # Check the file against the indexes (or the Release file)
+                # as it is written
+                expected = verification.expected_values(resource)
+                if expected:
+                    content.verifier = verification.StreamVerifier(resource['url'], expected)
+            # Indexes are identified by their usual URL whichever one they
+            # are retrieved from
+            url = resource.get('variant_url', resource['url'])
+            if not in_memory and _is_index(resource):
+                url = resource.get('by_hash_url', url)
+            transfer = Transfer(url, content, resource=resource)
+            transfer.resumable = resumable
+
+            # Only ask for indexes that changed since they were cached, unless
+            # the Release file already told they did
+            if not in_memory and _is_index(resource) and content.verifier is None:
+                transfer.request_headers = metadata_cache.request_headers(resource['url'])
+                transfer.conditional = len(transfer.request_headers) > 0
+
+            transfers.append(transfer)
 
-                name = resource['url'].split('/')[-1]
-                tmp_filename = os.path.join(tmp_dir, name)
+        def transfer_started(transfer):
+            _LOG.info('Retrieving URL <%s>' % transfer.request_url)
+            progress_report.current_query = transfer.url
+            progress_report.update_progress()
+
+        def transfer_finished(transfer):
+            resource = transfer.resource
+            if transfer.error is not None:
+                if not raise_on_error:
+                    resource['error'] = transfer.error
+                return
 
-                content = StoredDownloadedContent(tmp_filename)
-                content.open()
-                try:
-                    self._download_file(resource['url'], content)
-                    content.close()
-                except:
-                    content.close()
-                    content.delete()
-                    raise
-                resource['path'] = tmp_filename
+            if transfer.verified is not None:
+                resource['verified'] = transfer.verified
 
+            if in_memory:
+                # Iterable over the lines of the index, parsed without
+                # copying the content into a list
+                resource['content'] = transfer.destination
+            elif _is_index(resource):
+                resource['path'] = self._cache_index(metadata_cache, transfer)
+            else:
+                # The sync moves the file into the storage
+                resource['path'] = transfer.destination.filename
+                resource['temporary'] = True
+                progress_report.add_finished_bytes(os.path.getsize(resource['path']))
+                if transfer.verified and 'sha256' in transfer.verified:
+                    self.blob_cache.add(transfer.verified['sha256'], resource['path'])
             progress_report.query_finished_count += 1
 
+        self._perform_transfers(transfers, fail_fast=raise_on_error,
+                                started_callback=transfer_started,
+                                finished_callback=transfer_finished)
+
         progress_report.update_progress() # to get the final finished count out there
+
+        # Let the first failure bubble up, the caller will update the
+        # progress report as necessary
+        if raise_on_error:
+            for transfer in transfers:
+                if transfer.error is not None:
+                    raise transfer.error
+
         return resources
 
+    def close(self):
+        """
+        Closes the connections and handles kept open between downloads.
+        """
+        if self.dump_timings and self.timings.hosts:
+            filename = os.path.join(self.repo.working_dir, timing.DUMP_FILENAME)
+            try:
+                self.timings.dump(filename)
+            except IOError:
+                _LOG.exception('Could not write the transfer timings to <%s>' % filename)
+        if self.limiter is not None:
+            self.limiter.close()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        if self.multi is not None:
+            self.multi.close()
+            self.multi = None
+
+    def statistics(self):
+        """
+        :return: connections opened and reused by the transfers so far
+        :rtype:  dict
+        """
+        stats = {}
+        if self.pool is not None:
+            stats['connections'] = self.pool.statistics()
+        if self.mirrors is not None:
+            stats['mirrors'] = self.mirrors.statistics()
+        if self.retries:
+            stats['retries'] = self.retries
+        if self.breaker.trips:
+            stats['circuit_breaker'] = self.breaker.statistics()
+        if any(self.pdiff_stats.values()):
+            stats['pdiff'] = dict(self.pdiff_stats)
+        if any(self.by_hash_stats.values()):
+            stats['by_hash'] = dict(self.by_hash_stats)
+        if any(self.blob_cache_stats.values()):
+            stats['blob_cache'] = dict(self.blob_cache_stats)
+        if self.timings.hosts:
+            stats['timings'] = self.timings.statistics()
+        return stats
+
     def _download_file(self, url, destination):
         """
         Downloads the content at the given URL into the given destination.
@@ -99,22 +362,673 @@ class HttpDownloader(base.BaseDownloader):
         :param destination: object
         @return:
         """
-        curl = self._create_and_configure_curl()
+        transfer = Transfer(url, destination)
+        self._perform_transfers([transfer])
+
+        if transfer.error is not None:
+            raise transfer.error
+
+    def _cache_index(self, metadata_cache, transfer):
+        """
+        Stores a freshly downloaded index in the metadata cache, or discards
+        the empty download if the server reported the cached copy as still
+        current.
+
+        :return: path of the up to date copy of the index
+        :rtype:  str
+        """
+        url = transfer.resource['url']
+        if transfer.not_modified:
+            _LOG.info('Using cached copy of unchanged URL <%s>' % url)
+            transfer.destination.delete()
+            return metadata_cache.filename(url)
+
+        validators = {}
+        if 'etag' in transfer.response_headers:
+            validators['etag'] = transfer.response_headers['etag']
+        if 'last-modified' in transfer.response_headers:
+            validators['last_modified'] = transfer.response_headers['last-modified']
+
+        cached = metadata_cache.store(url, transfer.destination.filename, validators,
+                                      transfer.resource.get('index_checksum'))
+
+        # Only a verified download is known to have the checksum it is
+        # cached under
+        if transfer.verified and 'sha256' in transfer.resource:
+            self.blob_cache.add(transfer.resource['sha256'], cached)
+        if transfer.url == transfer.resource.get('by_hash_url'):
+            self.by_hash_stats['retrieved'] += 1
+        return cached
+
+    def _current_indexes(self, resources, metadata_cache):
+        """
+        Finds the indexes whose cached copy has the checksum the Release file
+        lists for them, and points their resources to the cached copy.
+
+        :param resources: resources being retrieved
+        :type  resources: list
+
+        :return: resources of the indexes that need not be retrieved
+        :rtype:  list
+        """
+        current = []
+        for resource in resources:
+            checksum = resource.get('index_checksum')
+            if _is_index(resource) and checksum and \
+                    metadata_cache.checksum(resource['url']) == checksum:
+                _LOG.info('Cached copy of URL <%s> is current' % resource['url'])
+                resource['path'] = metadata_cache.filename(resource['url'])
+                current.append(resource)
+        return current
+
+    def _cached_indexes(self, resources, metadata_cache):
+        """
+        Finds the indexes the blob cache holds a copy of, under the SHA256
+        checksum the Release file lists for them, and places that copy in
+        the metadata cache.
+
+        :param resources: resources being retrieved
+        :type  resources: list
+
+        :return: resources of the indexes that need not be retrieved
+        :rtype:  list
+        """
+        cached = []
+        for resource in resources:
+            if not _is_index(resource) or 'sha256' not in resource:
+                continue
+
+            url = resource['url']
+            tmp_dir = _create_download_tmp_dir(self.repo.working_dir)
+            tmp_filename = _download_tmp_filename(tmp_dir, url)
+            if not self.blob_cache.copy_to(resource['sha256'], tmp_filename):
+                continue
+
+            _LOG.info('Using copy of URL <%s> cached under its checksum' % url)
+            resource['path'] = metadata_cache.store(url, tmp_filename, {},
+                                                    resource.get('index_checksum'))
+            self.by_hash_stats['cached'] += 1
+            cached.append(resource)
+        return cached
+
+    def _cached_packages(self, resources):
+        """
+        Finds the package files the blob cache holds a copy of, under the
+        SHA256 checksum the index lists for them, and places that copy where
+        the file would have been downloaded.
+
+        :param resources: resources being retrieved
+        :type  resources: list
+
+        :return: resources of the package files that need not be retrieved
+        :rtype:  list
+        """
+        cached = []
+        for resource in resources:
+            if _is_index(resource) or not resource.get('sha256'):
+                continue
+
+            digest = resource['sha256'].lower()
+            tmp_dir = _create_download_tmp_dir(self.repo.working_dir)
+            tmp_filename = _download_tmp_filename(tmp_dir, resource['url'])
+            if not self.blob_cache.copy_to(digest, tmp_filename):
+                self.blob_cache_stats['misses'] += 1
+                continue
+
+            # A partial download left by an earlier attempt is replaced
+            StoredDownloadedContent(tmp_filename, url=resource['url']).complete()
+
+            _LOG.info('Using copy of URL <%s> cached under its checksum' % resource['url'])
+            size = os.path.getsize(tmp_filename)
+            resource['path'] = tmp_filename
+            resource['temporary'] = True
+            resource['verified'] = {'size': size, 'sha256': digest}
+            self.blob_cache_stats['hits'] += 1
+            self.blob_cache_stats['bytes_saved'] += size
+            cached.append(resource)
+        return cached
+
+    def _patch_indexes(self, resources, metadata_cache):
+        """
+        Brings the cached copies of the given indexes up to date by applying
+        the diffs published for them. The diff indexes are retrieved first,
+        then all patches needed, each step in parallel for all indexes.
+
+        The path of each index that could be updated is stored in its
+        resource. The other indexes (not cached yet, no diffs published,
+        cached version no longer covered by the diffs, patch failing to
+        apply) are left to be retrieved whole.
+
+        :param resources: resources being retrieved
+        :type  resources: list
+
+        :return: resources of the indexes now up to date
+        :rtype:  list
+        """
+        candidates = [r for r in resources
+                      if _is_index(r) and os.path.exists(metadata_cache.filename(r['url']))]
+        if not candidates:
+            return []
+
+        index_transfers = []
+        for resource in candidates:
+            index_transfers.append(Transfer(pdiff.diff_index_url(resource['url']),
+                                            InMemoryDownloadedContent(), resource=resource))
+        self._perform_transfers(index_transfers, fail_fast=False)
+
+        # Determine the patches each cached index needs
+        plans = []
+        for transfer in index_transfers:
+            resource = transfer.resource
+            cached = metadata_cache.filename(resource['url'])
+            try:
+                if transfer.error is not None:
+                    raise pdiff.PatchError(transfer.error)
+                diff_index = pdiff.DiffIndex(transfer.destination.lines())
+                names = diff_index.patches_from(
+                    *pdiff.file_digest(cached, diff_index.algorithm))
+            except pdiff.PatchError, e:
+                _LOG.info('Cannot update URL <%s> with diffs: %s' % (resource['url'], e))
+                self.pdiff_stats['fallbacks'] += 1
+                continue
+
+            if not names:
+                _LOG.info('Cached copy of URL <%s> is current' % resource['url'])
+                resource['path'] = cached
+                self.pdiff_stats['unchanged'] += 1
+                continue
+
+            patch_transfers = [Transfer(pdiff.patch_url(resource['url'], name),
+                                        InMemoryDownloadedContent(), resource=resource)
+                               for name in names]
+            plans.append((resource, diff_index, names, patch_transfers))
+
+        self._perform_transfers([t for plan in plans for t in plan[3]], fail_fast=False)
+
+        # Apply them, one index at a time to only hold a single one in memory
+        patched = [r for r in candidates if 'path' in r]
+        for resource, diff_index, names, patch_transfers in plans:
+            try:
+                self._apply_patches(resource, metadata_cache, diff_index, names,
+                                    patch_transfers)
+            except pdiff.PatchError, e:
+                _LOG.warn('Cannot update URL <%s> with diffs: %s' % (resource['url'], e))
+                self.pdiff_stats['fallbacks'] += 1
+                continue
+            self.pdiff_stats['patched'] += 1
+            self.pdiff_stats['patches'] += len(names)
+            patched.append(resource)
+        return patched
+
+    def _apply_patches(self, resource, metadata_cache, diff_index, names, patch_transfers):
+        """
+        Applies the retrieved patches to the cached copy of an index and
+        stores the result in the cache.
+
+        :raise pdiff.PatchError: if a patch is missing or does not apply
+        """
+        url = resource['url']
+        cached = metadata_cache.filename(url)
+
+        # Cached under the name of the usual URL, whichever variant it is
+        f = utils.open_index(cached)
+        try:
+            lines = f.readlines()
+        finally:
+            f.close()
+
+        for name, transfer in zip(names, patch_transfers):
+            if transfer.error is not None:
+                raise pdiff.PatchError(transfer.error)
+            patch = pdiff.decompress_patch(transfer.destination.content)
+            transfer.destination.delete()
+            diff_index.verify_patch(name, patch)
+            lines = pdiff.apply_ed(lines, pdiff.parse_ed(patch.splitlines(True)))
+        diff_index.verify_result(lines)
+
+        tmp_dir = _create_download_tmp_dir(self.repo.working_dir)
+        tmp_filename = _download_tmp_filename(tmp_dir, url)
+        # Only read back by the importer, so speed matters more than size
+        f = utils.open_compressed(tmp_filename, 'wb', fast=True)
+        try:
+            f.writelines(lines)
+        finally:
+            f.close()
+
+        # The validators of the old copy do not describe the patched one. The
+        # checksum of the Release file does if it is the same as the one the
+        # patched index was verified with.
+        checksum = resource.get('index_checksum')
+        if diff_index.algorithm != 'sha256' or diff_index.current[0] != checksum:
+            checksum = None
+
+        _LOG.info('Updated cached copy of URL <%s> with %s diffs' % (url, len(names)))
+        resource['path'] = metadata_cache.store(url, tmp_filename, {}, checksum)
+
+    def _probe_mirrors(self, url):
+        """
+        Retrieves the first bytes of the given resource from every mirror in
+        parallel to measure their latency and speed. Mirrors that fail to
+        answer are considered unhealthy. The connections opened stay in the
+        pool for the transfers that follow.
+
+        :param url: URL of a resource under the repository URL
+        :type  url: str
+        """
+        multi = self._get_multi()
+
+        probes = {}
+        for mirror in self.mirrors.mirrors:
+            probe = MirrorProbe(mirror)
+            curl = self._get_pool().acquire(mirror.host)
+            curl.setopt(pycurl.URL, encode_unicode(self.mirrors.mirror_url(url, mirror)))
+            curl.setopt(pycurl.RANGE, '0-%s' % (PROBE_SIZE - 1))
+            curl.setopt(pycurl.TIMEOUT, PROBE_TIMEOUT)
+            curl.setopt(pycurl.WRITEFUNCTION, probe.update)
+            multi.add_handle(curl)
+            probes[curl] = probe
+
+        def finish(curl, error):
+            probe = probes.pop(curl)
+            multi.remove_handle(curl)
+
+            # A server ignoring the range is cut off once enough was received
+            status = curl.getinfo(pycurl.HTTP_CODE)
+            if status in (200, 206) and (error is None or probe.received >= PROBE_SIZE):
+                self.mirrors.probed_mirror(probe.mirror,
+                                           curl.getinfo(pycurl.STARTTRANSFER_TIME),
+                                           curl.getinfo(pycurl.SPEED_DOWNLOAD))
+            else:
+                _LOG.warn('Mirror <%s> failed to answer the probe' % probe.mirror.url)
+                self.mirrors.probed_mirror(probe.mirror)
+            self._get_pool().release(probe.mirror.host, curl)
+
+        while probes:
+            self._perform(multi)
+
+            while True:
+                num_queued, ok_list, err_list = multi.info_read()
+                for curl in ok_list:
+                    finish(curl, None)
+                for curl, errno, errmsg in err_list:
+                    finish(curl, pycurl.error(errno, errmsg))
+                if num_queued == 0:
+                    break
+
+            if self.is_cancelled():
+                for curl in probes.keys():
+                    del probes[curl]
+                    multi.remove_handle(curl)
+                    curl.close()
+                raise exceptions.CancelledException()
+
+            if probes:
+                self._wait(multi, 1.0)
+
+        self.mirrors.probed = True
+
+    def _perform_transfers(self, transfers, fail_fast=True, started_callback=None,
+                           finished_callback=None):
+        """
+        Drives all of the given transfers to completion through the
+        downloader's curl multi handle. Transfers are started in the order
+        given, skipping over those whose host is already at its limit of
+        parallel transfers. The outcome of each transfer is stored in its
+        error attribute.
+
+        With mirrors configured, each transfer is started on the mirror
+        expected to complete it first among those with room left, and a
+        failed transfer is put back in front of the pending ones as long as
+        there is a mirror it was not tried on.
+
+        A transfer failing for a transient reason is put back as well, to be
+        started again once its retry delay has passed. No transfers are
+        started on a host paused by the circuit breaker.
+
+        :param transfers: transfers to perform
+        :type  transfers: list of Transfer
+
+        :param fail_fast: if true, no new transfers are started and the active
+               ones are aborted as soon as one of them fails
+        :type  fail_fast: bool
+
+        :param started_callback: called with each transfer as it is started
+        :param finished_callback: called with each transfer once it is done
+        """
+        multi = self._get_multi()
+
+        pending = list(transfers)
+        active = {}
+        host_counts = {}
+        failures = []
+
+        def host_full(host):
+            return (host_counts.get(host, 0) >= self.max_downloads_per_host or
+                    not self.breaker.allows(host))
+
+        def finish(curl, error):
+            transfer = active.pop(curl)
+            multi.remove_handle(curl)
+            host_counts[transfer.host] -= 1
+
+            self._finish_transfer(transfer, curl, error)
+            if transfer.error is not None and (self._leave_by_hash(transfer) or
+                                               self._fail_over(transfer) or
+                                               self._schedule_retry(transfer)):
+                pending.insert(0, transfer)
+                return
+            if transfer.error is not None:
+                failures.append(transfer)
+
+            if finished_callback is not None:
+                finished_callback(transfer)
+
+        while pending or active:
+            # Fill up the free transfer slots with the first pending
+            # transfers whose host has room left
+            index = 0
+            now = time.time()
+            while index < len(pending) and len(active) < self.max_downloads:
+                transfer = pending[index]
+                if transfer.not_before > now:
+                    index += 1
+                    continue
+
+                if self.mirrors is not None:
+                    mirror = self.mirrors.select(_resource_size(transfer.resource),
+                                                 transfer.tried_mirrors,
+                                                 is_full=lambda m: host_full(m.host))
+                    if mirror is None:
+                        index += 1
+                        continue
+                    transfer.use_mirror(mirror, self.mirrors.mirror_url(transfer.url, mirror))
+                    self.mirrors.started(mirror)
+                elif host_full(transfer.host):
+                    index += 1
+                    continue
+
+                del pending[index]
+                curl = self._start_transfer(transfer)
+                multi.add_handle(curl)
+                active[curl] = transfer
+                host_counts[transfer.host] = host_counts.get(transfer.host, 0) + 1
+
+                if started_callback is not None:
+                    started_callback(transfer)
+
+            self._perform(multi)
+
+            while True:
+                num_queued, ok_list, err_list = multi.info_read()
+                for curl in ok_list:
+                    finish(curl, None)
+                for curl, errno, errmsg in err_list:
+                    finish(curl, pycurl.error(errno, errmsg))
+                if num_queued == 0:
+                    break
+
+            if self.is_cancelled():
+                self._abort_transfers(multi, active)
+                raise exceptions.CancelledException()
+
+            if failures and fail_fast:
+                pending = []
+                self._abort_transfers(multi, active)
+                break
+
+            if active:
+                timeout = 1.0
+                if self.limiter is not None:
+                    timeout = self._resume_paused(active, timeout)
+                self._wait(multi, timeout)
+            elif pending:
+                # The transfers left may have to wait for their retry delay
+                # or for their host to be resumed
+                delay = min([self._start_delay(t) for t in pending])
+                if delay > 0:
+                    time.sleep(min(1.0, delay))
+
+    def _perform(self, multi):
+        """
+        Lets curl do as much work on the transfers as it can without blocking.
+        """
+        while True:
+            ret, num_handles = multi.perform()
+            if ret != pycurl.E_CALL_MULTI_PERFORM:
+                break
+
+    def _wait(self, multi, timeout):
+        """
+        Blocks until there is activity on one of the transfers or the given
+        number of seconds passed.
+        """
+        multi.select(timeout)
+
+    def _abort_transfers(self, multi, active):
+        """
+        Stops all of the given transfers in progress. Their partially written
+        destinations are removed, unless they can be resumed later.
+
+        :param active: transfers in progress keyed by their curl handle
+        :type  active: dict
+        """
+        for curl in active.keys():
+            transfer = active.pop(curl)
+            multi.remove_handle(curl)
+            # The connection is left in an unknown state, so the handle is
+            # not returned to the pool
+            curl.close()
+            transfer.destination.close()
+            self._discard_destination(transfer)
+            if transfer.mirror is not None:
+                self.mirrors.aborted(transfer.mirror)
+
+    def _start_transfer(self, transfer):
+        """
+        Prepares the destination and the curl handle for the given transfer.
+
+        :return: curl instance configured to perform the transfer
+        :rtype:  pycurl.Curl
+        """
+        curl = self._get_pool().acquire(transfer.host)
 
-        url = encode_unicode(url) # because of how the config is stored in pulp
+        url = encode_unicode(transfer.request_url) # because of how the config is stored in pulp
+
+        transfer.destination.open()
+        request_headers = list(transfer.request_headers)
+        if transfer.resumable and transfer.destination.offset > 0:
+            # Only ask for the missing bytes, unless the document changed
+            # since the partial download was made
+            _LOG.info('Resuming URL <%s> from byte %s' % (transfer.url, transfer.destination.offset))
+            transfer.resumed_from = transfer.destination.offset
+            # Unlike RESUME_FROM, a plain range lets curl accept the whole
+            # document in a 200 when the If-Range validator does not match
+            curl.setopt(pycurl.RANGE, '%s-' % transfer.resumed_from)
+            request_headers.append('If-Range: %s' % transfer.destination.validator)
 
         curl.setopt(pycurl.URL, url)
-        curl.setopt(pycurl.WRITEFUNCTION, destination.update)
-        curl.perform()
-        status = curl.getinfo(curl.HTTP_CODE)
-        curl.close()
-
-        if status == 401:
-            raise exceptions.UnauthorizedException(url)
-        elif status == 404:
-            raise exceptions.FileNotFoundException(url)
-        elif status != 200:
-            raise exceptions.FileRetrievalException(url)
+        if self.limiter is None:
+            curl.setopt(pycurl.WRITEFUNCTION, transfer.destination.update)
+        else:
+            transfer.limiter = self.limiter
+            curl.setopt(pycurl.WRITEFUNCTION, transfer.throttled_update)
+        curl.setopt(pycurl.HEADERFUNCTION, transfer.header)
+        if request_headers:
+            curl.setopt(pycurl.HTTPHEADER, request_headers)
+        return curl
+
+    def _resume_paused(self, active, timeout):
+        """
+        Resumes the transfers paused by the bandwidth limiter if it has
+        refilled, or else shortens the given wait until it does.
+
+        :param active: transfers in progress keyed by their curl handle
+        :type  active: dict
+
+        :return: how long to wait for activity on the transfers
+        :rtype:  float
+        """
+        paused = [(c, t) for c, t in active.items() if t.paused]
+        if not paused:
+            return timeout
+
+        if self.limiter.available():
+            for curl, transfer in paused:
+                transfer.paused = False
+                curl.pause(pycurl.PAUSE_CONT)
+            return timeout
+
+        return min(timeout, self.limiter.delay())
+
+    def _finish_transfer(self, transfer, curl, error):
+        """
+        Determines the outcome of a transfer that curl reported as done and
+        releases its curl handle. If the transfer failed, the partially
+        written destination is removed unless it can be resumed later.
+
+        :param error: error reported by curl for the transfer, if any
+        :type  error: pycurl.error or None
+        """
+        keep_partial = True
+        if error is not None:
+            error = _curl_error(encode_unicode(transfer.url), error, transfer)
+        else:
+            # The server answered, whatever the answer was
+            self.timings.record(transfer.host, timing.curl_values(curl))
+
+            status = curl.getinfo(pycurl.HTTP_CODE)
+            if status == 304 and transfer.conditional:
+                transfer.not_modified = True
+            elif status == 206 and transfer.resumed_from:
+                pass
+            elif status == 416 and transfer.resumed_from:
+                # Nothing left past the partial download; it is complete if
+                # it has the size of the document
+                size = _content_range_size(transfer.response_headers)
+                if size != transfer.resumed_from:
+                    error = exceptions.FileRetrievalException(encode_unicode(transfer.url))
+                    keep_partial = False
+            else:
+                error = _status_error(encode_unicode(transfer.url), status,
+                                      transfer.response_headers)
+                keep_partial = not isinstance(error, exceptions.FileNotFoundException)
+
+        # The destination aborts the transfer as soon as it exceeds the
+        # expected size, which curl reports as a write error
+        verifier = transfer.destination.verifier
+        if verifier is not None and (error is None or verifier.exceeded()):
+            try:
+                transfer.verified = verifier.verify()
+            except exceptions.VerificationException, e:
+                _LOG.error('Verification of URL <%s> failed: %s' % (transfer.url, e))
+                error = e
+                keep_partial = False
+
+        if transfer.mirror is not None:
+            if error is None:
+                self.mirrors.succeeded(transfer.mirror,
+                                       int(curl.getinfo(pycurl.SIZE_DOWNLOAD)),
+                                       curl.getinfo(pycurl.STARTTRANSFER_TIME),
+                                       curl.getinfo(pycurl.SPEED_DOWNLOAD))
+            else:
+                self.mirrors.failed(transfer.mirror)
+        self.breaker.record(transfer.host, error)
+        self._get_pool().release(transfer.host, curl)
+
+        transfer.destination.close()
+        if error is None:
+            if transfer.resumable:
+                transfer.destination.complete()
+        else:
+            self._discard_destination(transfer, keep_partial)
+        transfer.error = error
+
+    def _leave_by_hash(self, transfer):
+        """
+        Prepares a transfer that did not find an index under its checksum
+        to be retried from the usual location of the index. Servers may
+        advertise the by-hash directories without having them all, and drop
+        the entries of old versions of the indexes.
+
+        :return: whether the transfer is to be retried
+        :rtype:  bool
+        """
+        # Only the transfers of the index itself, not those of its diffs
+        if transfer.resource is None or \
+                transfer.url != transfer.resource.get('by_hash_url') or \
+                not isinstance(transfer.error, exceptions.FileNotFoundException):
+            return False
+
+        url = transfer.resource.get('variant_url', transfer.resource['url'])
+        _LOG.info('URL <%s> not found, retrieving <%s> instead' % (transfer.request_url, url))
+        transfer.reset()
+        transfer.use_url(url)
+        self.by_hash_stats['fallbacks'] += 1
+        return True
+
+    def _fail_over(self, transfer):
+        """
+        Prepares a failed transfer to be retried on another mirror, if there
+        is one it was not tried on yet.
+
+        :return: whether the transfer is to be retried
+        :rtype:  bool
+        """
+        if self.mirrors is None or not self.mirrors.has_untried(transfer.tried_mirrors):
+            return False
+
+        _LOG.warn('Retrieving URL <%s> failed (%s), trying another mirror' %
+                  (transfer.request_url, transfer.error))
+        transfer.reset()
+        return True
+
+    def _schedule_retry(self, transfer):
+        """
+        Prepares a failed transfer to be attempted again after a delay, if
+        the retry policy allows it. A transfer with mirrors is tried on all
+        of them again.
+
+        :return: whether the transfer is to be retried
+        :rtype:  bool
+        """
+        if not self.retry_policy.should_retry(transfer.error, transfer.retries):
+            return False
+
+        delay = self.retry_policy.delay(transfer.error, transfer.retries)
+        _LOG.warn('Retrieving URL <%s> failed (%s), retrying in %.1f seconds' %
+                  (transfer.request_url, transfer.error, delay))
+
+        transfer.reset()
+        transfer.retries += 1
+        transfer.tried_mirrors = []
+        transfer.not_before = time.time() + delay
+        self.retries += 1
+        return True
+
+    def _start_delay(self, transfer):
+        """
+        :return: seconds until the given transfer may be started, as far as
+                 its retry delay and the circuit breaker are concerned
+        :rtype:  float
+        """
+        hosts = [transfer.host]
+        if self.mirrors is not None:
+            hosts = [m.host for m in self.mirrors.mirrors
+                     if m not in transfer.tried_mirrors] or hosts
+        host_delay = min([self.breaker.delay(h) for h in hosts])
+        return max(transfer.not_before - time.time(), host_delay)
+
+    def _discard_destination(self, transfer, keep_partial=True):
+        """
+        Cleans up the destination of a failed or aborted transfer, which
+        must already be closed. A resumable partial download is kept in place
+        for the next attempt unless keep_partial is false.
+        """
+        if keep_partial and transfer.resumable and transfer.destination.is_resumable():
+            _LOG.info('Keeping partial download of URL <%s> (%s bytes)' %
+                      (transfer.url, transfer.destination.offset))
+        else:
+            transfer.destination.delete()
 
     def _create_and_configure_curl(self):
         """
@@ -128,81 +1042,472 @@ class HttpDownloader(base.BaseDownloader):
         """
 
         curl = pycurl.Curl()
+        self._configure_curl(curl)
+        return curl
+
+    def _configure_curl(self, curl):
+        """
+        Applies the download options to the given curl instance. This is
+        called for new instances as well as for pooled instances after they
+        have been reset.
+
+        :param curl: curl instance to configure
+        :type  curl: pycurl.Curl
+        """
 
         # Eventually, add here support for:
-        # - callback on bytes downloaded
-        # - bandwidth limitations
         # - SSL verification for hosts on SSL
         # - client SSL certificate
         # - proxy support
-        # - callback support for resuming partial downloads
 
         curl.setopt(pycurl.VERBOSE, 0)
 
-        # TODO: Add in reference to is cancelled hook to be able to abort the download
+        # Poll the cancel hook from the transfer; curl calls it at least once
+        # a second, even while the transfer is stalled
+        curl.setopt(pycurl.NOPROGRESS, 0)
+        curl.setopt(pycurl.XFERINFOFUNCTION, self._transfer_progress)
 
         # Close out the connection on our end in the event the remote host
         # stops responding. This is interpretted as "If less than 1000 bytes are
         # sent in a 5 minute interval, abort the connection."
         curl.setopt(pycurl.LOW_SPEED_LIMIT, 1000)
-        curl.setopt(pycurl.LOW_SPEED_TIME, 5 * 60)
-        return curl
+        if self.mirrors is None:
+            curl.setopt(pycurl.LOW_SPEED_TIME, STALL_TIME)
+        else:
+            curl.setopt(pycurl.LOW_SPEED_TIME, MIRROR_STALL_TIME)
+
+    def _transfer_progress(self, download_total, downloaded, upload_total, uploaded):
+        """
+        Callback passed to PyCurl as the transfer progresses.
+
+        :return: non-zero to abort the transfer
+        :rtype:  int
+        """
+        if self.is_cancelled():
+            return 1
+        return 0
+
+    def _get_multi(self):
+        """
+        :return: multi handle shared by all transfers of this downloader
+        :rtype:  pycurl.CurlMulti
+        """
+        if self.multi is None:
+            self.multi = pycurl.CurlMulti()
+        return self.multi
+
+    def _get_pool(self):
+        """
+        :return: pool of curl handles shared by all transfers of this downloader
+        :rtype:  pool.ConnectionPool
+        """
+        if self.pool is None:
+            self.pool = pool.ConnectionPool(self._create_and_configure_curl,
+                                            self._configure_curl)
+        return self.pool
 
 
 # -- private classes ----------------------------------------------------------
 
 
+class Transfer(object):
+    """
+    A single URL being retrieved into a destination by the multi handle.
+    """
+    def __init__(self, url, destination, resource=None):
+        self.url = url
+        self.destination = destination
+        self.resource = resource
+
+        self.host = urlparse.urlparse(url).netloc
+        self.error = None
+
+        # Mirror the transfer is performed on and the URL requested from it,
+        # and the mirrors tried so far
+        self.mirror = None
+        self.request_url = url
+        self.tried_mirrors = []
+
+        # Number of retries made so far and the time before which the next
+        # one may not be started
+        self.retries = 0
+        self.not_before = 0
+
+        # Extra request headers and whether they make the request conditional
+        self.request_headers = []
+        self.conditional = False
+
+        # Whether the destination keeps the data of an interrupted transfer
+        # so it can be resumed, and the offset this attempt resumed from
+        self.resumable = False
+        self.resumed_from = 0
+
+        # Status and headers of the final response, the latter keyed by
+        # their lower cased name
+        self.status = None
+        self.response_headers = {}
+        self.not_modified = False
+
+        # Size and checksums the downloaded file was verified to have
+        self.verified = None
+
+        # Bandwidth limiter the transfer draws from, and whether it is
+        # waiting for it to refill
+        self.limiter = None
+        self.paused = False
+
+    def use_mirror(self, mirror, url):
+        """
+        Directs the next attempt of the transfer to the given mirror.
+
+        :param url: URL of the resource on the mirror
+        :type  url: str
+        """
+        self.mirror = mirror
+        self.request_url = url
+        self.host = mirror.host
+        self.tried_mirrors.append(mirror)
+
+    def use_url(self, url):
+        """
+        Moves the transfer to another URL, on which no mirror was tried yet.
+        """
+        self.url = url
+        self.request_url = url
+        self.host = urlparse.urlparse(url).netloc
+        self.tried_mirrors = []
+
+    def reset(self):
+        """
+        Clears the outcome of a failed attempt so the transfer can be retried.
+        """
+        self.error = None
+        self.mirror = None
+        self.resumed_from = 0
+        self.status = None
+        self.response_headers = {}
+        self.not_modified = False
+        self.verified = None
+        self.paused = False
+
+    def header(self, line):
+        """
+        Callback passed to PyCurl to collect the response headers as they
+        are read.
+        """
+        line = line.strip()
+        if line.startswith('HTTP/'):
+            # Start of a new response, e.g. after a 100 Continue or a redirect
+            self.response_headers = {}
+            try:
+                self.status = int(line.split()[1])
+            except (IndexError, ValueError):
+                self.status = None
+        elif ':' in line:
+            name, value = line.split(':', 1)
+            self.response_headers[name.strip().lower()] = value.strip()
+        elif not line and self.status is not None and self.status >= 200:
+            # End of the headers, the body (if any) comes next; that of an
+            # error must reach neither the destination nor its verifier
+            response_started = getattr(self.destination, 'response_started', None)
+            if response_started is not None:
+                response_started(self.status, self.response_headers)
+
+    def throttled_update(self, buffer):
+        """
+        Callback passed to PyCurl instead of the destination's update method
+        when the bandwidth is limited. If the limiter has no tokens left, the
+        transfer is paused and curl passes the same data again once it is
+        resumed.
+        """
+        if not self.limiter.available():
+            self.paused = True
+            return pycurl.WRITEFUNC_PAUSE
+
+        self.limiter.consume(len(buffer))
+        return self.destination.update(buffer)
+
+
+class MirrorProbe(object):
+    """
+    Discards the data received while probing a mirror, cutting the transfer
+    off once enough was received.
+    """
+    def __init__(self, mirror):
+        self.mirror = mirror
+        self.received = 0
+
+    def update(self, buffer):
+        self.received += len(buffer)
+        if self.received >= PROBE_SIZE:
+            return 0
+
+
 class InMemoryDownloadedContent(object):
     """
     In memory storage that content will be written to by PyCurl.
+
+    The blocks handed over by PyCurl are kept as they are instead of being
+    appended to a growing string, which would copy everything received so
+    far on each call. The content is read back line by line without ever
+    joining the blocks, so an index can be fed to the deb822 parser straight
+    from the downloaded data; iterating the instance yields the same lines.
     """
     def __init__(self):
-        self.content = ''
+        self.chunks = []
+        self.size = 0
+        self.verifier = None
+
+        # Set while receiving the body of an error response
+        self.discarding = False
+
+    def open(self):
+        self.discarding = False
+
+    def response_started(self, status, headers):
+        """
+        Called once the headers of the response are known, before its body
+        is written. The body of an error response is not kept.
+        """
+        self.discarding = status not in (200, 206)
 
     def update(self, buffer):
-        self.content += buffer
+        if self.discarding:
+            return
+        self.chunks.append(buffer)
+        self.size += len(buffer)
+
+    def close(self):
+        pass
+
+    def delete(self):
+        self.chunks = []
+        self.size = 0
+
+    @property
+    def content(self):
+        """
+        The whole content as a single string. The blocks are joined on the
+        first access and replaced by the result, so it is only copied once.
+
+        :rtype: str
+        """
+        if len(self.chunks) > 1:
+            self.chunks = [''.join(self.chunks)]
+        return self.chunks and self.chunks[0] or ''
+
+    def lines(self):
+        """
+        Iterates over the lines of the content, keeping the line endings as
+        file objects do. Only lines spanning two blocks are assembled from
+        pieces; all others are sliced directly from their block.
+
+        :rtype: iterator of str
+        """
+        pieces = []
+        for chunk in self.chunks:
+            start = 0
+            while True:
+                end = chunk.find('\n', start) + 1
+                if end == 0:
+                    break
+                if pieces:
+                    pieces.append(chunk[start:end])
+                    yield ''.join(pieces)
+                    pieces = []
+                else:
+                    yield chunk[start:end]
+                start = end
+            if start < len(chunk):
+                pieces.append(chunk[start:])
+        if pieces:
+            yield ''.join(pieces)
+
+    def __iter__(self):
+        return self.lines()
 
 
 class StoredDownloadedContent(object):
     """
-    Stores content on disk as it is retrieved by PyCurl. This currently does
-    not support resuming a download and will need to be revisited to add
-    that support.
+    Stores content on disk as it is retrieved by PyCurl.
+
+    If created with the URL being downloaded, the content can be resumed: the
+    validator of the response (its ETag, or Last-Modified date) is recorded
+    next to the file as soon as the response starts. If the transfer is
+    interrupted, the partial file is kept and the next attempt, possibly in a
+    later sync, only asks for the missing bytes. The request is made with an
+    If-Range header carrying the recorded validator, so the server sends the
+    whole document again if it changed in the meantime.
+
+    If a verifier is set, it is fed each block of data as it is written so
+    the file can be checked without reading it back. A transfer exceeding
+    the expected size is aborted right away.
+
+    If the final size of the file is known, its blocks are allocated when it
+    is opened, which keeps large files from being fragmented.
     """
-    def __init__(self, filename):
+    def __init__(self, filename, url=None, verifier=None, size=None):
         self.filename = filename
+        self.url = url
+        self.verifier = verifier
+        self.size = size
 
         self.offset = 0
+        self.validator = None
         self.file = None
 
+        # Set while receiving the body of an error response, which must not
+        # end up in the file
+        self.discarding = False
+
     def open(self):
         """
         Sets the content object to be able to accept and store data sent to
-        its update method.
+        its update method. If a partial download of the same URL was left
+        behind by a previous attempt, the data is appended to it and offset
+        is set to its size.
         """
-        self.file = open(self.filename, 'a+')
+        self.discarding = False
+
+        if self.verifier is not None:
+            self.verifier.reset()
+
+        state = self._load_state()
+        if state is not None and os.path.getsize(self.filename) > 0:
+            self.file = open(self.filename, 'r+b')
+            if self.verifier is not None:
+                # The data written by the previous attempt is only read
+                # back to resume its checksums
+                while True:
+                    buffer = self.file.read(VERIFY_BLOCK_SIZE)
+                    if not buffer:
+                        break
+                    self.verifier.update(buffer)
+            self.file.seek(0, os.SEEK_END)
+            self.offset = self.file.tell()
+            self.validator = state['validator']
+        else:
+            self._remove_state()
+            # A file left behind may be linked to a cache entry, which must
+            # not be truncated along with it
+            if os.path.exists(self.filename):
+                os.remove(self.filename)
+            self.file = open(self.filename, 'wb')
+            self.offset = 0
+            self.validator = None
+
+        if self.size:
+            storage.preallocate(self.file, self.size)
+
+    def response_started(self, status, headers):
+        """
+        Called once the headers of the response are known, before its body
+        is written.
+
+        :param status: HTTP status of the response
+        :type  status: int
+
+        :param headers: response headers, keyed by their lower cased name
+        :type  headers: dict
+        """
+        if status not in (200, 206):
+            # Leave a partial download untouched by error pages
+            self.discarding = True
+            return
+
+        self.discarding = False
+        if status == 200:
+            # The whole document is being sent, the server either ignored
+            # the range or the document changed since the partial download
+            if self.offset > 0:
+                self.file.seek(0)
+                self.file.truncate()
+                self.offset = 0
+                if self.verifier is not None:
+                    self.verifier.reset()
+            self.validator = _resume_validator(headers)
+            if self.validator is None:
+                self._remove_state()
+            else:
+                self._save_state()
 
     def update(self, buffer):
         """
         Callback passed to PyCurl to use to write content as it is read.
         """
-        self.file.seek(self.offset)
+        if self.discarding:
+            return
         self.file.write(buffer)
         self.offset += len(buffer)
 
+        if self.verifier is not None and not self.verifier.update(buffer):
+            # Any value other than the length of the buffer aborts the transfer
+            return 0
+
     def close(self):
         """
         Closes the underlying file backing this content unit.
         """
         self.file.close()
 
+    def is_resumable(self):
+        """
+        Returns whether the stored data can be resumed by a later attempt.
+
+        :rtype: bool
+        """
+        return self.url is not None and os.path.exists(self.filename + PARTIAL_SUFFIX)
+
+    def complete(self):
+        """
+        Marks the stored file as fully downloaded so it is never resumed.
+        """
+        self._remove_state()
+
     def delete(self):
         """
         Deletes the stored file.
         """
+        self._remove_state()
         if os.path.exists(self.filename):
             os.remove(self.filename)
 
+    def _load_state(self):
+        """
+        Returns the recorded state of a partial download of this URL, if
+        there is one.
+
+        :rtype: dict or None
+        """
+        if self.url is None or not os.path.exists(self.filename):
+            return None
+
+        try:
+            f = open(self.filename + PARTIAL_SUFFIX, 'r')
+            try:
+                state = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return None
+
+        if state.get('url') != self.url or not state.get('validator'):
+            return None
+        return state
+
+    def _save_state(self):
+        if self.url is None:
+            return
+        f = open(self.filename + PARTIAL_SUFFIX, 'w')
+        try:
+            json.dump({'url': self.url, 'validator': self.validator}, f)
+        finally:
+            f.close()
+
+    def _remove_state(self):
+        if os.path.exists(self.filename + PARTIAL_SUFFIX):
+            os.remove(self.filename + PARTIAL_SUFFIX)
+
 
 # -- utilities ----------------------------------------------------------------
 
@@ -213,3 +1518,105 @@ def _create_download_tmp_dir(repo_working_dir):
         os.mkdir(tmp_dir)
     return tmp_dir
 
+
+def _download_tmp_filename(tmp_dir, url):
+    """
+    Returns the temporary file to download the given URL into.
+    """
+    return os.path.join(tmp_dir, cache.url_to_filename(url))
+
+
+def _is_index(resource):
+    """
+    Returns whether the given resource is one of the Packages or Sources
+    indexes of a distribution, as opposed to a package file.
+    """
+    return resource.get('type') in ('packages', 'sources')
+
+
+def _resource_size(resource):
+    """
+    :return: size of the resource's file as listed by the index, if any
+    :rtype:  int or None
+    """
+    try:
+        return int(resource['size'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _resume_validator(headers):
+    """
+    Returns the validator to send in the If-Range header when resuming the
+    download of the response with the given headers. Weak entity tags cannot
+    be used for a range request, in which case the Last-Modified date is
+    used if there is one.
+
+    :rtype: str or None
+    """
+    etag = headers.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('last-modified')
+
+
+def _content_range_size(headers):
+    """
+    Returns the complete size of the document announced in the Content-Range
+    header of a response, e.g. "bytes */1234" for an unsatisfiable range.
+
+    :rtype: int or None
+    """
+    content_range = headers.get('content-range', '')
+    try:
+        return int(content_range.rsplit('/', 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def _curl_error(url, error, transfer):
+    """
+    Maps an error reported by curl to the exception describing the failure,
+    telling apart connections that could not be made from transfers that
+    were interrupted once the server answered. Other errors are returned
+    unchanged.
+
+    :param error: error reported by curl for the transfer
+    :type  error: pycurl.error
+
+    :rtype: Exception
+    """
+    code, message = error.args[0], error.args[-1]
+    if code in CONNECT_ERRORS or (code in TRANSFER_ERRORS and transfer.status is None):
+        return exceptions.ConnectionException(url, message)
+    elif code in TRANSFER_ERRORS:
+        return exceptions.TransferException(url, message)
+    return error
+
+
+def _status_error(url, status, headers=None):
+    """
+    Maps the HTTP status of a finished transfer to the exception describing
+    its failure.
+
+    :param headers: response headers keyed by their lower cased name
+    :type  headers: dict
+
+    :return: exception to raise for the status; None if it is a success
+    :rtype:  exceptions.FileRetrievalException or None
+    """
+    if status == 401:
+        return exceptions.UnauthorizedException(url)
+    elif status == 404:
+        return exceptions.FileNotFoundException(url)
+    elif status >= 500 or status in SERVER_ERROR_STATUSES:
+        retry_after = None
+        try:
+            retry_after = int((headers or {})['retry-after'])
+        except (KeyError, ValueError):
+            pass
+        return exceptions.ServerErrorException(url, status, retry_after)
+    elif status != 200:
+        return exceptions.FileRetrievalException(url)
+    return None
+
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+The Release file of a distribution (dists/<dist>/Release), listing the size and checksums of every index of the distribution in each
+of the compressions it is published in.
+"""
+
+import logging
+
+from debian import deb822
+
+from pulp_deb.common import utils
+
+
+# -- constants ----------------------------------------------------------------
+
+# Checksum fields of the Release file, mapped to the key of the checksum in
+# the resources (see verification.CHECKSUM_TYPES)
+CHECKSUM_FIELDS = (('SHA256', 'sha256'), ('SHA1', 'sha1'), ('MD5Sum', 'md5sum'))
+
+# Directory, next to each index, the indexes are published in under their
+# SHA256 checksum when the Release file says so (Acquire-By-Hash: yes)
+BY_HASH_DIR = 'by-hash/SHA256'
+
+_LOG = logging.getLogger(__name__)
+
+
+# -- public -------------------------------------------------------------------
+
+
+class Release(object):
+    """
+    Parsed Release file.
+    """
+
+    def __init__(self, url, lines):
+        """
+        :param url: location of the Release file
+        :type  url: str
+
+        :param lines: lines of the file
+        :type  lines: iterable of str
+        """
+        # The paths listed are relative to the directory of the file
+        self.base_url = url.rsplit('/', 1)[0]
+
+        fields = deb822.Release(lines)
+
+        # Whether the indexes can be retrieved under their checksum, which
+        # does not change while the distribution is being updated
+        self.acquire_by_hash = fields.get('Acquire-By-Hash', '').strip().lower() == 'yes'
+
+        # Size and checksums keyed by the path of the file relative to the
+        # distribution, e.g. main/binary-amd64/Packages.gz
+        self.files = {}
+        for field, key in CHECKSUM_FIELDS:
+            for entry in fields.get(field, []):
+                try:
+                    size = int(entry['size'])
+                except ValueError:
+                    continue
+                listed = self.files.setdefault(entry['name'], {'size': size})
+                if listed['size'] == size:
+                    listed[key] = entry[key].lower()
+
+    def select_index(self, path):
+        """
+        Picks the variant of an index to retrieve: the smallest of those
+        listed that can be read.
+
+        :param path: path of the uncompressed index relative to the
+               distribution, e.g. main/binary-amd64/Packages
+        :type  path: str
+
+        :return: tuple of the path of the variant and its size and
+                 checksums; None if the index is not listed
+        :rtype:  tuple or None
+        """
+        variants = [(self.files[path + e]['size'], path + e)
+                    for e in utils.supported_extensions() if path + e in self.files]
+        if not variants:
+            return None
+
+        size, selected = min(variants)
+        return selected, self.files[selected]
+
+    def index_checksum(self, path):
+        """
+        Returns the checksum identifying a version of an index: the one of
+        the uncompressed index if it is listed, so it does not depend on the
+        variant retrieved, or else the one of the given variant.
+
+        :param path: path of the variant relative to the distribution
+        :type  path: str
+
+        :rtype: str or None
+        """
+        for candidate in (utils.strip_extension(path), path):
+            listed = self.files.get(candidate, {})
+            if 'sha256' in listed:
+                return listed['sha256']
+        return None
+
+    def by_hash_url(self, path):
+        """
+        :param path: path of a variant of an index relative to the
+               distribution
+        :type  path: str
+
+        :return: URL of the variant under its checksum; None if the Release
+                 file does not publish it that way
+        :rtype:  str or None
+        """
+        listed = self.files.get(path, {})
+        if not self.acquire_by_hash or 'sha256' not in listed:
+            return None
+
+        # The by-hash directory is next to the index
+        url = self.base_url
+        if '/' in path:
+            url += '/' + path.rsplit('/', 1)[0]
+        return '%s/%s/%s' % (url, BY_HASH_DIR, listed['sha256'])
+
+    def update_indexes(self, indexes):
+        """
+        Points each of the given index resources to the variant of the index
+        to retrieve (see the 'variant_url' key) and adds its size and
+        checksums, so the download is verified and an index unchanged since
+        the last sync is recognized (see the 'index_checksum' key). Indexes
+        the Release file does not list are left alone.
+
+        If the indexes are published under their checksum, the URL to
+        retrieve each one from is stored under 'by_hash_url'. The 'url' key
+        keeps the usual location of the index whichever variant is
+        retrieved, since it identifies the index (e.g. in the metadata
+        cache).
+
+        :param indexes: index resources as returned by Distribution.get_indexes
+        :type  indexes: list
+        """
+        for resource in indexes:
+            if not resource['url'].startswith(self.base_url + '/'):
+                continue
+
+            path = utils.strip_extension(resource['url'][len(self.base_url) + 1:])
+            selected = self.select_index(path)
+            if selected is None:
+                _LOG.info('Index <%s> is not listed by the Release file' % path)
+                continue
+
+            selected_path, listed = selected
+            resource['variant_url'] = self.base_url + '/' + selected_path
+            resource.update(listed)
+            resource['index_checksum'] = self.index_checksum(selected_path)
+
+            by_hash_url = self.by_hash_url(selected_path)
+            if by_hash_url is not None:
+                resource['by_hash_url'] = by_hash_url
@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Placement of retrieved package files into Pulp's content storage. Files only
+ever appear in the storage complete: they are either renamed into place, or
+linked or copied to a temporary file next to their final location which is
+renamed once it is complete.
+
+Files of a local feed are ingested with the cheapest method the filesystems
+support, in the order of constants.LOCAL_INGEST_METHODS:
+
+- hardlink: the storage shares the file of the feed, nothing is written
+- reflink: the copy shares the data blocks of the feed's file (FICLONE)
+- copy_range: the kernel copies the data (copy_file_range, or sendfile)
+- copy: the data is read and written back by the importer
+
+Before packages are retrieved, the filesystems they are written to can be
+checked for enough free space (see check_free_space), and the files being
+downloaded are allocated their final size up front (see preallocate).
+"""
+
+import ctypes
+import errno
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from pulp_deb.common import constants
+
+
+# -- constants ----------------------------------------------------------------
+
+# Size of the blocks files are copied in
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Method reported for a file that was renamed into the storage
+METHOD_RENAME = 'rename'
+
+# ioctl cloning a file on Linux filesystems with shared extents
+FICLONE = 0x40049409
+
+# fallocate mode allocating blocks without changing the size of the file
+FALLOC_FL_KEEP_SIZE = 0x01
+
+# Errors meaning an ingest method is not available for the given files,
+# rather than a problem with the files themselves
+UNSUPPORTED_ERRNOS = (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EINVAL,
+                      errno.ENOTTY, errno.ENOSYS, errno.EOPNOTSUPP, errno.EBADF)
+
+_LOG = logging.getLogger(__name__)
+
+
+# -- exceptions ---------------------------------------------------------------
+
+
+class InsufficientSpaceException(Exception):
+    """
+    Raised when a filesystem does not have the space for the files about to
+    be written to it.
+    """
+    def __init__(self, path, required, available):
+        """
+        :param path: location on the filesystem that was checked
+        :type  path: str
+
+        :param required: number of bytes needed
+        :type  required: int
+
+        :param available: number of bytes free
+        :type  available: int
+        """
+        Exception.__init__(self, path, required, available)
+        self.path = path
+        self.required = required
+        self.available = available
+
+    def __str__(self):
+        template = 'Not enough space for %s bytes in %s, %s bytes available'
+        return template % (self.required, self.path, self.available)
+
+
+# -- public -------------------------------------------------------------------
+
+
+def move_into_place(source, destination):
+    """
+    Moves a file the importer owns (e.g. a download in the working
+    directory) to its location in the storage. This is a rename when both
+    are on the same filesystem, which leaves nothing to copy. Otherwise the
+    file is copied and the source removed.
+
+    :param source: file to move; it no longer exists once this returns
+    :type  source: str
+
+    :param destination: full path of the file in the storage
+    :type  destination: str
+
+    :return: tuple of the method used and the number of bytes written
+    :rtype:  tuple
+    """
+    _ensure_parent_dir(destination)
+    try:
+        os.rename(source, destination)
+        return METHOD_RENAME, 0
+    except OSError, e:
+        if e.errno != errno.EXDEV:
+            raise
+        _LOG.debug('Copying <%s> across filesystems to <%s>' % (source, destination))
+        size = copy_into_place(source, destination)
+        os.remove(source)
+        return constants.LOCAL_INGEST_COPY, size
+
+
+def ingest(source, destination, method=constants.DEFAULT_LOCAL_INGEST):
+    """
+    Brings a file of a local feed into the storage, trying the given method
+    first and falling back to the following ones in LOCAL_INGEST_METHODS as
+    long as the filesystems do not support them.
+
+    :param source: file of the feed; it is never modified
+    :type  source: str
+
+    :param destination: full path of the file in the storage
+    :type  destination: str
+
+    :param method: first method to try, one of LOCAL_INGEST_METHODS
+    :type  method: str
+
+    :return: tuple of the method used and the number of bytes written
+    :rtype:  tuple
+    """
+    _ensure_parent_dir(destination)
+
+    methods = constants.LOCAL_INGEST_METHODS
+    for method in methods[methods.index(method):]:
+        try:
+            if method == constants.LOCAL_INGEST_HARDLINK:
+                _link_into_place(source, destination)
+                return method, 0
+            elif method == constants.LOCAL_INGEST_REFLINK:
+                _write_into_place(source, destination, _reflink)
+                return method, 0
+            elif method == constants.LOCAL_INGEST_COPY_RANGE:
+                return method, _write_into_place(source, destination, _copy_range)
+            else:
+                return method, copy_into_place(source, destination)
+        except _Unsupported, e:
+            _LOG.debug('Cannot %s <%s> to <%s>: %s' % (method, source, destination, e))
+
+
+def copy_into_place(source, destination):
+    """
+    Copies a file the importer does not own (e.g. the pool of a local feed)
+    to its location in the storage. The data is streamed into a temporary
+    file in the destination directory, which is then renamed, so the
+    destination is never seen partially written.
+
+    :param source: file to copy
+    :type  source: str
+
+    :param destination: full path of the file in the storage
+    :type  destination: str
+
+    :return: number of bytes written
+    :rtype:  int
+    """
+    _ensure_parent_dir(destination)
+    return _write_into_place(source, destination, _copy)
+
+
+def link_into_place(source, destination):
+    """
+    Places a file sharing the data of the source, with a hardlink or else a
+    reflink. The data is never copied.
+
+    :param source: file to link; it is never modified
+    :type  source: str
+
+    :param destination: full path of the file to create
+    :type  destination: str
+
+    :return: method used, LOCAL_INGEST_HARDLINK or LOCAL_INGEST_REFLINK; None
+             if the filesystems support neither
+    :rtype:  str or None
+    """
+    _ensure_parent_dir(destination)
+    try:
+        _link_into_place(source, destination)
+        return constants.LOCAL_INGEST_HARDLINK
+    except _Unsupported, e:
+        _LOG.debug('Cannot hardlink <%s> to <%s>: %s' % (source, destination, e))
+    try:
+        _write_into_place(source, destination, _reflink)
+        return constants.LOCAL_INGEST_REFLINK
+    except _Unsupported, e:
+        _LOG.debug('Cannot reflink <%s> to <%s>: %s' % (source, destination, e))
+    return None
+
+
+def check_free_space(requirements):
+    """
+    Checks the filesystems of the given locations have the space for the
+    files about to be written to them. Locations on the same filesystem do
+    not add up, since the files are moved from one to the other (e.g. from
+    the working directory to the storage).
+
+    :param requirements: list of (path, bytes) tuples; the path need not
+           exist yet
+    :type  requirements: list
+
+    :raise InsufficientSpaceException: if a filesystem is too small
+    """
+    by_device = {}
+    for path, required in requirements:
+        path = _existing_ancestor(path)
+        device = os.stat(path).st_dev
+        if device not in by_device or required > by_device[device][1]:
+            by_device[device] = (path, required)
+
+    for path, required in by_device.values():
+        available = free_space(path)
+        if required > available:
+            raise InsufficientSpaceException(path, required, available)
+
+
+def same_filesystem(path, other):
+    """
+    :param path: location on the filesystem; need not exist yet
+    :type  path: str
+    :param other: another location; need not exist yet
+    :type  other: str
+
+    :return: whether both locations are on the same filesystem
+    :rtype:  bool
+    """
+    return os.stat(_existing_ancestor(path)).st_dev == \
+        os.stat(_existing_ancestor(other)).st_dev
+
+
+def free_space(path):
+    """
+    :param path: location on the filesystem to check
+    :type  path: str
+
+    :return: number of bytes available to unprivileged users
+    :rtype:  int
+    """
+    stat = os.statvfs(path)
+    return stat.f_bavail * stat.f_frsize
+
+
+def preallocate(file_object, size):
+    """
+    Reserves the blocks for the given number of bytes of an open file, so
+    the filesystem can lay it out in one piece. The size of the file is not
+    changed. Nothing is done where fallocate is not supported.
+
+    :param file_object: file open for writing
+    :type  file_object: file
+
+    :param size: final size of the file in bytes
+    :type  size: int
+
+    :return: whether the space was reserved
+    :rtype:  bool
+    """
+    if size <= 0:
+        return False
+
+    libc = _libc()
+    fallocate = getattr(libc, 'fallocate64', None) or getattr(libc, 'fallocate', None)
+    if fallocate is None:
+        return False
+    fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+    fallocate.restype = ctypes.c_int
+
+    if fallocate(file_object.fileno(), FALLOC_FL_KEEP_SIZE, 0, size) != 0:
+        # Unsupported, or the disk is full; the writes will tell
+        _LOG.debug('Cannot preallocate %s bytes for <%s>: %s' %
+                   (size, file_object.name, os.strerror(ctypes.get_errno())))
+        return False
+    return True
+
+
+# -- ingest methods -----------------------------------------------------------
+
+
+class _Unsupported(Exception):
+    """
+    Raised by an ingest method that cannot be used for the given files.
+    """
+    pass
+
+
+def _link_into_place(source, destination):
+    """
+    Hard links the source under a temporary name next to the destination,
+    then renames the link into place.
+    """
+    directory, name = os.path.split(destination)
+    tmp_filename = os.path.join(directory, '.%s.%s' % (name, uuid.uuid4().hex))
+    try:
+        os.link(source, tmp_filename)
+    except OSError, e:
+        if e.errno in UNSUPPORTED_ERRNOS:
+            raise _Unsupported(e)
+        raise
+
+    try:
+        os.rename(tmp_filename, destination)
+    except:
+        os.remove(tmp_filename)
+        raise
+
+
+def _write_into_place(source, destination, write_call):
+    """
+    Creates a temporary file next to the destination, has the given call
+    fill it from the source and renames it into place.
+
+    :param write_call: called with the source and temporary file objects and
+           the size of the source; returns the number of bytes it wrote
+    :type  write_call: func
+
+    :return: value returned by write_call
+    """
+    directory, name = os.path.split(destination)
+    fd, tmp_filename = tempfile.mkstemp(dir=directory, prefix='.%s.' % name)
+    try:
+        tmp_file = os.fdopen(fd, 'wb')
+        try:
+            source_file = open(source, 'rb')
+            try:
+                written = write_call(source_file, tmp_file, os.fstat(source_file.fileno()).st_size)
+            finally:
+                source_file.close()
+        finally:
+            tmp_file.close()
+
+        # Same permissions as the source, mkstemp only grants the owner
+        shutil.copymode(source, tmp_filename)
+        os.rename(tmp_filename, destination)
+    except:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+    return written
+
+
+def _reflink(source_file, tmp_file, size):
+    if fcntl is None:
+        raise _Unsupported('no fcntl')
+    try:
+        fcntl.ioctl(tmp_file.fileno(), FICLONE, source_file.fileno())
+    except IOError, e:
+        if e.errno in UNSUPPORTED_ERRNOS:
+            raise _Unsupported(e)
+        raise
+    return 0
+
+
+def _copy_range(source_file, tmp_file, size):
+    """
+    Has the kernel copy the data, with copy_file_range or else sendfile,
+    without passing it through the importer.
+    """
+    libc = _libc()
+    calls = []
+    if hasattr(libc, 'copy_file_range'):
+        copy_file_range = libc.copy_file_range
+        copy_file_range.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int,
+                                    ctypes.c_void_p, ctypes.c_size_t, ctypes.c_uint]
+        copy_file_range.restype = ctypes.c_ssize_t
+        calls.append(lambda count: copy_file_range(source_file.fileno(), None,
+                                                   tmp_file.fileno(), None, count, 0))
+    if hasattr(libc, 'sendfile'):
+        sendfile = libc.sendfile
+        sendfile.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t]
+        sendfile.restype = ctypes.c_ssize_t
+        calls.append(lambda count: sendfile(tmp_file.fileno(), source_file.fileno(), None, count))
+
+    for call in calls:
+        written = 0
+        while written < size:
+            count = call(min(size - written, COPY_BUFFER_SIZE * 64))
+            if count < 0:
+                err = ctypes.get_errno()
+                if written == 0 and err in UNSUPPORTED_ERRNOS:
+                    break
+                raise OSError(err, os.strerror(err))
+            if count == 0:
+                break
+            written += count
+        else:
+            return written
+        if written > 0:
+            # The source shrank while being copied
+            raise IOError(errno.EIO, 'Short copy of %s' % source_file.name)
+
+    raise _Unsupported('no kernel copy')
+
+
+def _copy(source_file, tmp_file, size):
+    shutil.copyfileobj(source_file, tmp_file, COPY_BUFFER_SIZE)
+    return tmp_file.tell()
+
+
+# -- utilities ----------------------------------------------------------------
+
+
+def _libc():
+    return ctypes.CDLL(None, use_errno=True)
+
+
+def _existing_ancestor(path):
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return path
+
+
+def _ensure_parent_dir(path):
+    parent = os.path.dirname(path)
+    if not os.path.exists(parent):
+        os.makedirs(parent)
@@ -15,21 +15,29 @@ from datetime import datetime
 from gettext import gettext as _
 import logging
 import ipdb
+import multiprocessing
 import os
-import shutil
 import sys
 
 from pulp.common.util import encode_unicode
 from pulp.plugins.conduits.mixins import UnitAssociationCriteria
 
 from pulp_deb.common import constants, model
-from pulp_deb.common.constants import (STATE_FAILED, STATE_RUNNING, STATE_SUCCESS)
+from pulp_deb.common.constants import (STATE_CANCELLED, STATE_FAILED, STATE_RUNNING,
+                                       STATE_SUCCESS)
 from pulp_deb.common.model import Distribution, Package
 from pulp_deb.common.sync_progress import SyncProgressReport
+from pulp_deb.plugins.importers import release, storage
 from pulp_deb.plugins.importers.downloaders import factory as downloader_factory
+from pulp_deb.plugins.importers.downloaders import retry
+from pulp_deb.plugins.importers.downloaders.exceptions import CancelledException
 
 _LOG = logging.getLogger(__name__)
 
+# Number of packages whose files are handed to the downloader at once; the
+# downloader retrieves all files of a batch in parallel
+PACKAGE_BATCH_SIZE = 100
+
 # -- public classes -----------------------------------------------------------
 
 
@@ -47,6 +55,15 @@ class PackageSyncRun(object):
 
         self.progress_report = SyncProgressReport(sync_conduit)
 
+        # Created on first use and shared by both steps, see _create_downloader
+        self.downloader = None
+
+        # Bytes the new packages take in the storage, until the storage is
+        # checked for them with the first unit stored, see _check_free_space
+        self.storage_required = None
+        # Bytes downloaded to the working directory for the current batch
+        self.batch_size = 0
+
         self.dist = model.Distribution(**self.config.get(constants.CONFIG_DIST))
 
     def perform_sync(self):
@@ -56,9 +73,12 @@ class PackageSyncRun(object):
         call. This call will make calls into the conduit's progress update
         as appropriate.
 
-        This call executes serially. No threads are created by this call. It
-        will not return until either a step fails or the entire sync is
-        completed.
+        This call executes serially. No threads are created by this call;
+        the indexes may be parsed by a pool of worker processes, see
+        _create_parse_pool. It will not return until either a step fails,
+        the sync is cancelled or the entire sync is completed. A cancelled
+        step is reported with the cancelled state; the packages saved until
+        then are kept and partial downloads are resumed by the next sync.
 
         :return: the report object to return to Pulp from the sync call
         :rtype:  pulp.plugins.model.SyncReport
@@ -73,6 +93,8 @@ class PackageSyncRun(object):
 
             self._import_packages()
         finally:
+            self._close_downloader()
+
             # One final progress update before finishing
             self.progress_report.update_progress()
 
@@ -94,7 +116,7 @@ class PackageSyncRun(object):
         """
         _LOG.info('Beginning resources retrieval for repository <%s>' % self.repo.id)
 
-        self.progress_report.resource_state = STATE_RUNNING
+        self.progress_report.metadata_state = STATE_RUNNING
         self.progress_report.update_progress()
 
         start_time = datetime.now()
@@ -102,19 +124,36 @@ class PackageSyncRun(object):
         # Retrieve the metadata from the source
         try:
             downloader = self._create_downloader()
-            resources = downloader.download_resources(
-                self.dist.get_indexes(),
-                self.progress_report)
+            indexes = self.dist.get_indexes()
+
+            # Let the Release file pick the variant of each index and tell
+            # which ones did not change
+            dist_release = self._retrieve_release(downloader)
+            if dist_release is not None:
+                dist_release.update_indexes(indexes)
+
+            resources = downloader.download_resources(indexes, self.progress_report)
+        except CancelledException:
+            _LOG.info('Sync of repository <%s> cancelled while retrieving resources' % self.repo.id)
+            self.progress_report.metadata_state = STATE_CANCELLED
+
+            end_time = datetime.now()
+            duration = end_time - start_time
+            self.progress_report.metadata_execution_time = duration.seconds
+
+            self.progress_report.update_progress()
+
+            return None
         except Exception, e:
             _LOG.exception('Exception while retrieving resources for repository <%s>' % self.repo.id)
-            self.progress_report.state = STATE_FAILED
-            self.progress_report.error_message = _('Error downloading resources')
-            self.progress_report.exception = e
-            self.progress_report.traceback = sys.exc_info()[2]
+            self.progress_report.metadata_state = STATE_FAILED
+            self.progress_report.metadata_error_message = _('Error downloading resources')
+            self.progress_report.metadata_exception = e
+            self.progress_report.metadata_traceback = sys.exc_info()[2]
 
             end_time = datetime.now()
             duration = end_time - start_time
-            self.progress_report.execution_time = duration.seconds
+            self.progress_report.metadata_execution_time = duration.seconds
 
             self.progress_report.update_progress()
 
@@ -122,31 +161,67 @@ class PackageSyncRun(object):
 
         # Parse the retrieved resoruces documents
         try:
-            self.dist.update_from_resources(resources)
+            pool = self._create_parse_pool(len(resources))
+            if pool is None:
+                self.dist.update_from_resources(resources)
+            else:
+                try:
+                    # One index at a time, they vary widely in size
+                    self.dist.update_from_resources(
+                        resources, map_call=lambda f, items: pool.map(f, items, 1))
+                finally:
+                    pool.terminate()
+                    pool.join()
         except Exception, e:
             _LOG.exception('Exception parsing resources for repository <%s>' % self.repo.id)
-            self.progress_report.state = STATE_FAILED
-            self.progress_report.error_message = _('Error parsing repository packages resources document')
-            self.progress_report.exception = e
-            self.progress_report.traceback = sys.exc_info()[2]
+            self.progress_report.metadata_state = STATE_FAILED
+            self.progress_report.metadata_error_message = _('Error parsing repository packages resources document')
+            self.progress_report.metadata_exception = e
+            self.progress_report.metadata_traceback = sys.exc_info()[2]
 
             end_time = datetime.now()
             duration = end_time - start_time
-            self.progress_report.execution_time = duration.seconds
+            self.progress_report.metadata_execution_time = duration.seconds
 
             self.progress_report.update_progress()
 
             return None
 
         # Last update to the progress report before returning
-        self.progress_report.state = STATE_SUCCESS
+        self.progress_report.metadata_state = STATE_SUCCESS
 
         end_time = datetime.now()
         duration = end_time - start_time
-        self.progress_report.execution_time = duration.seconds
+        self.progress_report.metadata_execution_time = duration.seconds
 
         self.progress_report.update_progress()
 
+    def _retrieve_release(self, downloader):
+        """
+        Retrieves and parses the Release file of the distribution.
+
+        :param downloader: downloader instance to use for retrieving the file
+
+        :return: the parsed Release file; None if the distribution has none
+        :rtype:  release.Release or None
+        """
+        for resource in self.dist.get_release_resources():
+            downloader.download_resources([resource], self.progress_report, in_memory=True,
+                                          raise_on_error=False)
+            if 'error' in resource:
+                _LOG.info('Could not retrieve <%s>: %s' % (resource['url'], resource['error']))
+                continue
+
+            try:
+                return release.Release(resource['url'], resource['content'])
+            except Exception:
+                _LOG.exception('Exception parsing <%s>' % resource['url'])
+                return None
+
+        _LOG.warn('No Release file found for repository <%s>, retrieving all indexes' %
+                  self.repo.id)
+        return None
+
     def _import_packages(self):
         """
         Imports each package in the repository into Pulp.
@@ -173,6 +248,30 @@ class PackageSyncRun(object):
         # Perform the actual logic
         try:
             self._do_import_packages()
+        except CancelledException:
+            _LOG.info('Sync of repository <%s> cancelled while retrieving packages' % self.repo.id)
+            self.progress_report.packages_state = STATE_CANCELLED
+
+            end_time = datetime.now()
+            duration = end_time - start_time
+            self.progress_report.packages_execution_time = duration.seconds
+
+            self.progress_report.update_progress()
+
+            return
+        except storage.InsufficientSpaceException, e:
+            _LOG.error('Cannot import packages for repository <%s>: %s' % (self.repo.id, e))
+            self.progress_report.packages_state = STATE_FAILED
+            self.progress_report.packages_error_message = _('Not enough disk space')
+            self.progress_report.packages_exception = e
+
+            end_time = datetime.now()
+            duration = end_time - start_time
+            self.progress_report.packages_execution_time = duration.seconds
+
+            self.progress_report.update_progress()
+
+            return
         except Exception, e:
             _LOG.exception('Exception importing packages for repository <%s>' % self.repo.id)
             self.progress_report.packages_state = STATE_FAILED
@@ -220,24 +319,39 @@ class PackageSyncRun(object):
 
         new_unit_keys = self._resolve_new_units(existing_package_keys, packages_by_key.keys())
         remove_unit_keys = self._resolve_remove_units(existing_package_keys, packages_by_key.keys())
+        new_packages = _interleave_by_size([packages_by_key[k] for k in new_unit_keys])
 
         # Once we know how many things need to be processed, we can update the
         # progress report
-        self.progress_report.packages_total_count = len(new_unit_keys)
+        self.progress_report.packages_total_count = len(new_packages)
         self.progress_report.packages_finished_count = 0
         self.progress_report.packages_error_count = 0
+        self.progress_report.set_packages_total_bytes(sum([p.size for p in new_packages]))
         self.progress_report.update_progress()
 
-        # Add new units
-        for key in new_unit_keys:
-            package = packages_by_key[key]
-            try:
-                self._add_new_package(downloader, package)
-                self.progress_report.packages_finished_count += 1
-            except Exception, e:
-                self.progress_report.add_failed_package(package, e, sys.exc_info()[2])
+        # Rather fail now than with a full disk halfway through
+        self._check_free_space(new_packages)
 
-            self.progress_report.update_progress()
+        # Add new units
+        retry_packages = []
+        for i in range(0, len(new_packages), PACKAGE_BATCH_SIZE):
+            if self.is_cancelled_call():
+                raise CancelledException()
+
+            retry_packages.extend(
+                self._add_new_packages(downloader, new_packages[i:i + PACKAGE_BATCH_SIZE]))
+
+        # Packages that failed for a transient reason get a last chance once
+        # all others are done, giving the servers time to recover
+        if retry_packages:
+            _LOG.info('Retrying %s packages for repository <%s>' %
+                      (len(retry_packages), self.repo.id))
+        for i in range(0, len(retry_packages), PACKAGE_BATCH_SIZE):
+            if self.is_cancelled_call():
+                raise CancelledException()
+
+            self._add_new_packages(downloader, retry_packages[i:i + PACKAGE_BATCH_SIZE],
+                                   final=True)
 
         # Remove missing units if the configuration indicates to do so
         if self._should_remove_missing():
@@ -253,25 +367,28 @@ class PackageSyncRun(object):
     def _content_unit(self, resource, type_id, unit_key, unit_metadata):
         unit = self.sync_conduit.init_unit(
             type_id, unit_key, unit_metadata, resource['storage_path'])
+        if self.storage_required is not None:
+            self._check_storage_space(unit.storage_path)
         try:
-            storage_dir = os.path.dirname(unit.storage_path)
-            if not os.path.exists(storage_dir):
-                os.makedirs(storage_dir)
-
-            # Copy them to the final location
-            shutil.copy(resource['path'], unit.storage_path)
-        except IOError:
-            _LOG.error("Error copying unit %s to %s" %
+            # Files downloaded by the importer are moved to the final
+            # location, the others still belong to the feed
+            if resource.get('temporary'):
+                method, size = storage.move_into_place(resource['path'], unit.storage_path)
+            else:
+                method, size = storage.ingest(resource['path'], unit.storage_path,
+                                              self._local_ingest_method())
+        except (IOError, OSError):
+            _LOG.error("Error storing unit %s to %s" %
                     (unit_key, unit.storage_path))
             raise
+
+        stats = self.progress_report.ingest_stats.setdefault(method, {'files': 0, 'bytes': 0})
+        stats['files'] += 1
+        stats['bytes'] += size
         return unit
 
-    def _content_units_from_package(self, downloader, package):
+    def _content_units_from_package(self, package, pkg_resources):
         # Loop through each resource in the package creating units pr resource
-        pkg_resources = package.get_resources()
-
-        downloader.download_resources(pkg_resources, self.progress_report)
-
         units = []
         for resource in pkg_resources:
             # TODO: Use seperate type here? if it's a Binary vs Source
@@ -280,15 +397,83 @@ class PackageSyncRun(object):
             units.append(unit)
         return units
 
-    def _add_new_package(self, downloader, package):
+    def _add_new_packages(self, downloader, packages, final=False):
+        """
+        Downloads the files of all given packages in a single batch and saves
+        each package whose files were all retrieved. Failures are recorded
+        per package in the progress report, except for transient download
+        failures when this is not the final attempt.
+
+        :param downloader: downloader instance to use for retrieving the units
+        :param packages: package instances to download
+        :type  packages: list of Package
+
+        :param final: whether the packages will not be attempted again
+        :type  final: bool
+
+        :return: packages that failed and are to be attempted again
+        :rtype:  list of Package
+        """
+        resources_by_package = [(p, p.get_resources()) for p in packages]
+
+        batch_resources = []
+        for package, pkg_resources in resources_by_package:
+            # Drop the failure of an earlier attempt
+            for resource in pkg_resources:
+                resource.pop('error', None)
+            batch_resources.extend(pkg_resources)
+
+        downloader.download_resources(batch_resources, self.progress_report,
+                                      raise_on_error=False)
+        self.batch_size = sum([int(r.get('size') or 0) for r in batch_resources
+                               if r.get('temporary') and 'error' not in r])
+
+        retry_packages = []
+        for package, pkg_resources in resources_by_package:
+            try:
+                errors = [r['error'] for r in pkg_resources if 'error' in r]
+                if errors:
+                    raise errors[0]
+
+                self._add_new_package(package, pkg_resources)
+                self.progress_report.packages_finished_count += 1
+            except storage.InsufficientSpaceException:
+                # No other package would fit either
+                for pkg_resources in [r for p, r in resources_by_package]:
+                    self._remove_temporary_files(pkg_resources)
+                raise
+            except Exception, e:
+                if not final and retry.is_transient(e):
+                    retry_packages.append(package)
+                    # All of its files are retrieved and counted again
+                    self.progress_report.retract_finished_bytes(
+                        sum([int(r.get('size') or 0) for r in pkg_resources if 'error' not in r]))
+                else:
+                    self.progress_report.add_failed_package(package, e, sys.exc_info()[2])
+                    # The files that were not retrieved are done with as well
+                    self.progress_report.add_finished_bytes(
+                        sum([int(r.get('size') or 0) for r in pkg_resources if 'error' in r]))
+
+            self._remove_temporary_files(pkg_resources)
+            self.progress_report.update_progress()
+
+            # Free the views computed for the import, the package stays in
+            # the distribution until the end of the sync
+            package.clear_views()
+
+        return retry_packages
+
+    def _add_new_package(self, package, pkg_resources):
         """
-        Performs the tasks for downloading and saving a new unit in Pulp.
+        Performs the tasks for saving a new, already downloaded unit in Pulp.
 
-        :param downloader: downloader instance to use for retrieving the unit
-        :param package: package instance to download
+        :param package: package instance to save
         :type  package: Package
+
+        :param pkg_resources: downloaded resources of the package
+        :type  pkg_resources: list
         """
-        units = self._content_units_from_package(downloader, package)
+        units = self._content_units_from_package(package, pkg_resources)
 
         parent = None
         # Initialize the unit in Pulp
@@ -305,6 +490,66 @@ class PackageSyncRun(object):
             if parent:
                 self.sync_conduit.link_unit(parent, unit)
 
+    def _remove_temporary_files(self, pkg_resources):
+        """
+        Deletes the files downloaded for a package that were not moved into
+        the storage, e.g. because another file of the package failed.
+        Partial downloads of the failed files are not listed in the
+        resources and are left for the next sync to resume.
+
+        :param pkg_resources: resources of the package
+        :type  pkg_resources: list
+        """
+        for resource in pkg_resources:
+            if resource.get('temporary') and os.path.exists(resource['path']):
+                try:
+                    os.remove(resource['path'])
+                except OSError:
+                    _LOG.exception('Could not remove temporary file <%s>' % resource['path'])
+
+    def _check_free_space(self, packages):
+        """
+        Checks that the package files fit on the filesystem of the working
+        directory, which holds the downloads of a batch. The storage is
+        checked once the first unit tells where it is (see
+        _check_storage_space). Files of a local feed are not downloaded and
+        may be linked into the storage, so they are not checked.
+
+        :param packages: packages about to be retrieved, in the order they
+               are retrieved in
+        :type  packages: list of Package
+
+        :raise storage.InsufficientSpaceException: if it is too small
+        """
+        if not packages or self.dist['url'].startswith('file://'):
+            return
+
+        sizes = [p.size for p in packages]
+        batch_size = max([sum(sizes[i:i + PACKAGE_BATCH_SIZE])
+                          for i in range(0, len(sizes), PACKAGE_BATCH_SIZE)])
+
+        storage.check_free_space([(self.repo.working_dir, batch_size)])
+        self.storage_required = sum(sizes)
+
+    def _check_storage_space(self, storage_path):
+        """
+        Checks that the package files fit on the filesystem of the storage,
+        before the first of them is stored.
+
+        :param storage_path: storage location of the first unit
+        :type  storage_path: str
+
+        :raise storage.InsufficientSpaceException: if it is too small
+        """
+        required = self.storage_required
+        self.storage_required = None
+
+        # The files of the batch being stored already take their space when
+        # they are moved within the same filesystem
+        if storage.same_filesystem(storage_path, self.repo.working_dir):
+            required -= self.batch_size
+        storage.check_free_space([(storage_path, required)])
+
     def _package_exists(self, filename):
         """
         Determines if the package at the given filename is already downloaded.
@@ -339,14 +584,74 @@ class PackageSyncRun(object):
     def _create_downloader(self):
         """
         Uses the configuratoin to determine which downloader style to use
-        for this run.
+        for this run. The same instance is returned for the whole run so
+        connections can be reused between the metadata and package steps.
 
         :return: one of the *Downloader classes in the downloaders package
         """
-        url = self.dist['url']
-        downloader = downloader_factory.get_downloader(url, self.repo, self.sync_conduit,
-                                                       self.config, self.is_cancelled_call)
-        return downloader
+        if self.downloader is None:
+            url = self.dist['url']
+            self.downloader = downloader_factory.get_downloader(
+                url, self.repo, self.sync_conduit, self.config, self.is_cancelled_call)
+        return self.downloader
+
+    def _close_downloader(self):
+        """
+        Collects the statistics of the run's downloader into the progress
+        report and closes it.
+        """
+        if self.downloader is None:
+            return
+
+        try:
+            self.progress_report.download_stats = self.downloader.statistics()
+            self.downloader.close()
+        except Exception:
+            _LOG.exception('Exception closing the downloader for repository <%s>' % self.repo.id)
+        self.downloader = None
+
+    def _create_parse_pool(self, index_count):
+        """
+        Creates the pool of processes parsing the indexes in parallel, if
+        the configuration asks for more than one, sized by the configuration
+        and the number of indexes.
+
+        The workers are forked from the Pulp server process and inherit its
+        database connections and locks. They only read the index files and
+        send back the parsed paragraphs, and are terminated once done,
+        without touching either.
+
+        :param index_count: number of indexes to parse
+        :type  index_count: int
+
+        :return: the pool; None if the indexes are to be parsed in this
+                 process
+        :rtype:  multiprocessing.Pool or None
+        """
+        workers = self.config.get(constants.CONFIG_PARSE_WORKERS)
+        if workers is None:
+            return None
+        workers = min(int(workers), index_count)
+        if workers <= 1:
+            return None
+
+        try:
+            return multiprocessing.Pool(workers)
+        except (AssertionError, OSError), e:
+            # Daemonic worker processes may not have children
+            _LOG.warn('Parsing the indexes of repository <%s> in a single process: %s' %
+                      (self.repo.id, e))
+            return None
+
+    def _local_ingest_method(self):
+        """
+        Returns the first method to try when bringing files of a local feed
+        into the storage.
+
+        :return: one of constants.LOCAL_INGEST_METHODS
+        :rtype:  str
+        """
+        return self.config.get(constants.CONFIG_LOCAL_INGEST) or constants.DEFAULT_LOCAL_INGEST
 
     def _should_remove_missing(self):
         """
@@ -360,3 +665,30 @@ class PackageSyncRun(object):
             return constants.DEFAULT_REMOVE_MISSING
         else:
             return self.config.get_boolean(constants.CONFIG_REMOVE_MISSING)
+
+
+# -- utilities ----------------------------------------------------------------
+
+
+def _interleave_by_size(packages):
+    """
+    Orders the packages to download by the size of their files, alternating
+    between the largest and the smallest remaining ones. The large files
+    start early, so the byte based progress is meaningful from the start,
+    while the small ones keep the other transfers of each batch busy.
+
+    :param packages: packages to order
+    :type  packages: list of Package
+
+    :rtype: list of Package
+    """
+    by_size = sorted(packages, key=lambda p: p.size, reverse=True)
+    ordered = []
+    first, last = 0, len(by_size) - 1
+    while first <= last:
+        ordered.append(by_size[first])
+        if first < last:
+            ordered.append(by_size[last])
+        first += 1
+        last -= 1
+    return ordered
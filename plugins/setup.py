@@ -31,6 +31,7 @@ setup(
         ],
         'pulp.downloaders.deb': [
             'http = pulp_deb.plugins.importers.downloaders.web:HttpDownloader',
+            'http-event = pulp_deb.plugins.importers.downloaders.event:EventHttpDownloader',
             'file = pulp_deb.plugins.importers.downloaders.local:LocalDownloader',
         ]
     }
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+"""
+Compares the HTTP download drivers on a local web server standing in for a
+repository. Each driver retrieves the same set of generated files in its own
+process, so the peak memory reported is its own.
+
+Usage:
+    python bench_downloaders.py [--files N] [--size BYTES] [--max-downloads N]
+"""
+
+import BaseHTTPServer
+import multiprocessing
+import optparse
+import os
+import resource
+import shutil
+import SimpleHTTPServer
+import SocketServer
+import tempfile
+import time
+
+from pulp_deb.common import constants
+from pulp_deb.plugins.importers.downloaders.event import EventHttpDownloader
+from pulp_deb.plugins.importers.downloaders.web import HttpDownloader
+
+
+DRIVERS = (
+    ('http', HttpDownloader),
+    ('http-event', EventHttpDownloader),
+)
+
+
+# -- stand-ins ----------------------------------------------------------------
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class Handler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+
+class Repo(object):
+    def __init__(self, working_dir):
+        self.id = 'bench'
+        self.working_dir = working_dir
+
+
+class ProgressReport(object):
+    def update_progress(self):
+        pass
+
+
+# -- benchmark ----------------------------------------------------------------
+
+
+def serve(root, port_queue):
+    os.chdir(root)
+    server = Server(('127.0.0.1', 0), Handler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def run_driver(downloader_class, urls, max_downloads, result_queue):
+    working_dir = tempfile.mkdtemp(prefix='bench-')
+    try:
+        config = {
+            constants.CONFIG_MAX_DOWNLOADS: max_downloads,
+            constants.CONFIG_MAX_DOWNLOADS_PER_HOST: max_downloads,
+            constants.CONFIG_CACHE_DIR: os.path.join(working_dir, 'cache'),
+        }
+        downloader = downloader_class(Repo(working_dir), None, config, lambda: False)
+        resources = [{'url': url} for url in urls]
+
+        start = time.time()
+        downloader.download_resources(resources, ProgressReport())
+        elapsed = time.time() - start
+
+        downloader.close()
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        result_queue.put((elapsed, usage.ru_utime + usage.ru_stime, usage.ru_maxrss))
+    finally:
+        shutil.rmtree(working_dir)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--files', type='int', default=2000)
+    parser.add_option('--size', type='int', default=16 * 1024)
+    parser.add_option('--max-downloads', type='int', default=100)
+    options, args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench-repo-')
+    try:
+        data = os.urandom(options.size)
+        for i in range(options.files):
+            f = open(os.path.join(root, 'package-%05d.deb' % i), 'wb')
+            f.write(data)
+            f.close()
+
+        port_queue = multiprocessing.Queue()
+        server = multiprocessing.Process(target=serve, args=(root, port_queue))
+        server.daemon = True
+        server.start()
+        base_url = 'http://127.0.0.1:%s' % port_queue.get()
+        urls = [base_url + '/package-%05d.deb' % i for i in range(options.files)]
+
+        print '%s files of %s bytes, %s transfers at once' % (
+            options.files, options.size, options.max_downloads)
+        for name, downloader_class in DRIVERS:
+            result_queue = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=run_driver,
+                args=(downloader_class, urls, options.max_downloads, result_queue))
+            process.start()
+            elapsed, cpu, max_rss = result_queue.get()
+            process.join()
+
+            print '%-12s %7.2fs %8.0f files/s %8.1f MB/s %7.2fs CPU %7.1f MB peak RSS' % (
+                name, elapsed, options.files / elapsed,
+                options.files * options.size / elapsed / 1024 / 1024, cpu, max_rss / 1024.0)
+
+        server.terminate()
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
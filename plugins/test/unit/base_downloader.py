@@ -23,6 +23,7 @@ from pulp.plugins.config import PluginCallConfiguration
 from pulp.plugins.model import Repository
 
 from pulp_deb.common import model, samples
+from pulp_deb.plugins.importers.downloaders import cache
 
 
 class BaseDownloaderTests(unittest.TestCase):
@@ -31,6 +32,12 @@ class BaseDownloaderTests(unittest.TestCase):
         self.working_dir = tempfile.mkdtemp(prefix='downloader-tests')
         self.repo = Repository('test-repo', working_dir=self.working_dir)
 
+        # Keep the blob cache shared by all repositories to the test
+        cache_patcher = mock.patch.object(cache, 'pulp_storage_dir',
+                                          return_value=self.working_dir)
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+
         self.config = PluginCallConfiguration({}, {})
 
         self.mock_cancelled_callback = mock.MagicMock().is_cancelled
@@ -52,6 +52,91 @@ class ResourcesTests(unittest.TestCase):
         self.assertTrue('Resources error' in msg)
 
 
+class MirrorsTests(unittest.TestCase):
+    @mock.patch('pulp_deb.plugins.importers.configuration.factory.is_valid_url')
+    def test_validate_mirrors(self, mock_valid):
+        # Setup
+        mock_valid.return_value = True
+
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_MIRRORS: ['http://a', 'http://b']}, {})
+        result, msg = configuration._validate_mirrors(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_mirrors_missing(self):
+        # Test
+        config = PluginCallConfiguration({}, {})
+        result, msg = configuration._validate_mirrors(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_mirrors_not_list(self):
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_MIRRORS: 'http://a'}, {})
+        result, msg = configuration._validate_mirrors(config)
+
+        # Verify
+        self.assertTrue(not result)
+        self.assertTrue(constants.CONFIG_MIRRORS in msg)
+
+    @mock.patch('pulp_deb.plugins.importers.configuration.factory.is_valid_url')
+    def test_validate_mirrors_invalid(self, mock_valid):
+        # Setup
+        mock_valid.side_effect = lambda url: url != 'foo'
+
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_MIRRORS: ['http://a', 'foo']}, {})
+        result, msg = configuration._validate_mirrors(config)
+
+        # Verify
+        self.assertTrue(not result)
+        self.assertTrue('foo' in msg)
+
+
+class DownloadDriverTests(unittest.TestCase):
+    @mock.patch('pulp_deb.plugins.importers.configuration.url_utils')
+    def test_validate_download_driver(self, mock_url_utils):
+        # Setup
+        mock_url_utils.get_repo.return_value = {constants.CONFIG_URL: 'http://a'}
+        mock_url_utils.determine_url_type.return_value = 'http'
+
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_DOWNLOAD_DRIVER: 'event'}, {})
+        result, msg = configuration._validate_download_driver(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_download_driver_missing(self):
+        # Test
+        config = PluginCallConfiguration({}, {})
+        result, msg = configuration._validate_download_driver(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    @mock.patch('pulp_deb.plugins.importers.configuration.url_utils')
+    def test_validate_download_driver_invalid(self, mock_url_utils):
+        # Setup
+        mock_url_utils.get_repo.return_value = {constants.CONFIG_URL: 'file:///a'}
+        mock_url_utils.determine_url_type.return_value = 'file'
+
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_DOWNLOAD_DRIVER: 'event'}, {})
+        result, msg = configuration._validate_download_driver(config)
+
+        # Verify
+        self.assertTrue(not result)
+        self.assertTrue(constants.CONFIG_DOWNLOAD_DRIVER in msg)
+
+
 class RemoveMissingTests(unittest.TestCase):
     def test_validate_remove_missing(self):
         # Test
@@ -82,6 +167,249 @@ class RemoveMissingTests(unittest.TestCase):
         self.assertTrue(constants.CONFIG_REMOVE_MISSING in msg)
 
 
+class PdiffsTests(unittest.TestCase):
+    def test_validate_pdiffs(self):
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_PDIFFS: 'false'}, {})
+        result, msg = configuration._validate_pdiffs(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_pdiffs_missing(self):
+        # Test
+        config = PluginCallConfiguration({}, {})
+        result, msg = configuration._validate_pdiffs(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_pdiffs_invalid(self):
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_PDIFFS: 'foo'}, {})
+        result, msg = configuration._validate_pdiffs(config)
+
+        # Verify
+        self.assertTrue(not result)
+        self.assertTrue(constants.CONFIG_PDIFFS in msg)
+
+
+class DumpTimingsTests(unittest.TestCase):
+    def test_validate_dump_timings(self):
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_DUMP_TIMINGS: 'true'}, {})
+        result, msg = configuration._validate_dump_timings(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_dump_timings_invalid(self):
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_DUMP_TIMINGS: 'foo'}, {})
+        result, msg = configuration._validate_dump_timings(config)
+
+        # Verify
+        self.assertTrue(not result)
+        self.assertTrue(constants.CONFIG_DUMP_TIMINGS in msg)
+
+
+class CacheDirTests(unittest.TestCase):
+    def test_validate_cache_dir(self):
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_CACHE_DIR: '/var/cache/pulp_deb'}, {})
+        result, msg = configuration._validate_cache_dir(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_cache_dir_missing(self):
+        # Test
+        config = PluginCallConfiguration({}, {})
+        result, msg = configuration._validate_cache_dir(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_cache_dir_relative(self):
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_CACHE_DIR: 'cache'}, {})
+        result, msg = configuration._validate_cache_dir(config)
+
+        # Verify
+        self.assertTrue(not result)
+        self.assertTrue(constants.CONFIG_CACHE_DIR in msg)
+
+    def test_validate_cache_size(self):
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_CACHE_SIZE: '1073741824'}, {})
+        result, msg = configuration._validate_cache_size(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_cache_size_invalid(self):
+        for value in ('foo', '0', -1):
+            # Test
+            config = PluginCallConfiguration({constants.CONFIG_CACHE_SIZE: value}, {})
+            result, msg = configuration._validate_cache_size(config)
+
+            # Verify
+            self.assertTrue(not result)
+            self.assertTrue(constants.CONFIG_CACHE_SIZE in msg)
+
+
+class MaxDownloadsTests(unittest.TestCase):
+    def test_validate_max_downloads(self):
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_MAX_DOWNLOADS: '10',
+                                          constants.CONFIG_MAX_DOWNLOADS_PER_HOST: 2}, {})
+        result, msg = configuration._validate_max_downloads(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_max_downloads_missing(self):
+        # Test
+        config = PluginCallConfiguration({}, {})
+        result, msg = configuration._validate_max_downloads(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_max_downloads_invalid(self):
+        for value in ('foo', '0', -1):
+            # Test
+            config = PluginCallConfiguration({constants.CONFIG_MAX_DOWNLOADS_PER_HOST: value}, {})
+            result, msg = configuration._validate_max_downloads(config)
+
+            # Verify
+            self.assertTrue(not result)
+            self.assertTrue(constants.CONFIG_MAX_DOWNLOADS_PER_HOST in msg)
+
+
+class MaxSpeedTests(unittest.TestCase):
+    def test_validate_max_speed(self):
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_MAX_SPEED: '102400',
+                                          constants.CONFIG_WORKER_MAX_SPEED: 1048576}, {})
+        result, msg = configuration._validate_max_speed(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_max_speed_missing(self):
+        # Test
+        config = PluginCallConfiguration({}, {})
+        result, msg = configuration._validate_max_speed(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_max_speed_invalid(self):
+        for value in ('fast', '0', -1):
+            # Test
+            config = PluginCallConfiguration({constants.CONFIG_WORKER_MAX_SPEED: value}, {})
+            result, msg = configuration._validate_max_speed(config)
+
+            # Verify
+            self.assertTrue(not result)
+            self.assertTrue(constants.CONFIG_WORKER_MAX_SPEED in msg)
+
+
+class RetriesTests(unittest.TestCase):
+    def test_validate_retries(self):
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_MAX_RETRIES: '0',
+                                          constants.CONFIG_RETRY_DELAY: 5}, {})
+        result, msg = configuration._validate_retries(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_retries_missing(self):
+        # Test
+        config = PluginCallConfiguration({}, {})
+        result, msg = configuration._validate_retries(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_retries_invalid(self):
+        for key, value in ((constants.CONFIG_MAX_RETRIES, 'many'),
+                           (constants.CONFIG_MAX_RETRIES, -1),
+                           (constants.CONFIG_RETRY_DELAY, '0')):
+            # Test
+            config = PluginCallConfiguration({key: value}, {})
+            result, msg = configuration._validate_retries(config)
+
+            # Verify
+            self.assertTrue(not result)
+            self.assertTrue(key in msg)
+
+
+class ParseWorkersTests(unittest.TestCase):
+    def test_validate_parse_workers(self):
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_PARSE_WORKERS: '4'}, {})
+        result, msg = configuration._validate_parse_workers(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_parse_workers_invalid(self):
+        for value in ('all', '0', -1):
+            # Test
+            config = PluginCallConfiguration({constants.CONFIG_PARSE_WORKERS: value}, {})
+            result, msg = configuration._validate_parse_workers(config)
+
+            # Verify
+            self.assertTrue(not result)
+            self.assertTrue(constants.CONFIG_PARSE_WORKERS in msg)
+
+
+class LocalIngestTests(unittest.TestCase):
+    def test_validate_local_ingest(self):
+        for value in constants.LOCAL_INGEST_METHODS:
+            # Test
+            config = PluginCallConfiguration({constants.CONFIG_LOCAL_INGEST: value}, {})
+            result, msg = configuration._validate_local_ingest(config)
+
+            # Verify
+            self.assertTrue(result)
+            self.assertTrue(msg is None)
+
+    def test_validate_local_ingest_missing(self):
+        # Test
+        config = PluginCallConfiguration({}, {})
+        result, msg = configuration._validate_local_ingest(config)
+
+        # Verify
+        self.assertTrue(result)
+        self.assertTrue(msg is None)
+
+    def test_validate_local_ingest_invalid(self):
+        # Test
+        config = PluginCallConfiguration({constants.CONFIG_LOCAL_INGEST: 'symlink'}, {})
+        result, msg = configuration._validate_local_ingest(config)
+
+        # Verify
+        self.assertTrue(not result)
+        self.assertTrue(constants.CONFIG_LOCAL_INGEST in msg)
+
+
 class FullValidationTests(unittest.TestCase):
 
     @mock.patch('pulp_deb.plugins.importers.configuration._validate_resources')
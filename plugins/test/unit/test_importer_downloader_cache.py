@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import hashlib
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+from pulp_deb.common import constants
+from pulp_deb.plugins.importers.downloaders import cache
+
+
+URL = 'http://ubuntu.uib.no/archive/dists/precise/main/binary-amd64/Packages.gz'
+
+
+class MetadataCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp(prefix='metadata-cache-tests')
+        self.cache = cache.MetadataCache(self.working_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def _download(self, content='abc'):
+        filename = os.path.join(self.working_dir, 'download')
+        f = open(filename, 'w')
+        f.write(content)
+        f.close()
+        return filename
+
+    def test_filename(self):
+        self.assertEqual(self.cache.filename(URL),
+                         os.path.join(self.working_dir, cache.METADATA_CACHE_DIR,
+                                      'archive_dists_precise_main_binary-amd64_Packages.gz'))
+
+    def test_store(self):
+        # Setup
+        downloaded = self._download()
+        validators = {'etag': '"1234"', 'last_modified': 'Mon, 01 Oct 2012 10:00:00 GMT'}
+
+        # Test
+        cached = self.cache.store(URL, downloaded, validators)
+
+        # Verify
+        self.assertEqual(cached, self.cache.filename(URL))
+        self.assertTrue(os.path.exists(cached))
+        self.assertTrue(not os.path.exists(downloaded))
+        self.assertEqual(self.cache.validators(URL), validators)
+        self.assertEqual(self.cache.request_headers(URL),
+                         ['If-None-Match: "1234"',
+                          'If-Modified-Since: Mon, 01 Oct 2012 10:00:00 GMT'])
+
+    def test_store_replaces_validators(self):
+        # Setup
+        self.cache.store(URL, self._download(), {'etag': '"1"'})
+
+        # Test
+        self.cache.store(URL, self._download('def'), {})
+
+        # Verify
+        self.assertEqual(self.cache.validators(URL), {})
+        self.assertEqual(self.cache.request_headers(URL), [])
+
+    def test_validators_not_cached(self):
+        self.assertEqual(self.cache.validators(URL), {})
+        self.assertEqual(self.cache.request_headers(URL), [])
+
+    def test_validators_other_url(self):
+        # Setup
+        self.cache.store(URL, self._download(), {'etag': '"1"'})
+        other_url = URL.replace('ubuntu.uib.no', 'archive.ubuntu.com')
+
+        # Test & Verify
+        self.assertEqual(self.cache.validators(other_url), {})
+
+    def test_validators_cached_copy_removed(self):
+        # Setup
+        cached = self.cache.store(URL, self._download(), {'etag': '"1"'})
+        os.remove(cached)
+
+        # Test & Verify
+        self.assertEqual(self.cache.validators(URL), {})
+
+    def test_checksum(self):
+        # Setup
+        self.cache.store(URL, self._download(), {'etag': '"1"'}, 'abcd')
+
+        # Test & Verify
+        self.assertEqual(self.cache.checksum(URL), 'abcd')
+        self.assertEqual(self.cache.validators(URL), {'etag': '"1"'})
+
+        self.cache.store(URL, self._download(), {})
+        self.assertTrue(self.cache.checksum(URL) is None)
+
+
+class BlobCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp(prefix='blob-cache-tests')
+        self.cache = cache.BlobCache(os.path.join(self.working_dir, 'blobs'))
+        self.digest = hashlib.sha256('abc').hexdigest()
+
+        self.filename = os.path.join(self.working_dir, 'download')
+        f = open(self.filename, 'w')
+        f.write('abc')
+        f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_add(self):
+        # Test
+        self.cache.add(self.digest, self.filename)
+
+        # Verify - the file is left in place
+        self.assertEqual(self.cache.get(self.digest),
+                         os.path.join(self.working_dir, 'blobs', self.digest[:2], self.digest))
+        self.assertEqual(open(self.cache.get(self.digest)).read(), 'abc')
+        self.assertTrue(os.path.exists(self.filename))
+
+    def test_get_missing(self):
+        self.assertTrue(self.cache.get(self.digest) is None)
+
+        # Verify - the directory is only created by an addition
+        self.assertFalse(os.path.exists(self.cache.cache_dir))
+
+    def test_add_not_writable(self):
+        # Setup
+        self.cache = cache.BlobCache(os.path.join(self.filename, 'blobs'))
+
+        # Test
+        self.cache.add(self.digest, self.filename)
+
+        # Verify
+        self.assertFalse(self.cache.writable)
+        self.assertTrue(self.cache.get(self.digest) is None)
+        self.assertTrue(os.path.exists(self.filename))
+
+    def test_copy_to(self):
+        # Setup
+        self.cache.add(self.digest, self.filename)
+        destination = os.path.join(self.working_dir, 'copy')
+
+        # Test & Verify
+        self.assertTrue(self.cache.copy_to(self.digest, destination))
+        self.assertEqual(open(destination).read(), 'abc')
+        self.assertFalse(self.cache.copy_to('0' * 64, destination + '2'))
+        self.assertFalse(os.path.exists(destination + '2'))
+
+    def test_add_evicts_least_recently_used(self):
+        # Setup
+        digests = []
+        for i, content in enumerate(['1111', '2222', '3333']):
+            digest = hashlib.sha256(content).hexdigest()
+            self.cache.add(digest, self._write(content))
+            # Make the order of use unambiguous
+            os.utime(self.cache.filename(digest), (i, i))
+            digests.append(digest)
+        self.cache.max_size = 9
+
+        # Test - using the first entry makes the second the oldest
+        self.cache.get(digests[0])
+        self.cache.add(self.digest, self._write('abc'))
+
+        # Verify - the new entry is still linked to the file it was added
+        # from, it takes no space of its own
+        self.assertTrue(self.cache.get(digests[1]) is None)
+        self.assertTrue(self.cache.get(digests[0]) is not None)
+        self.assertTrue(self.cache.get(digests[2]) is not None)
+        self.assertTrue(self.cache.get(self.digest) is not None)
+        self.assertEqual(self.cache.size, 8)
+        self.assertEqual(self.cache.evicted, 1)
+
+    def test_add_shared_entries_not_counted(self):
+        # Setup - the files added stay in place, as in the storage
+        self.cache.max_size = 5
+        for content in ['1111', '2222', '3333']:
+            filename = os.path.join(self.working_dir, content)
+            f = open(filename, 'w')
+            f.write(content)
+            f.close()
+            self.cache.add(hashlib.sha256(content).hexdigest(), filename)
+
+        # Verify
+        self.assertEqual(self.cache.size, 0)
+        self.assertEqual(self.cache.evicted, 0)
+
+    def test_evict_skips_linked_entries(self):
+        # Setup - the oldest entry was linked out of the cache since
+        digests = []
+        for i, content in enumerate(['1111', '2222']):
+            digest = hashlib.sha256(content).hexdigest()
+            self.cache.add(digest, self._write(content))
+            os.utime(self.cache.filename(digest), (i, i))
+            digests.append(digest)
+        self.cache.max_size = 100
+        self.cache.add(self.digest, self._write('abc'))
+        os.link(self.cache.filename(digests[0]), os.path.join(self.working_dir, 'linked'))
+
+        # Test
+        self.cache.max_size = 3
+        self.cache._evict()
+
+        # Verify
+        self.assertTrue(self.cache.get(digests[0]) is not None)
+        self.assertTrue(self.cache.get(digests[1]) is None)
+        self.assertEqual(self.cache.size, 0)
+
+    def test_copy_to_shares_entry(self):
+        # Setup
+        self.cache.max_size = 100
+        self.cache.add(self.digest, self.filename)
+        os.remove(self.filename)
+        self.cache._load_entries()
+        self.assertEqual(self.cache.size, 3)
+
+        # Test
+        self.cache.copy_to(self.digest, os.path.join(self.working_dir, 'copy'))
+
+        # Verify
+        self.assertEqual(self.cache.size, 0)
+
+    @mock.patch('pulp_deb.plugins.importers.storage.link_into_place')
+    def test_add_cannot_link(self, mock_link):
+        # Setup - e.g. the cache is on another filesystem
+        mock_link.return_value = None
+
+        # Test
+        self.cache.add(self.digest, self.filename)
+
+        # Verify - the file is not copied into the cache
+        self.assertTrue(self.cache.get(self.digest) is None)
+        self.assertTrue(os.path.exists(self.filename))
+
+    def test_add_larger_than_cache(self):
+        # Setup
+        self.cache.max_size = 2
+
+        # Test
+        self.cache.add(self.digest, self.filename)
+
+        # Verify
+        self.assertTrue(self.cache.get(self.digest) is None)
+        self.assertTrue(os.path.exists(self.filename))
+
+    def test_worker_blob_cache(self):
+        # Test
+        cache_dir = os.path.join(self.working_dir, 'shared')
+        first = cache.worker_blob_cache(cache_dir, 100)
+        second = cache.worker_blob_cache(cache_dir, 50)
+
+        # Verify
+        self.assertTrue(first is second)
+        self.assertEqual(second.max_size, 50)
+        self.assertTrue(cache.worker_blob_cache(cache_dir + '2') is not first)
+
+    def _write(self, content):
+        # The previous file is linked into the cache
+        os.remove(self.filename)
+        f = open(self.filename, 'w')
+        f.write(content)
+        f.close()
+        return self.filename
+
+
+class UrlToFilenameTests(unittest.TestCase):
+
+    def test_url_to_filename(self):
+        self.assertEqual(cache.url_to_filename('http://localhost/a/b/c.deb'), 'a_b_c.deb')
+
+    def test_blob_cache_dir(self):
+        with mock.patch.object(cache, 'pulp_storage_dir', return_value='/s'):
+            self.assertEqual(cache.blob_cache_dir(None, '/w'), '/s/cache/deb')
+        self.assertEqual(cache.blob_cache_dir({constants.CONFIG_CACHE_DIR: '/c'}, '/w'), '/c')
+
+    def test_blob_cache_dir_no_server(self):
+        with mock.patch.object(cache, 'pulp_storage_dir', return_value=None):
+            self.assertEqual(cache.blob_cache_dir(None, '/w'), '/w/' + cache.BLOB_CACHE_DIR)
+
+    def test_pulp_storage_dir(self):
+        pulp_config = mock.MagicMock()
+        pulp_config.get.return_value = '/var/lib/pulp'
+        with mock.patch.object(cache, 'pulp_config', pulp_config):
+            self.assertEqual(cache.pulp_storage_dir(), '/var/lib/pulp')
+            pulp_config.get.assert_called_once_with('server', 'storage_dir')
+            pulp_config.has_option.return_value = False
+            self.assertTrue(cache.pulp_storage_dir() is None)
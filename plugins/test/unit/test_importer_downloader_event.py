@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import pycurl
+import select
+
+import mock
+
+import base_downloader
+from pulp_deb.plugins.importers.downloaders.event import EventHttpDownloader
+
+
+class EventHttpDownloaderTests(base_downloader.BaseDownloaderTests):
+    def setUp(self):
+        super(EventHttpDownloaderTests, self).setUp()
+        self.downloader = EventHttpDownloader(self.repo, None, self.config,
+                                              self.mock_cancelled_callback)
+        self.downloader.poller = mock.MagicMock()
+        self.multi = mock.MagicMock()
+        self.multi.socket_action.return_value = 0, 1
+
+    def test_get_multi(self):
+        # Setup
+        self.downloader.poller = None
+
+        # Test
+        multi = self.downloader._get_multi()
+
+        # Verify
+        self.assertTrue(self.downloader.poller is not None)
+        self.assertTrue(self.downloader._get_multi() is multi)
+        self.downloader.close()
+        self.assertTrue(self.downloader.poller is None)
+
+    def test_socket_callback(self):
+        poller = self.downloader.poller
+
+        # Test
+        self.downloader._socket_callback(pycurl.POLL_OUT, 7, self.multi, None)
+        self.downloader._socket_callback(pycurl.POLL_INOUT, 7, self.multi, None)
+        self.downloader._socket_callback(pycurl.POLL_REMOVE, 7, self.multi, None)
+        self.downloader._socket_callback(pycurl.POLL_REMOVE, 8, self.multi, None)
+
+        # Verify
+        poller.register.assert_called_once_with(7, select.EPOLLOUT)
+        poller.modify.assert_called_once_with(7, select.EPOLLIN | select.EPOLLOUT)
+        poller.unregister.assert_called_once_with(7)
+        self.assertEqual(self.downloader.sockets, {})
+
+    @mock.patch('time.time')
+    def test_timer_callback(self, mock_time):
+        # Setup
+        mock_time.return_value = 100.0
+
+        # Test
+        self.downloader._timer_callback(250)
+        deadline = self.downloader.deadline
+        self.downloader._timer_callback(-1)
+
+        # Verify
+        self.assertEqual(deadline, 100.25)
+        self.assertTrue(self.downloader.deadline is None)
+
+    @mock.patch('time.time')
+    def test_wait(self, mock_time):
+        # Setup
+        mock_time.return_value = 100.0
+        self.downloader.deadline = 100.5
+        self.downloader.poller.poll.return_value = [(7, select.EPOLLIN),
+                                                    (8, select.EPOLLOUT | select.EPOLLHUP)]
+
+        # Test
+        self.downloader._wait(self.multi, 1.0)
+
+        # Verify - woken up in time for curl's timeout
+        self.downloader.poller.poll.assert_called_once_with(0.5)
+        self.assertEqual(self.downloader.ready,
+                         [(7, pycurl.CSELECT_IN), (8, pycurl.CSELECT_OUT | pycurl.CSELECT_ERR)])
+
+    @mock.patch('time.time')
+    def test_perform(self, mock_time):
+        # Setup
+        mock_time.return_value = 100.0
+        self.downloader.ready = [(7, pycurl.CSELECT_IN)]
+        self.downloader.deadline = 99.0
+
+        # Test
+        self.downloader._perform(self.multi)
+
+        # Verify
+        self.assertEqual(self.multi.socket_action.call_args_list,
+                         [mock.call(7, pycurl.CSELECT_IN), mock.call(pycurl.SOCKET_TIMEOUT, 0)])
+        self.assertEqual(self.downloader.ready, [])
+        self.assertTrue(self.downloader.deadline is None)
+
+    @mock.patch('time.time')
+    def test_perform_not_due(self, mock_time):
+        # Setup
+        mock_time.return_value = 100.0
+        self.downloader.deadline = 101.0
+
+        # Test
+        self.downloader._perform(self.multi)
+
+        # Verify
+        self.assertEqual(self.multi.socket_action.call_count, 0)
@@ -13,6 +13,9 @@
 
 import unittest
 
+from pulp.plugins.config import PluginCallConfiguration
+
+from pulp_deb.common import constants
 from pulp_deb.plugins.importers.downloaders import factory
 from pulp_deb.plugins.importers.downloaders.exceptions import  UnsupportedURLType, InvalidURL
 from pulp_deb.plugins.importers.downloaders.local import LocalDownloader
@@ -46,3 +49,23 @@ class DownloadersFactoryTests(unittest.TestCase):
             self.fail()
         except UnsupportedURLType, e:
             self.assertEqual(e.url_type, 'jdob')
+
+    def test_driver_name(self):
+        # Setup
+        config = PluginCallConfiguration({constants.CONFIG_DOWNLOAD_DRIVER: 'event'}, {})
+
+        # Test
+        self.assertEqual(factory.driver_name('http', config), 'http-event')
+        self.assertEqual(factory.driver_name('http', PluginCallConfiguration({}, {})), 'http')
+        self.assertEqual(factory.driver_name('file', None), 'file')
+
+    def test_get_downloader_unsupported_driver(self):
+        # Setup
+        config = PluginCallConfiguration({constants.CONFIG_DOWNLOAD_DRIVER: 'event'}, {})
+
+        # Test
+        try:
+            factory.get_downloader('file://localhost', None, None, config, None)
+            self.fail()
+        except UnsupportedURLType, e:
+            self.assertEqual(e.url_type, 'file-event')
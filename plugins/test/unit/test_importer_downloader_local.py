@@ -13,7 +13,8 @@
 
 
 import base_downloader
-from pulp_deb.plugins.importers.downloaders.exceptions import FileNotFoundException
+from pulp_deb.plugins.importers.downloaders.exceptions import (CancelledException,
+                                                               FileNotFoundException)
 from pulp_deb.plugins.importers.downloaders.local import LocalDownloader
 
 
@@ -37,6 +38,19 @@ class LocalDownloaderTests(base_downloader.BaseDownloaderTests):
         self.assertEqual(3, self.mock_progress_report.query_finished_count)
         self.assertEqual(2, self.mock_progress_report.update_progress.call_count)
 
+    def test_download_resource_variant(self):
+        # Setup
+        indexes = self.dist.get_indexes()
+        url = indexes[1]['url']
+        indexes[1]['url'] = url + '.usual'
+        indexes[1]['variant_url'] = url
+
+        # Test
+        self.downloader.download_resources(indexes, self.mock_progress_report)
+
+        # Verify
+        self.assertEqual(indexes[1]['path'], url[len('file://'):])
+
     def test_download_resource_not_found(self):
         # Setup
         indexes = self.dist.get_indexes()
@@ -49,6 +63,34 @@ class LocalDownloaderTests(base_downloader.BaseDownloaderTests):
         except FileNotFoundException, e:
             self.assertEqual(e.location in [r['url'] for r in indexes], True)
 
+    def test_download_resource_not_found_no_raise(self):
+        # Setup
+        indexes = self.dist.get_indexes()
+        indexes[1]['url'] = indexes[1]['url'] + '_'
+
+        # Test
+        self.downloader.download_resources(indexes, self.mock_progress_report,
+                                           raise_on_error=False)
+
+        # Verify
+        self.assertTrue(isinstance(indexes[1]['error'], FileNotFoundException))
+        self.assertTrue('path' not in indexes[1])
+        self._ensure_path_exists([indexes[0], indexes[2]])
+        self.assertEqual(2, self.mock_progress_report.query_finished_count)
+
+    def test_download_resource_cancelled(self):
+        # Setup
+        indexes = self.dist.get_indexes()
+        self.mock_cancelled_callback.side_effect = [False, True]
+
+        # Test
+        self.assertRaises(CancelledException, self.downloader.download_resources,
+                          indexes, self.mock_progress_report)
+
+        # Verify
+        self.assertTrue('path' in indexes[0])
+        self.assertTrue('path' not in indexes[1])
+
     def test_download_in_memory_as_list(self):
         resources = self.dist.get_indexes()
 
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import unittest
+
+from pulp_deb.plugins.importers.downloaders import mirrors
+
+
+URL = 'http://ubuntu.uib.no/archive'
+MIRROR_URL = 'http://ftp.no.debian.org/debian/'
+
+
+class MirrorSetTests(unittest.TestCase):
+
+    def setUp(self):
+        self.mirrors = mirrors.MirrorSet([URL, MIRROR_URL, URL + '/'])
+        self.primary, self.mirror = self.mirrors.mirrors
+
+    def test_init(self):
+        self.assertEqual(len(self.mirrors), 2)
+        self.assertEqual(self.mirror.url, MIRROR_URL.rstrip('/'))
+        self.assertEqual(self.mirror.host, 'ftp.no.debian.org')
+
+    def test_mirror_url(self):
+        url = URL + '/pool/main/a/abc/abc_1.0_amd64.deb'
+
+        self.assertEqual(self.mirrors.mirror_url(url, self.primary), url)
+        self.assertEqual(self.mirrors.mirror_url(url, self.mirror),
+                         MIRROR_URL + 'pool/main/a/abc/abc_1.0_amd64.deb')
+        self.assertEqual(self.mirrors.mirror_url('http://other/a.deb', self.mirror),
+                         'http://other/a.deb')
+
+    def test_select_fastest(self):
+        # Setup
+        self.mirrors.probed_mirror(self.primary, 0.2, 100 * 1024)
+        self.mirrors.probed_mirror(self.mirror, 0.1, 1024 * 1024)
+
+        # Test
+        self.assertTrue(self.mirrors.select(1024 * 1024) is self.mirror)
+
+    def test_select_spreads(self):
+        # Setup - same speed, the slower latency only matters for small files
+        self.mirrors.probed_mirror(self.primary, 0.05, 1024 * 1024)
+        self.mirrors.probed_mirror(self.mirror, 0.2, 1024 * 1024)
+
+        # Test
+        selected = []
+        for i in range(4):
+            mirror = self.mirrors.select(1024 * 1024)
+            self.mirrors.started(mirror)
+            selected.append(mirror)
+
+        # Verify
+        self.assertEqual(selected, [self.primary, self.mirror, self.primary, self.mirror])
+        self.assertEqual(self.mirrors.select(1024), self.primary)
+
+    def test_select_exclude(self):
+        self.assertTrue(self.mirrors.select(exclude=[self.primary]) is self.mirror)
+        self.assertTrue(self.mirrors.select(exclude=[self.primary, self.mirror]) is None)
+        self.assertFalse(self.mirrors.has_untried([self.primary, self.mirror]))
+
+    def test_select_full(self):
+        # Test
+        selected = self.mirrors.select(is_full=lambda m: m is self.primary)
+
+        # Verify
+        self.assertTrue(selected is self.mirror)
+        self.assertTrue(self.mirrors.select(is_full=lambda m: True) is None)
+
+    def test_select_unhealthy(self):
+        # Setup
+        self.mirrors.probed_mirror(self.primary)
+
+        # Test - a full healthy mirror is waited for rather than using the
+        # unhealthy one
+        self.assertTrue(self.mirrors.select() is self.mirror)
+        self.assertTrue(self.mirrors.select(is_full=lambda m: m is self.mirror) is None)
+        self.assertTrue(self.mirrors.select(exclude=[self.mirror]) is self.primary)
+
+    def test_failed(self):
+        # Test
+        for i in range(mirrors.MAX_FAILURES):
+            self.assertTrue(self.mirror.healthy)
+            self.mirrors.started(self.mirror)
+            self.mirrors.failed(self.mirror)
+
+        # Verify
+        self.assertFalse(self.mirror.healthy)
+        self.assertEqual(self.mirror.active, 0)
+
+        self.mirrors.started(self.mirror)
+        self.mirrors.succeeded(self.mirror, 1024, 0.1, 1024)
+        self.assertTrue(self.mirror.healthy)
+
+    def test_succeeded(self):
+        # Setup
+        self.mirrors.probed_mirror(self.mirror, 0.1, 1000)
+
+        # Test - small transfers only update the latency
+        self.mirrors.started(self.mirror)
+        self.mirrors.succeeded(self.mirror, 1024, 0.2, 50)
+        self.mirrors.started(self.mirror)
+        self.mirrors.succeeded(self.mirror, 1024 * 1024, 0.1, 2000)
+
+        # Verify
+        stats = self.mirrors.statistics()[self.mirror.url]
+        self.assertEqual(stats['files'], 2)
+        self.assertEqual(stats['bytes'], 1024 + 1024 * 1024)
+        self.assertAlmostEqual(stats['latency'], 0.1 * 0.7 * 0.7 + 0.2 * 0.3 * 0.7 + 0.1 * 0.3)
+        self.assertAlmostEqual(stats['speed'], 1000 * 0.7 + 2000 * 0.3)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from pulp_deb.plugins.importers.downloaders import pdiff
+
+
+URL = 'http://ubuntu.uib.no/archive/dists/precise/main/binary-amd64/Packages.gz'
+
+
+def sha1(content):
+    return hashlib.sha1(content).hexdigest()
+
+
+def diff_index(current, history, patches, merged=False):
+    """
+    Builds the lines of a diff index from (content, name) pairs.
+    """
+    lines = ['SHA1-Current: %s %s\n' % (sha1(current), len(current)), 'SHA1-History:\n']
+    lines.extend([' %s %s %s\n' % (sha1(c), len(c), n) for c, n in history])
+    lines.append('SHA1-Patches:\n')
+    lines.extend([' %s %s %s\n' % (sha1(c), len(c), n) for c, n in patches])
+    if merged:
+        lines.append('X-Patch-Precedence: merged\n')
+    return lines
+
+
+class UrlTests(unittest.TestCase):
+    def test_diff_index_url(self):
+        self.assertEqual(pdiff.diff_index_url(URL), URL[:-3] + '.diff/Index')
+
+    def test_patch_url(self):
+        self.assertEqual(pdiff.patch_url(URL, '2013-01-20-2015.12'),
+                         URL[:-3] + '.diff/2013-01-20-2015.12.gz')
+
+
+class EdTests(unittest.TestCase):
+    def test_apply_ed(self):
+        # Setup
+        lines = ['a\n', 'b\n', 'c\n', 'd\n', 'e\n']
+        script = ['5a\n', 'f\n', '.\n', '3,4c\n', 'C\n', '.\n', '1d\n']
+
+        # Test
+        result = pdiff.apply_ed(lines, pdiff.parse_ed(script))
+
+        # Verify
+        self.assertEqual(result, ['b\n', 'C\n', 'e\n', 'f\n'])
+
+    def test_apply_ed_prepend(self):
+        result = pdiff.apply_ed(['a\n'], pdiff.parse_ed(['0a\n', 'z\n', '.\n']))
+        self.assertEqual(result, ['z\n', 'a\n'])
+
+    def test_parse_ed_unsupported(self):
+        self.assertRaises(pdiff.PatchError, pdiff.parse_ed, ['1,$s/a/b/\n'])
+
+    def test_parse_ed_unterminated(self):
+        self.assertRaises(pdiff.PatchError, pdiff.parse_ed, ['1c\n', 'a\n'])
+
+    def test_apply_ed_out_of_range(self):
+        self.assertRaises(pdiff.PatchError, pdiff.apply_ed, ['a\n'],
+                          pdiff.parse_ed(['3d\n']))
+
+
+class DiffIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.versions = ['a\n', 'a\nb\n', 'a\nb\nc\n']
+        self.patches = [('2a\nb\n.\n', 'p1'), ('3a\nc\n.\n', 'p2')]
+
+    def test_patches_from(self):
+        # Setup
+        index = pdiff.DiffIndex(diff_index(self.versions[2],
+                                           [(self.versions[0], 'p1'), (self.versions[1], 'p2')],
+                                           self.patches))
+
+        # Test & Verify
+        self.assertEqual(index.algorithm, 'sha1')
+        self.assertEqual(index.patches_from(sha1(self.versions[0]), 2), ['p1', 'p2'])
+        self.assertEqual(index.patches_from(sha1(self.versions[1]), 4), ['p2'])
+        self.assertEqual(index.patches_from(sha1(self.versions[2]), 6), [])
+        self.assertRaises(pdiff.PatchError, index.patches_from, sha1('x'), 1)
+
+    def test_patches_from_merged(self):
+        # Setup
+        index = pdiff.DiffIndex(diff_index(self.versions[2],
+                                           [(self.versions[0], 'p1'), (self.versions[1], 'p2')],
+                                           self.patches, merged=True))
+
+        # Test & Verify
+        self.assertEqual(index.patches_from(sha1(self.versions[0]), 2), ['p1'])
+
+    def test_patches_from_missing_patch(self):
+        # Setup
+        index = pdiff.DiffIndex(diff_index(self.versions[2], [(self.versions[1], 'p2')], []))
+
+        # Test & Verify
+        self.assertRaises(pdiff.PatchError, index.patches_from, sha1(self.versions[1]), 4)
+
+    def test_no_current(self):
+        self.assertRaises(pdiff.PatchError, pdiff.DiffIndex, ['SHA1-History:\n'])
+
+    def test_verify(self):
+        # Setup
+        index = pdiff.DiffIndex(diff_index(self.versions[1], [(self.versions[0], 'p1')],
+                                           self.patches[:1]))
+
+        # Test & Verify
+        index.verify_patch('p1', self.patches[0][0])
+        self.assertRaises(pdiff.PatchError, index.verify_patch, 'p1', 'garbage')
+        index.verify_result(['a\n', 'b\n'])
+        self.assertRaises(pdiff.PatchError, index.verify_result, ['a\n'])
+
+
+class CompressionTests(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp(prefix='pdiff-tests')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_file_digest(self):
+        # Setup
+        filename = os.path.join(self.working_dir, 'Packages.gz')
+        f = gzip.open(filename, 'wb')
+        f.write('a\nb\n')
+        f.close()
+
+        # Test & Verify
+        self.assertEqual(pdiff.file_digest(filename, 'sha1'), (sha1('a\nb\n'), 4))
+
+    def test_decompress_patch_corrupt(self):
+        self.assertRaises(pdiff.PatchError, pdiff.decompress_patch, 'garbage')
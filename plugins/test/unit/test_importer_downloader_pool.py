@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import unittest
+
+import mock
+import pycurl
+
+from pulp_deb.plugins.importers.downloaders.pool import ConnectionPool
+
+
+class ConnectionPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.create_call = mock.MagicMock(side_effect=lambda: mock.MagicMock())
+        self.configure_call = mock.MagicMock()
+
+        share_patcher = mock.patch('pycurl.CurlShare')
+        self.mock_share_constructor = share_patcher.start()
+        self.addCleanup(share_patcher.stop)
+
+        self.pool = ConnectionPool(self.create_call, self.configure_call)
+
+    def test_shared_caches(self):
+        share = self.mock_share_constructor.return_value
+        share.setopt.assert_any_call(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+        share.setopt.assert_any_call(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+
+        curl = self.pool.acquire('localhost')
+        curl.setopt.assert_called_once_with(pycurl.SHARE, share)
+
+    def test_acquire_reuses_per_host(self):
+        # Setup
+        curl = self.pool.acquire('localhost')
+        curl.getinfo.return_value = 1
+        self.pool.release('localhost', curl)
+
+        # Test
+        other = self.pool.acquire('otherhost')
+        reused = self.pool.acquire('localhost')
+
+        # Verify
+        self.assertTrue(reused is curl)
+        self.assertTrue(other is not curl)
+        self.assertEqual(2, self.create_call.call_count)
+        self.assertEqual(1, curl.reset.call_count)
+        self.configure_call.assert_called_once_with(curl)
+
+    def test_release_statistics(self):
+        # Test
+        for num_connects in (1, 0, 0, 2):
+            curl = self.pool.acquire('localhost')
+            curl.getinfo.return_value = num_connects
+            self.pool.release('localhost', curl)
+
+        # Verify
+        curl.getinfo.assert_called_with(pycurl.NUM_CONNECTS)
+        self.assertEqual(self.pool.statistics(), {'opened': 3, 'reused': 2})
+
+    def test_close(self):
+        # Setup
+        curls = [self.pool.acquire('localhost'), self.pool.acquire('otherhost')]
+        for curl in curls:
+            curl.getinfo.return_value = 0
+            self.pool.release('localhost', curl)
+
+        # Test
+        self.pool.close()
+
+        # Verify
+        for curl in curls:
+            self.assertEqual(1, curl.close.call_count)
+        self.assertEqual(1, self.mock_share_constructor.return_value.close.call_count)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import unittest
+
+from pulp_deb.plugins.importers.downloaders import exceptions, retry
+
+
+URL = 'http://ubuntu.uib.no/archive/pool/main/a/abc/abc_1.0_amd64.deb'
+
+CONNECT_ERROR = exceptions.ConnectionException(URL, 'Connection refused')
+TRANSFER_ERROR = exceptions.TransferException(URL, 'transfer closed')
+SERVER_ERROR = exceptions.ServerErrorException(URL, 503)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FailureKindTests(unittest.TestCase):
+
+    def test_failure_kind(self):
+        self.assertEqual(retry.failure_kind(CONNECT_ERROR), retry.FAILURE_CONNECT)
+        self.assertEqual(retry.failure_kind(TRANSFER_ERROR), retry.FAILURE_TRANSFER)
+        self.assertEqual(retry.failure_kind(SERVER_ERROR), retry.FAILURE_SERVER)
+
+    def test_permanent(self):
+        for error in (exceptions.FileNotFoundException(URL),
+                      exceptions.VerificationException(URL, 'size', 1, 2),
+                      IOError('disk full')):
+            self.assertTrue(retry.failure_kind(error) is None)
+            self.assertFalse(retry.is_transient(error))
+
+
+class RetryPolicyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = retry.RetryPolicy(3, 2, max_delay=10, random=lambda: 0.5)
+
+    def test_should_retry(self):
+        self.assertTrue(self.policy.should_retry(SERVER_ERROR, 0))
+        self.assertTrue(self.policy.should_retry(CONNECT_ERROR, 2))
+        self.assertFalse(self.policy.should_retry(CONNECT_ERROR, 3))
+        self.assertFalse(self.policy.should_retry(exceptions.FileNotFoundException(URL), 0))
+
+    def test_delay(self):
+        # Half of the bound, which doubles per retry up to the maximum
+        self.assertEqual([self.policy.delay(CONNECT_ERROR, r) for r in range(4)],
+                         [1.0, 2.0, 4.0, 5.0])
+
+    def test_delay_transfer(self):
+        # Interrupted transfers resume right away the first time
+        self.assertEqual([self.policy.delay(TRANSFER_ERROR, r) for r in range(3)],
+                         [0.0, 1.0, 2.0])
+
+    def test_delay_retry_after(self):
+        error = exceptions.ServerErrorException(URL, 503, retry_after=7)
+        self.assertEqual(self.policy.delay(error, 0), 7)
+
+        error.retry_after = 3600
+        self.assertEqual(self.policy.delay(error, 0), 10)
+
+
+class CircuitBreakerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = retry.CircuitBreaker(threshold=2, pause=30, max_pause=45,
+                                            clock=self.clock)
+
+    def test_trip(self):
+        # Test
+        self.breaker.record('a', SERVER_ERROR)
+        self.assertTrue(self.breaker.allows('a'))
+        self.breaker.record('a', CONNECT_ERROR)
+
+        # Verify
+        self.assertFalse(self.breaker.allows('a'))
+        self.assertTrue(self.breaker.allows('b'))
+        self.assertEqual(self.breaker.delay('a'), 30)
+        self.assertEqual(self.breaker.statistics(), {'trips': 1, 'failing_hosts': ['a']})
+
+        # Transfers that were running when it tripped do not extend the pause
+        self.clock.now += 10
+        self.breaker.record('a', SERVER_ERROR)
+        self.assertEqual(self.breaker.delay('a'), 20)
+
+    def test_trip_again(self):
+        # Setup
+        self.breaker.record('a', SERVER_ERROR)
+        self.breaker.record('a', SERVER_ERROR)
+
+        # Test - the first failure after the pause trips it for longer
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allows('a'))
+        self.breaker.record('a', SERVER_ERROR)
+
+        # Verify
+        self.assertEqual(self.breaker.delay('a'), 45)
+
+    def test_success(self):
+        # Setup
+        self.breaker.record('a', SERVER_ERROR)
+
+        # Test
+        self.breaker.record('a', None)
+        self.breaker.record('a', SERVER_ERROR)
+
+        # Verify
+        self.assertTrue(self.breaker.allows('a'))
+
+    def test_other_failures(self):
+        # Interrupted transfers and missing files say nothing about the host
+        for i in range(3):
+            self.breaker.record('a', TRANSFER_ERROR)
+            self.breaker.record('a', exceptions.FileNotFoundException(URL))
+
+        self.assertTrue(self.breaker.allows('a'))
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import unittest
+
+from pulp_deb.plugins.importers.downloaders import throttle
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_consume(self):
+        # Setup
+        bucket = throttle.TokenBucket(100, clock=self.clock)
+
+        # Test - the initial burst may exceed the tokens available
+        self.assertTrue(bucket.available())
+        bucket.consume(150)
+
+        # Verify
+        self.assertTrue(not bucket.available())
+        self.assertAlmostEqual(bucket.delay(), 0.51)
+
+        self.clock.now += 0.6
+        self.assertTrue(bucket.available())
+        self.assertEqual(bucket.delay(), 0.0)
+
+    def test_capacity(self):
+        # Setup
+        bucket = throttle.TokenBucket(100, capacity=50, clock=self.clock)
+
+        # Test - idle time does not build up more than the capacity
+        self.clock.now += 60
+        bucket.consume(50)
+
+        # Verify
+        self.assertTrue(not bucket.available())
+
+    def test_set_rate(self):
+        # Setup
+        bucket = throttle.TokenBucket(100, clock=self.clock)
+        bucket.consume(200)
+
+        # Test
+        bucket.set_rate(1000)
+
+        # Verify
+        self.assertAlmostEqual(bucket.delay(), 0.101)
+
+
+class BandwidthLimiterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        throttle.WORKER_BANDWIDTH.limiters = []
+
+    def test_repo_limit(self):
+        # Test
+        limiter = throttle.BandwidthLimiter(max_speed=100, clock=self.clock)
+
+        # Verify
+        self.assertEqual(limiter.rate, 100)
+        self.assertEqual(throttle.WORKER_BANDWIDTH.limiters, [])
+
+    def test_worker_limit_split(self):
+        # Test
+        first = throttle.BandwidthLimiter(worker_max_speed=1000, clock=self.clock)
+        self.assertEqual(first.rate, 1000)
+
+        second = throttle.BandwidthLimiter(worker_max_speed=1000, clock=self.clock)
+        third = throttle.BandwidthLimiter(max_speed=100, worker_max_speed=1000, clock=self.clock)
+
+        # Verify
+        self.assertAlmostEqual(first.rate, 1000 / 3.0)
+        self.assertAlmostEqual(second.rate, 1000 / 3.0)
+        self.assertEqual(third.rate, 100)
+
+        # Test - the share is given back
+        third.close()
+        second.close()
+
+        # Verify
+        self.assertEqual(first.rate, 1000)
+        self.assertEqual(throttle.WORKER_BANDWIDTH.limiters, [first])
+
+    def test_worker_limit_lowest(self):
+        # Test
+        first = throttle.BandwidthLimiter(worker_max_speed=1000, clock=self.clock)
+        second = throttle.BandwidthLimiter(worker_max_speed=500, clock=self.clock)
+
+        # Verify
+        self.assertEqual(first.rate, 250)
+        self.assertEqual(second.rate, 250)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+from pulp.common.compat import json
+
+from pulp_deb.plugins.importers.downloaders import timing
+
+
+HOST = 'ubuntu.uib.no'
+
+
+def values(total_time, size=1000):
+    return {'namelookup_time': 0.01, 'connect_time': 0.02, 'appconnect_time': 0.0,
+            'starttransfer_time': 0.1, 'total_time': total_time,
+            'speed_download': size / total_time, 'size_download': float(size)}
+
+
+class TransferTimingsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.timings = timing.TransferTimings()
+
+    def test_statistics(self):
+        # Setup
+        for i in range(1, 101):
+            self.timings.record(HOST, values(float(i)))
+        self.timings.record('ftp.no.debian.org', values(2.0, size=10))
+
+        # Test
+        stats = self.timings.statistics()
+
+        # Verify
+        self.assertEqual(sorted(stats.keys()), ['ftp.no.debian.org', HOST])
+        self.assertEqual(stats[HOST]['transfers'], 100)
+        self.assertEqual(stats[HOST]['bytes'], 100000)
+        self.assertEqual(stats[HOST]['total_time'],
+                         {'p50': 50.0, 'p90': 90.0, 'p99': 99.0, 'max': 100.0})
+        self.assertEqual(stats[HOST]['connect_time']['p99'], 0.02)
+        self.assertTrue('size_download' not in stats[HOST])
+        self.assertEqual(stats['ftp.no.debian.org']['total_time']['p50'], 2.0)
+
+    def test_dump(self):
+        # Setup
+        working_dir = tempfile.mkdtemp(prefix='timing-tests')
+        self.addCleanup(shutil.rmtree, working_dir)
+        filename = os.path.join(working_dir, timing.DUMP_FILENAME)
+        self.timings.record(HOST, values(1.0))
+
+        # Test
+        self.timings.dump(filename)
+
+        # Verify
+        dumped = json.load(open(filename))
+        self.assertEqual(dumped['statistics'][HOST]['transfers'], 1)
+        self.assertEqual(dumped['transfers'][HOST]['total_time'], [1.0])
+
+    def test_curl_values(self):
+        # Setup
+        curl = mock.MagicMock()
+        curl.getinfo.side_effect = lambda info: dict(
+            [(i, float(n)) for n, (name, i) in enumerate(timing.CURL_INFO)])[info]
+
+        # Test
+        read = timing.curl_values(curl)
+
+        # Verify
+        self.assertEqual(read['namelookup_time'], 0.0)
+        self.assertEqual(read['size_download'], float(len(timing.CURL_INFO) - 1))
+
+    def test_percentile(self):
+        self.assertEqual(timing.percentile([1], 50), 1)
+        self.assertEqual(timing.percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(timing.percentile([1, 2, 3, 4], 90), 4)
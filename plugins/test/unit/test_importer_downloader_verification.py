@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import unittest
+
+from pulp_deb.plugins.importers.downloaders import exceptions, verification
+
+
+URL = 'http://localhost/pool/a.deb'
+
+ABC = {
+    'size': 3,
+    'md5sum': '900150983cd24fb0d6963f7d28e17f72',
+    'sha1': 'a9993e364706816aba3e25717850c26c9cd0d89d',
+    'sha256': 'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad',
+}
+
+
+class StreamVerifierTests(unittest.TestCase):
+
+    def test_verify(self):
+        # Test
+        verifier = verification.StreamVerifier(URL, ABC)
+        for buffer in ['a', 'bc']:
+            self.assertTrue(verifier.update(buffer))
+
+        # Verify
+        self.assertEqual(verifier.verify(), ABC)
+
+    def test_verify_only_expected(self):
+        # Test
+        verifier = verification.StreamVerifier(URL, {'sha1': ABC['sha1']})
+        verifier.update('abc')
+
+        # Verify
+        self.assertEqual(verifier.hashes.keys(), ['sha1'])
+        self.assertEqual(verifier.verify(), {'size': 3, 'sha1': ABC['sha1']})
+
+    def test_verify_mismatch(self):
+        # Setup
+        verifier = verification.StreamVerifier(URL, ABC)
+        verifier.update('abd')
+
+        # Test
+        try:
+            verifier.verify()
+            self.fail()
+        except exceptions.VerificationException, e:
+            self.assertEqual(e.location, URL)
+            self.assertTrue(e.field in ('md5sum', 'sha1', 'sha256'))
+            self.assertEqual(e.expected, ABC[e.field])
+
+    def test_verify_size(self):
+        # Setup
+        verifier = verification.StreamVerifier(URL, ABC)
+        verifier.update('ab')
+
+        # Test
+        try:
+            verifier.verify()
+            self.fail()
+        except exceptions.VerificationException, e:
+            self.assertEqual(e.field, 'size')
+            self.assertEqual(e.actual, 2)
+
+    def test_exceeded(self):
+        # Test
+        verifier = verification.StreamVerifier(URL, ABC)
+
+        # Verify
+        self.assertTrue(verifier.update('abc'))
+        self.assertTrue(not verifier.update('d'))
+        self.assertTrue(verifier.exceeded())
+
+    def test_reset(self):
+        # Setup
+        verifier = verification.StreamVerifier(URL, ABC)
+        verifier.update('xyz')
+
+        # Test
+        verifier.reset()
+        verifier.update('abc')
+
+        # Verify
+        self.assertEqual(verifier.verify(), ABC)
+
+
+class ExpectedValuesTests(unittest.TestCase):
+
+    def test_expected_values(self):
+        # Setup
+        resource = {'url': URL, 'size': '3', 'md5sum': ABC['md5sum'].upper(), 'sha1': None}
+
+        # Test
+        expected = verification.expected_values(resource)
+
+        # Verify
+        self.assertEqual(expected, {'size': 3, 'md5sum': ABC['md5sum']})
+
+    def test_expected_values_none(self):
+        self.assertEqual(verification.expected_values({'url': URL}), {})
@@ -11,22 +11,82 @@
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 
+import bz2
+import gzip
+import hashlib
 import os
 import pycurl
 import shutil
 import tempfile
 import unittest
+import urlparse
 
 import mock
 
+from pulp.plugins.config import PluginCallConfiguration
+
 import base_downloader
-from pulp_deb.common import samples
-from pulp_deb.plugins.importers.downloaders import exceptions
+from pulp_deb.common import constants, model, samples
+from pulp_deb.plugins.importers.downloaders import cache, exceptions, pdiff, verification
 from pulp_deb.plugins.importers.downloaders import web
 from pulp_deb.plugins.importers.downloaders.web import HttpDownloader
 
 
 URL = 'http://ubuntu.uib.no/archive'
+MIRROR_URL = 'http://ftp.no.debian.org/debian'
+
+ABC_MD5 = '900150983cd24fb0d6963f7d28e17f72'
+
+
+class FakeCurlMulti(object):
+    """
+    Stand-in for pycurl.CurlMulti that completes the oldest added handle on
+    each call to perform and keeps track of how many handles were active at
+    the same time. If error is set, the handles are reported as failed with
+    that (errno, message) pair.
+    """
+    def __init__(self):
+        self.handles = []
+        self.done = []
+        self.max_active = 0
+        self.closed = False
+        self.error = None
+
+    def add_handle(self, curl):
+        self.handles.append(curl)
+        self.max_active = max(self.max_active, len(self.handles))
+
+    def remove_handle(self, curl):
+        self.handles.remove(curl)
+
+    def perform(self):
+        if self.handles and not self.done:
+            self.done.append(self.handles[0])
+        return 0, len(self.handles)
+
+    def info_read(self):
+        done, self.done = self.done, []
+        if self.error is not None:
+            return 0, [], [(curl,) + self.error for curl in done]
+        return 0, done, []
+
+    def select(self, timeout):
+        return 0
+
+    def close(self):
+        self.closed = True
+
+
+def mock_curl_factory(status):
+    """
+    Returns a side effect for a mocked pycurl.Curl constructor creating a new
+    handle per transfer, each reporting the given HTTP status.
+    """
+    def create():
+        mock_curl = mock.MagicMock()
+        mock_curl.getinfo.return_value = status
+        return mock_curl
+    return create
 
 
 class HttpDownloaderTests(base_downloader.BaseDownloaderTests):
@@ -35,14 +95,20 @@ class HttpDownloaderTests(base_downloader.BaseDownloaderTests):
         self.dist = samples.get_repo(url=URL)
         self.downloader = HttpDownloader(self.repo, None, self.config, self.mock_cancelled_callback)
 
+        # Retry right away
+        self.downloader.retry_policy.random = lambda: 0.0
+
+        self.multi = FakeCurlMulti()
+        multi_patcher = mock.patch('pycurl.CurlMulti', return_value=self.multi)
+        multi_patcher.start()
+        self.addCleanup(multi_patcher.stop)
+
     @mock.patch('pycurl.Curl')
     def test_download_resources(self, mock_curl_constructor):
         # Setup
         indexes = self.dist.get_indexes()
 
-        mock_curl = mock.MagicMock()
-        mock_curl.getinfo.return_value = 200 # simulate a successful download
-        mock_curl_constructor.return_value = mock_curl
+        mock_curl_constructor.side_effect = mock_curl_factory(200) # simulate a successful download
 
         # Test
         resources = self.downloader.download_resources(indexes, self.mock_progress_report)
@@ -57,15 +123,37 @@ class HttpDownloaderTests(base_downloader.BaseDownloaderTests):
         self.assertEqual(self.mock_progress_report.query_total_count, 3)
         self.assertEqual(self.mock_progress_report.update_progress.call_count, 4)
 
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_in_memory(self, mock_curl_constructor):
+        # Setup
+        resource = {'url': URL + '/dists/stable/main/binary-amd64/Packages', 'type': 'packages'}
+
+        mock_curl = mock.MagicMock()
+        mock_curl.getinfo.return_value = 200
+
+        def perform(option, value):
+            if option == pycurl.WRITEFUNCTION:
+                for chunk in ['Package: a\nVersion: 1\n', '\nPackage: b\nVer', 'sion: 2\n']:
+                    value(chunk)
+        mock_curl.setopt.side_effect = perform
+        mock_curl_constructor.return_value = mock_curl
+
+        # Test
+        self.downloader.download_resources([resource], self.mock_progress_report,
+                                           in_memory=True)
+
+        # Verify
+        paragraphs = list(model._iter_paragraphs_path(resource))
+        self.assertEqual([p['Package'] for p in paragraphs], ['a', 'b'])
+        self.assertEqual([p['Version'] for p in paragraphs], ['1', '2'])
+
     @mock.patch('pycurl.Curl')
     def test_download_resources_404(self, mock_curl_constructor):
         # Setup
         indexes = self.dist.get_indexes()
         indexes[0]['url'] = indexes[0]['url'] + '_'
 
-        mock_curl = mock.MagicMock()
-        mock_curl.getinfo.return_value = 404 # simulate an error
-        mock_curl_constructor.return_value = mock_curl
+        mock_curl_constructor.side_effect = mock_curl_factory(404) # simulate an error
 
         # Test & Verify
         try:
@@ -75,31 +163,63 @@ class HttpDownloaderTests(base_downloader.BaseDownloaderTests):
             self.assertEqual(indexes[0]['url'], e.location)
             self.assertEqual('path' in indexes[0], False)
 
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_404_verified(self, mock_curl_constructor):
+        # Setup - the Release file lists the index, the server sends an
+        # error page along with the 404
+        index = self.dist.get_indexes()[0]
+        index.update({'size': 4, 'sha256': hashlib.sha256('full').hexdigest()})
+
+        def create():
+            mock_curl = mock.MagicMock()
+            callbacks = {}
+
+            def setopt(option, value):
+                callbacks[option] = value
+                if option == pycurl.HEADERFUNCTION:
+                    for line in ['HTTP/1.1 404 Not Found\r\n', '\r\n']:
+                        value(line)
+                    callbacks[pycurl.WRITEFUNCTION]('<html>Not Found</html>')
+            mock_curl.setopt.side_effect = setopt
+            mock_curl.getinfo.return_value = 404
+            return mock_curl
+        mock_curl_constructor.side_effect = create
+
+        # Test
+        self.downloader.download_resources([index], self.mock_progress_report,
+                                           raise_on_error=False)
+
+        # Verify - reported as missing, not as failing its verification
+        self.assertTrue(isinstance(index['error'], exceptions.FileNotFoundException))
+        self.assertTrue('path' not in index)
+
     @mock.patch('pycurl.Curl')
     def test_download_packages(self, mock_curl_constructor):
         self.dist.add_package(self.dist.components[0]['name'], self.pkg)
 
         # Setup
-        mock_curl = mock.MagicMock()
-        mock_curl.getinfo.return_value = 200 # simulate a successful download
-        mock_curl_constructor.return_value = mock_curl
+        mock_curl_constructor.side_effect = mock_curl_factory(200) # simulate a successful download
 
         pkg_resources = self.dist.get_package_resources()
+        for resource in pkg_resources:
+            # The mocked transfer writes no data to verify
+            for key in ('size', 'md5sum', 'sha1', 'sha256'):
+                resource.pop(key, None)
 
         # Test
         self.downloader.download_resources(pkg_resources, self.mock_progress_report)
 
         # Verify
         self._ensure_path_exists(pkg_resources)
+        for resource in pkg_resources:
+            self.assertTrue(resource['temporary'])
 
     @mock.patch('pycurl.Curl')
     def test_download_packages_404(self, mock_curl_constructor):
         self.dist.add_package(self.dist.components[0]['name'], self.pkg)
 
         # Setup
-        mock_curl = mock.MagicMock()
-        mock_curl.getinfo.return_value = 404 # simulate a not found
-        mock_curl_constructor.return_value = mock_curl
+        mock_curl_constructor.side_effect = mock_curl_factory(404) # simulate a not found
 
         pkg_resources = self.dist.get_package_resources()
         pkg_resources[0]['url'] = pkg_resources[0]['url'] + '_'
@@ -112,6 +232,924 @@ class HttpDownloaderTests(base_downloader.BaseDownloaderTests):
             self.assertTrue(pkg_resources[0]['url'] in e.location)
             self.assertTrue('destination' not in pkg_resources[0])
 
+    @mock.patch('pycurl.Curl')
+    def test_download_packages_verified(self, mock_curl_constructor):
+        # Setup
+        resource = {'url': URL + '/pool/main/a/abc/abc_1.0_amd64.deb', 'size': '3',
+                    'md5sum': ABC_MD5}
+
+        mock_curl = mock.MagicMock()
+        mock_curl.getinfo.return_value = 200
+
+        def perform(option, value):
+            if option == pycurl.WRITEFUNCTION:
+                value('abc')
+        mock_curl.setopt.side_effect = perform
+        mock_curl_constructor.return_value = mock_curl
+
+        # Test
+        self.downloader.download_resources([resource], self.mock_progress_report)
+
+        # Verify
+        self.assertEqual(resource['verified'],
+                         {'size': 3, 'md5sum': ABC_MD5})
+        self.assertEqual(open(resource['path']).read(), 'abc')
+
+    @mock.patch('pycurl.Curl')
+    def test_download_packages_checksum_mismatch(self, mock_curl_constructor):
+        # Setup
+        resource = {'url': URL + '/pool/main/a/abc/abc_1.0_amd64.deb', 'size': '3',
+                    'md5sum': ABC_MD5}
+
+        mock_curl = mock.MagicMock()
+        mock_curl.getinfo.return_value = 200
+
+        def perform(option, value):
+            if option == pycurl.WRITEFUNCTION:
+                value('abd')
+        mock_curl.setopt.side_effect = perform
+        mock_curl_constructor.return_value = mock_curl
+
+        # Test
+        self.downloader.download_resources([resource], self.mock_progress_report,
+                                           raise_on_error=False)
+
+        # Verify
+        self.assertTrue(isinstance(resource['error'], exceptions.VerificationException))
+        self.assertEqual(resource['error'].field, 'md5sum')
+        self.assertTrue('path' not in resource)
+        self.assertTrue('verified' not in resource)
+
+        tmp_dir = os.path.join(self.working_dir, web.DOWNLOAD_TMP_DIR)
+        self.assertEqual(os.listdir(tmp_dir), [])
+
+    @mock.patch('pycurl.Curl')
+    def test_download_packages_size_exceeded(self, mock_curl_constructor):
+        # Setup
+        resource = {'url': URL + '/pool/main/a/abc/abc_1.0_amd64.deb', 'size': '2'}
+        written = []
+
+        mock_curl = mock.MagicMock()
+        mock_curl.getinfo.return_value = 200
+
+        def perform(option, value):
+            if option == pycurl.WRITEFUNCTION:
+                written.append(value('abc'))
+        mock_curl.setopt.side_effect = perform
+        mock_curl_constructor.return_value = mock_curl
+        self.multi.error = (pycurl.E_WRITE_ERROR, 'failed writing body')
+
+        # Test
+        self.downloader.download_resources([resource], self.mock_progress_report,
+                                           raise_on_error=False)
+
+        # Verify
+        self.assertEqual(written, [0])
+        self.assertTrue(isinstance(resource['error'], exceptions.VerificationException))
+        self.assertEqual(resource['error'].field, 'size')
+
+    @mock.patch('pycurl.Curl')
+    def test_download_packages_keeps_partial(self, mock_curl_constructor):
+        # Setup
+        resource = {'url': URL + '/pool/main/a/abc/abc_1.0_amd64.deb'}
+
+        def create():
+            # Simulate the connection dropping in the middle of the body
+            mock_curl = mock.MagicMock()
+            mock_curl.getinfo.return_value = 200
+
+            def perform(option, value):
+                # The write callback is set first, the headers come first
+                if option == pycurl.WRITEFUNCTION:
+                    mock_curl.write = value
+                elif option == pycurl.HEADERFUNCTION:
+                    for line in ['HTTP/1.1 200 OK\r\n', 'ETag: "1234"\r\n', '\r\n']:
+                        value(line)
+                    mock_curl.write('partial')
+            mock_curl.setopt.side_effect = perform
+            return mock_curl
+        mock_curl_constructor.side_effect = create
+        self.multi.error = (pycurl.E_PARTIAL_FILE, 'transfer closed')
+        self.downloader.retry_policy.max_retries = 0
+
+        # Test
+        self.downloader.download_resources([resource], self.mock_progress_report,
+                                           raise_on_error=False)
+
+        # Verify
+        self.assertTrue(isinstance(resource['error'], exceptions.TransferException))
+        tmp_dir = os.path.join(self.working_dir, web.DOWNLOAD_TMP_DIR)
+        filename = os.path.join(tmp_dir, 'archive_pool_main_a_abc_abc_1.0_amd64.deb')
+        self.assertEqual(open(filename).read(), 'partial')
+        self.assertTrue(os.path.exists(filename + web.PARTIAL_SUFFIX))
+
+    @mock.patch('pycurl.Curl')
+    def test_download_packages_resumes(self, mock_curl_constructor):
+        # Setup
+        resource = {'url': URL + '/pool/main/a/abc/abc_1.0_amd64.deb'}
+
+        tmp_dir = web._create_download_tmp_dir(self.working_dir)
+        filename = web._download_tmp_filename(tmp_dir, resource['url'])
+        partial = web.StoredDownloadedContent(filename, url=resource['url'])
+        partial.open()
+        partial.response_started(200, {'etag': '"1234"'})
+        partial.update('partial')
+        partial.close()
+
+        mock_curl = mock.MagicMock()
+        mock_curl.getinfo.return_value = 206
+
+        def perform(option, value):
+            if option == pycurl.WRITEFUNCTION:
+                mock_curl.write = value
+            elif option == pycurl.HEADERFUNCTION:
+                for line in ['HTTP/1.1 206 Partial Content\r\n', '\r\n']:
+                    value(line)
+                mock_curl.write(' and the rest')
+        mock_curl.setopt.side_effect = perform
+        mock_curl_constructor.return_value = mock_curl
+
+        # Test
+        self.downloader.download_resources([resource], self.mock_progress_report)
+
+        # Verify
+        opts_by_key = curl_opts_by_key(mock_curl.setopt.call_args_list)
+        self.assertEqual(opts_by_key[pycurl.RANGE], '7-')
+        self.assertEqual(opts_by_key[pycurl.HTTPHEADER], ['If-Range: "1234"'])
+
+        self.assertEqual(resource['path'], filename)
+        self.assertEqual(open(filename).read(), 'partial and the rest')
+        self.assertTrue(not os.path.exists(filename + web.PARTIAL_SUFFIX))
+
+    @mock.patch('pycurl.Curl')
+    def test_download_packages_already_complete(self, mock_curl_constructor):
+        # Setup
+        resource = {'url': URL + '/pool/main/a/abc/abc_1.0_amd64.deb'}
+
+        tmp_dir = web._create_download_tmp_dir(self.working_dir)
+        filename = web._download_tmp_filename(tmp_dir, resource['url'])
+        partial = web.StoredDownloadedContent(filename, url=resource['url'])
+        partial.open()
+        partial.response_started(200, {'etag': '"1234"'})
+        partial.update('complete')
+        partial.close()
+
+        mock_curl = mock.MagicMock()
+        mock_curl.getinfo.return_value = 416
+
+        def perform(option, value):
+            if option == pycurl.HEADERFUNCTION:
+                for line in ['HTTP/1.1 416 Range Not Satisfiable\r\n',
+                             'Content-Range: bytes */8\r\n', '\r\n']:
+                    value(line)
+        mock_curl.setopt.side_effect = perform
+        mock_curl_constructor.return_value = mock_curl
+
+        # Test
+        self.downloader.download_resources([resource], self.mock_progress_report)
+
+        # Verify
+        self.assertEqual(open(resource['path']).read(), 'complete')
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_caches_indexes(self, mock_curl_constructor):
+        # Setup
+        indexes = self.dist.get_indexes()
+
+        def create():
+            # Simulate the server sending validators
+            mock_curl = mock.MagicMock()
+            mock_curl.getinfo.return_value = 200
+
+            def perform_headers(option, value):
+                if option == pycurl.HEADERFUNCTION:
+                    value('HTTP/1.1 200 OK\r\n')
+                    value('ETag: "1234"\r\n')
+            mock_curl.setopt.side_effect = perform_headers
+            return mock_curl
+        mock_curl_constructor.side_effect = create
+
+        # Test
+        self.downloader.download_resources(indexes, self.mock_progress_report)
+
+        # Verify
+        metadata_cache = cache.MetadataCache(self.working_dir)
+        for index in indexes:
+            self.assertEqual(index['path'], metadata_cache.filename(index['url']))
+            self.assertEqual(metadata_cache.validators(index['url']), {'etag': '"1234"'})
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_not_modified(self, mock_curl_constructor):
+        # Setup
+        indexes = self.dist.get_indexes()
+
+        metadata_cache = cache.MetadataCache(self.working_dir)
+        downloaded = os.path.join(self.working_dir, 'cached')
+        for index in indexes:
+            open(downloaded, 'w').write('cached')
+            metadata_cache.store(index['url'], downloaded, {'etag': '"1234"'})
+
+        mock_curl = mock.MagicMock()
+        mock_curl.getinfo.return_value = 304
+        mock_curl_constructor.return_value = mock_curl
+
+        # Test
+        self.downloader.max_downloads = 1
+        self.downloader.download_resources(indexes, self.mock_progress_report)
+
+        # Verify
+        for index in indexes:
+            self.assertEqual(index['path'], metadata_cache.filename(index['url']))
+            self.assertEqual(open(index['path']).read(), 'cached')
+
+        opts = [c[0] for c in mock_curl.setopt.call_args_list]
+        self.assertTrue((pycurl.HTTPHEADER, ['If-None-Match: "1234"']) in opts)
+
+        tmp_dir = os.path.join(self.working_dir, web.DOWNLOAD_TMP_DIR)
+        self.assertEqual(os.listdir(tmp_dir), [])
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_not_modified_unconditional(self, mock_curl_constructor):
+        # Setup
+        indexes = self.dist.get_indexes()
+        mock_curl_constructor.side_effect = mock_curl_factory(304)
+
+        # Test & Verify
+        self.assertRaises(exceptions.FileRetrievalException,
+                          self.downloader.download_resources, indexes,
+                          self.mock_progress_report)
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_no_raise(self, mock_curl_constructor):
+        # Setup
+        indexes = self.dist.get_indexes()
+        indexes[0]['url'] = indexes[0]['url'] + '_'
+
+        def create():
+            # Handles are reused, so the status depends on the URL set last
+            mock_curl = mock.MagicMock()
+            mock_curl.getinfo.side_effect = lambda info: \
+                404 if curl_opts_by_key(mock_curl.setopt.call_args_list)[pycurl.URL].endswith('_') else 200
+            return mock_curl
+        mock_curl_constructor.side_effect = create
+
+        # Test
+        self.downloader.download_resources(indexes, self.mock_progress_report,
+                                           raise_on_error=False)
+
+        # Verify
+        self.assertTrue(isinstance(indexes[0]['error'], exceptions.FileNotFoundException))
+        self.assertTrue('path' not in indexes[0])
+        self._ensure_path_exists(indexes[1:])
+        self.assertEqual(self.mock_progress_report.query_finished_count, 2)
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_concurrency(self, mock_curl_constructor):
+        # Setup
+        resources = []
+        for i in range(10):
+            resources.append({'url': 'http://host-%s/pool/file-%s.deb' % (i % 2, i)})
+        mock_curl_constructor.side_effect = mock_curl_factory(200)
+
+        self.downloader.max_downloads = 3
+        self.downloader.max_downloads_per_host = 1
+
+        # Test
+        self.downloader.download_resources(resources, self.mock_progress_report)
+
+        # Verify
+        self._ensure_path_exists(resources)
+        self.assertEqual(self.multi.max_active, 2)
+        self.assertEqual(len(set([r['path'] for r in resources])), 10)
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_reuses_handles(self, mock_curl_constructor):
+        # Setup
+        mock_curl_constructor.side_effect = mock_curl_factory(200)
+        resources = [{'url': URL + '/pool/file-%s.deb' % i} for i in range(4)]
+
+        self.downloader.max_downloads_per_host = 2
+
+        # Test
+        self.downloader.download_resources(resources[:2], self.mock_progress_report)
+        self.downloader.download_resources(resources[2:], self.mock_progress_report)
+
+        # Verify
+        self._ensure_path_exists(resources)
+        self.assertEqual(2, mock_curl_constructor.call_count)
+        self.assertEqual(1, pycurl.CurlMulti.call_count)
+
+    @mock.patch('pycurl.Curl')
+    def test_statistics(self, mock_curl_constructor):
+        # Setup
+        connects = [1, 0, 0]
+
+        def getinfo(info):
+            if info == pycurl.HTTP_CODE:
+                return 200
+            if info == pycurl.NUM_CONNECTS:
+                return connects.pop(0)
+            return 0
+
+        def create():
+            mock_curl = mock.MagicMock()
+            mock_curl.getinfo.side_effect = getinfo
+            return mock_curl
+        mock_curl_constructor.side_effect = create
+
+        # Test
+        self.assertEqual({}, self.downloader.statistics())
+        for i in range(3):
+            self.downloader._download_file(URL + '/file-%s' % i, mock.MagicMock())
+
+        # Verify
+        stats = self.downloader.statistics()
+        self.assertEqual(stats['connections'], {'opened': 1, 'reused': 2})
+        self.assertEqual(1, mock_curl_constructor.call_count)
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_throttled(self, mock_curl_constructor):
+        # Setup
+        resource = {'url': URL + '/pool/main/a/abc/abc_1.0_amd64.deb'}
+        self.downloader.limiter = mock.MagicMock()
+        self.downloader.limiter.available.side_effect = [False, False, True, True]
+        self.downloader.limiter.delay.return_value = 0.25
+
+        mock_curl = mock.MagicMock()
+        mock_curl.getinfo.return_value = 200
+        returned = []
+
+        def perform(option, value):
+            if option == pycurl.WRITEFUNCTION:
+                mock_curl.write = value
+                returned.append(value('abc'))
+        mock_curl.setopt.side_effect = perform
+        mock_curl.pause.side_effect = lambda bitmask: returned.append(mock_curl.write('abc'))
+        mock_curl_constructor.return_value = mock_curl
+
+        # Keep the transfer running until it was resumed
+        perform_multi = self.multi.perform
+        self.multi.perform = lambda: mock_curl.pause.called and perform_multi() or (0, 1)
+        self.multi.select = mock.MagicMock()
+
+        # Test
+        self.downloader.download_resources([resource], self.mock_progress_report)
+
+        # Verify
+        self.assertEqual(returned, [pycurl.WRITEFUNC_PAUSE, None])
+        self.multi.select.assert_any_call(0.25)
+        mock_curl.pause.assert_called_once_with(pycurl.PAUSE_CONT)
+        self.downloader.limiter.consume.assert_called_once_with(3)
+        self.assertEqual(open(resource['path']).read(), 'abc')
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_cancelled(self, mock_curl_constructor):
+        # Setup
+        resources = [{'url': URL + '/pool/main/a/abc/abc_1.0_amd64.deb'},
+                     {'url': URL + '/dists/stable/main/binary-amd64/Packages.gz',
+                      'type': 'packages'}]
+
+        curls = []
+
+        def create():
+            # Both responses started but neither completes
+            mock_curl = mock.MagicMock()
+
+            def perform(option, value):
+                if option == pycurl.WRITEFUNCTION:
+                    mock_curl.write = value
+                elif option == pycurl.HEADERFUNCTION:
+                    for line in ['HTTP/1.1 200 OK\r\n', 'ETag: "1234"\r\n', '\r\n']:
+                        value(line)
+                    mock_curl.write('partial')
+            mock_curl.setopt.side_effect = perform
+            curls.append(mock_curl)
+            return mock_curl
+        mock_curl_constructor.side_effect = create
+
+        self.multi.perform = lambda: (0, len(self.multi.handles))
+        self.mock_cancelled_callback.side_effect = [False, True]
+
+        # Test
+        self.assertRaises(exceptions.CancelledException, self.downloader.download_resources,
+                          resources, self.mock_progress_report, raise_on_error=False)
+
+        # Verify
+        self.assertEqual(self.multi.handles, [])
+        for curl in curls:
+            curl.close.assert_called_once_with()
+
+        # Only the package file is kept to be resumed
+        tmp_dir = os.path.join(self.working_dir, web.DOWNLOAD_TMP_DIR)
+        self.assertEqual(sorted(os.listdir(tmp_dir)),
+                         ['archive_pool_main_a_abc_abc_1.0_amd64.deb',
+                          'archive_pool_main_a_abc_abc_1.0_amd64.deb' + web.PARTIAL_SUFFIX])
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_cancelled_before_start(self, mock_curl_constructor):
+        # Setup
+        self.mock_cancelled_callback.return_value = True
+
+        # Test
+        self.assertRaises(exceptions.CancelledException, self.downloader.download_resources,
+                          self.dist.get_indexes(), self.mock_progress_report)
+
+        # Verify
+        self.assertEqual(mock_curl_constructor.call_count, 0)
+
+    def test_limiter_config(self):
+        # Setup
+        config = PluginCallConfiguration({}, {constants.CONFIG_MAX_SPEED: '1024'})
+
+        # Test
+        downloader = HttpDownloader(self.repo, None, config, self.mock_cancelled_callback)
+
+        # Verify
+        self.assertEqual(downloader.limiter.rate, 1024)
+        self.assertTrue(HttpDownloader(self.repo, None, self.config, None).limiter is None)
+
+    def test_max_downloads_config(self):
+        # Setup
+        config = PluginCallConfiguration({constants.CONFIG_MAX_DOWNLOADS: '7',
+                                          constants.CONFIG_MAX_DOWNLOADS_PER_HOST: 3}, {})
+
+        # Test
+        downloader = HttpDownloader(self.repo, None, config, self.mock_cancelled_callback)
+
+        # Verify
+        self.assertEqual(downloader.max_downloads, 7)
+        self.assertEqual(downloader.max_downloads_per_host, 3)
+        self.assertEqual(self.downloader.max_downloads, constants.DEFAULT_MAX_DOWNLOADS)
+
+    @mock.patch('pycurl.Curl')
+    def test_download_packages_retried(self, mock_curl_constructor):
+        # Setup
+        resource = {'url': URL + '/pool/main/a/abc/abc_1.0_amd64.deb'}
+
+        statuses = [503, 500, 200]
+        mock_curl = mock.MagicMock()
+        mock_curl.getinfo.side_effect = lambda info: \
+            statuses.pop(0) if info == pycurl.HTTP_CODE else 0
+        mock_curl_constructor.return_value = mock_curl
+
+        # Test
+        self.downloader.download_resources([resource], self.mock_progress_report)
+
+        # Verify
+        self._ensure_path_exists([resource])
+        self.assertEqual(statuses, [])
+        self.assertEqual(self.downloader.statistics()['retries'], 2)
+
+    @mock.patch('pycurl.Curl')
+    def test_download_packages_retries_exhausted(self, mock_curl_constructor):
+        # Setup
+        resource = {'url': URL + '/pool/main/a/abc/abc_1.0_amd64.deb'}
+        mock_curl_constructor.side_effect = mock_curl_factory(503)
+        self.downloader.retry_policy.max_retries = 2
+
+        # Test
+        self.downloader.download_resources([resource], self.mock_progress_report,
+                                           raise_on_error=False)
+
+        # Verify
+        self.assertTrue(isinstance(resource['error'], exceptions.ServerErrorException))
+        self.assertEqual(resource['error'].status, 503)
+        self.assertEqual(self.downloader.statistics()['retries'], 2)
+
+    @mock.patch('time.sleep')
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_circuit_breaker(self, mock_curl_constructor, mock_sleep):
+        # Setup - the host fails to connect until it was paused
+        resources = [{'url': URL + '/pool/file-%s.deb' % i} for i in range(3)]
+        mock_curl_constructor.side_effect = mock_curl_factory(200)
+        self.multi.error = (pycurl.E_COULDNT_CONNECT, 'Connection refused')
+
+        self.downloader.breaker.threshold = 2
+        self.downloader.max_downloads_per_host = 1
+
+        def sleep(seconds):
+            self.multi.error = None
+            self.downloader.breaker.hosts[urlparse.urlparse(URL).netloc][1] = 0
+        mock_sleep.side_effect = sleep
+
+        # Test
+        self.downloader.download_resources(resources, self.mock_progress_report)
+
+        # Verify
+        self._ensure_path_exists(resources)
+        self.assertEqual(mock_sleep.call_count, 1)
+        stats = self.downloader.statistics()
+        self.assertEqual(stats['circuit_breaker']['trips'], 1)
+        self.assertEqual(stats['retries'], 2)
+
+    def _mirrored_downloader(self, failing_url):
+        """
+        Returns a downloader for URL with MIRROR_URL as its mirror; the
+        curl handles created report a 500 for the URLs under failing_url.
+        """
+        config = PluginCallConfiguration({constants.CONFIG_DIST: {'url': URL},
+                                          constants.CONFIG_MIRRORS: [MIRROR_URL]}, {})
+        downloader = HttpDownloader(self.repo, None, config, self.mock_cancelled_callback)
+
+        self.requested = []
+
+        def create():
+            mock_curl = mock.MagicMock()
+
+            def setopt(option, value):
+                if option == pycurl.URL:
+                    mock_curl.url = value
+                    self.requested.append(value)
+            mock_curl.setopt.side_effect = setopt
+
+            def getinfo(info):
+                if info == pycurl.HTTP_CODE:
+                    return mock_curl.url.startswith(failing_url + '/') and 500 or 200
+                return 0
+            mock_curl.getinfo.side_effect = getinfo
+            return mock_curl
+        return downloader, create
+
+    @mock.patch('pycurl.Curl')
+    def test_download_packages_mirror_failover(self, mock_curl_constructor):
+        # Setup
+        resource = {'url': URL + '/pool/main/a/abc/abc_1.0_amd64.deb'}
+        downloader, mock_curl_constructor.side_effect = self._mirrored_downloader(URL)
+        downloader.mirrors.probed = True
+
+        # Test
+        downloader.download_resources([resource], self.mock_progress_report)
+
+        # Verify
+        self.assertEqual(self.requested, [resource['url'],
+                                          MIRROR_URL + '/pool/main/a/abc/abc_1.0_amd64.deb'])
+        self._ensure_path_exists([resource])
+        self.assertTrue('error' not in resource)
+
+        stats = downloader.statistics()['mirrors']
+        self.assertEqual(stats[URL]['failures'], 1)
+        self.assertEqual(stats[MIRROR_URL]['files'], 1)
+
+    @mock.patch('pycurl.Curl')
+    def test_download_packages_all_mirrors_fail(self, mock_curl_constructor):
+        # Setup
+        resource = {'url': URL + '/pool/main/a/abc/abc_1.0_amd64.deb'}
+        downloader, mock_curl_constructor.side_effect = self._mirrored_downloader('http:/')
+        downloader.mirrors.probed = True
+        downloader.retry_policy.max_retries = 0
+
+        # Test
+        downloader.download_resources([resource], self.mock_progress_report,
+                                      raise_on_error=False)
+
+        # Verify - tried once on each mirror
+        self.assertEqual(len(self.requested), 2)
+        self.assertTrue(isinstance(resource['error'], exceptions.FileRetrievalException))
+        self.assertTrue('path' not in resource)
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_mirror_probe_failed(self, mock_curl_constructor):
+        # Setup
+        resources = [{'url': URL + '/pool/main/a/abc/abc_1.0_amd64.deb'},
+                     {'url': URL + '/pool/main/a/abd/abd_1.0_amd64.deb'}]
+        downloader, mock_curl_constructor.side_effect = self._mirrored_downloader(MIRROR_URL)
+
+        # Test
+        downloader.download_resources(resources, self.mock_progress_report)
+
+        # Verify - the mirror failing the probe is not used afterwards
+        self.assertEqual(len(self.requested), 4)
+        self.assertEqual(self.requested[2:], [r['url'] for r in resources])
+        self._ensure_path_exists(resources)
+        self.assertFalse(downloader.statistics()['mirrors'][MIRROR_URL]['healthy'])
+
+    def _served_downloader(self, documents, config=None):
+        """
+        Returns a downloader and the side effect for the mocked curl
+        constructor serving the given documents keyed by their URL; other
+        URLs are answered with a 404.
+        """
+        downloader = HttpDownloader(self.repo, None, config or self.config,
+                                    self.mock_cancelled_callback)
+        self.requested = []
+
+        def create():
+            mock_curl = mock.MagicMock()
+
+            def setopt(option, value):
+                if option == pycurl.URL:
+                    mock_curl.url = value
+                    self.requested.append(value)
+                elif option == pycurl.WRITEFUNCTION and mock_curl.url in documents:
+                    value(documents[mock_curl.url])
+            mock_curl.setopt.side_effect = setopt
+
+            def getinfo(info):
+                if info == pycurl.HTTP_CODE:
+                    return mock_curl.url in documents and 200 or 404
+                return 0
+            mock_curl.getinfo.side_effect = getinfo
+            return mock_curl
+        return downloader, create
+
+    def _cache_index(self, url, content):
+        filename = os.path.join(self.working_dir, 'index.gz')
+        f = gzip.open(filename, 'wb')
+        f.write(content)
+        f.close()
+        cache.MetadataCache(self.working_dir).store(url, filename, {'etag': '"1234"'})
+
+    def _gzip(self, content):
+        filename = os.path.join(self.working_dir, 'patch.gz')
+        f = gzip.open(filename, 'wb')
+        f.write(content)
+        f.close()
+        return open(filename).read()
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_pdiff(self, mock_curl_constructor):
+        # Setup
+        index = self.dist.get_indexes()[1]
+        self._cache_index(index['url'], 'a\nb\n')
+
+        old, new, patch = 'a\nb\n', 'a\nB\nc\n', '2a\nc\n.\n2c\nB\n.\n'
+        diff_index = ('SHA1-Current: %s %s\n' % (hashlib.sha1(new).hexdigest(), len(new)) +
+                      'SHA1-History:\n %s %s p1\n' % (hashlib.sha1(old).hexdigest(), len(old)) +
+                      'SHA1-Patches:\n %s %s p1\n' % (hashlib.sha1(patch).hexdigest(), len(patch)))
+        downloader, mock_curl_constructor.side_effect = self._served_downloader({
+            pdiff.diff_index_url(index['url']): diff_index,
+            pdiff.patch_url(index['url'], 'p1'): self._gzip(patch),
+        })
+
+        # Test
+        downloader.download_resources([index], self.mock_progress_report)
+
+        # Verify - the index itself is not retrieved
+        self.assertEqual(self.requested, [pdiff.diff_index_url(index['url']),
+                                          pdiff.patch_url(index['url'], 'p1')])
+        metadata_cache = cache.MetadataCache(self.working_dir)
+        self.assertEqual(index['path'], metadata_cache.filename(index['url']))
+        self.assertEqual(gzip.open(index['path']).read(), new)
+        self.assertEqual(metadata_cache.validators(index['url']), {})
+        self.assertEqual(self.mock_progress_report.query_finished_count, 1)
+        self.assertEqual(downloader.statistics()['pdiff'],
+                         {'patched': 1, 'patches': 1, 'unchanged': 0, 'fallbacks': 0})
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_pdiff_fallback(self, mock_curl_constructor):
+        # Setup
+        index = self.dist.get_indexes()[1]
+        self._cache_index(index['url'], 'a\nb\n')
+
+        diff_index = 'SHA1-Current: %s 1\nSHA1-History:\nSHA1-Patches:\n' % ('0' * 40)
+        downloader, mock_curl_constructor.side_effect = self._served_downloader({
+            pdiff.diff_index_url(index['url']): diff_index,
+            index['url']: 'full',
+        })
+
+        # Test
+        downloader.download_resources([index], self.mock_progress_report)
+
+        # Verify - the cached version is not in the history
+        self.assertEqual(self.requested, [pdiff.diff_index_url(index['url']), index['url']])
+        self.assertEqual(open(index['path']).read(), 'full')
+        self.assertEqual(downloader.statistics()['pdiff']['fallbacks'], 1)
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_pdiff_disabled(self, mock_curl_constructor):
+        # Setup
+        index = self.dist.get_indexes()[1]
+        self._cache_index(index['url'], 'a\nb\n')
+
+        config = PluginCallConfiguration({constants.CONFIG_PDIFFS: 'false'}, {})
+        downloader, mock_curl_constructor.side_effect = self._served_downloader(
+            {index['url']: 'full'}, config)
+
+        # Test
+        downloader.download_resources([index], self.mock_progress_report)
+
+        # Verify
+        self.assertEqual(self.requested, [index['url']])
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_release_current(self, mock_curl_constructor):
+        # Setup
+        indexes = self.dist.get_indexes()[:2]
+        metadata_cache = cache.MetadataCache(self.working_dir)
+        downloaded = os.path.join(self.working_dir, 'cached')
+        open(downloaded, 'w').write('cached')
+        metadata_cache.store(indexes[0]['url'], downloaded, {'etag': '"1"'}, 'a' * 64)
+
+        indexes[0]['index_checksum'] = 'a' * 64
+        indexes[1].update({'size': 4, 'sha256': hashlib.sha256('full').hexdigest(),
+                           'index_checksum': 'b' * 64})
+        downloader, mock_curl_constructor.side_effect = self._served_downloader(
+            {indexes[1]['url']: 'full'})
+
+        # Test
+        downloader.download_resources(indexes, self.mock_progress_report)
+
+        # Verify - the unchanged index is not requested, the other one is
+        # verified and cached along with its checksum
+        self.assertEqual(self.requested, [indexes[1]['url']])
+        self.assertEqual(open(indexes[0]['path']).read(), 'cached')
+        self.assertEqual(indexes[1]['path'], metadata_cache.filename(indexes[1]['url']))
+        self.assertEqual(indexes[1]['verified']['sha256'], indexes[1]['sha256'])
+        self.assertEqual(metadata_cache.checksum(indexes[1]['url']), 'b' * 64)
+        self.assertEqual(self.mock_progress_report.query_finished_count, 2)
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_by_hash(self, mock_curl_constructor):
+        # Setup
+        index = self.dist.get_indexes()[0]
+        digest = hashlib.sha256('full').hexdigest()
+        by_hash_url = index['url'].rsplit('/', 1)[0] + '/by-hash/SHA256/' + digest
+        index.update({'size': 4, 'sha256': digest, 'by_hash_url': by_hash_url})
+        downloader, mock_curl_constructor.side_effect = self._served_downloader(
+            {by_hash_url: 'full'})
+
+        # Test
+        downloader.download_resources([index], self.mock_progress_report)
+
+        # Verify - retrieved by hash, cached under the usual URL and the
+        # checksum
+        self.assertEqual(self.requested, [by_hash_url])
+        self.assertEqual(index['path'], cache.MetadataCache(self.working_dir).filename(index['url']))
+        self.assertEqual(open(downloader.blob_cache.get(digest)).read(), 'full')
+        self.assertEqual(downloader.statistics()['by_hash'],
+                         {'retrieved': 1, 'cached': 0, 'fallbacks': 0})
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_by_hash_fallback(self, mock_curl_constructor):
+        # Setup
+        index = self.dist.get_indexes()[0]
+        digest = hashlib.sha256('full').hexdigest()
+        by_hash_url = index['url'].rsplit('/', 1)[0] + '/by-hash/SHA256/' + digest
+        index.update({'size': 4, 'sha256': digest, 'by_hash_url': by_hash_url})
+        downloader, mock_curl_constructor.side_effect = self._served_downloader(
+            {index['url']: 'full'})
+
+        # Test
+        downloader.download_resources([index], self.mock_progress_report)
+
+        # Verify
+        self.assertEqual(self.requested, [by_hash_url, index['url']])
+        self.assertEqual(open(index['path']).read(), 'full')
+        self.assertEqual(downloader.by_hash_stats['fallbacks'], 1)
+        self.assertEqual(downloader.retries, 0)
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_variant(self, mock_curl_constructor):
+        # Setup - the Release file picked another variant, not published
+        # under its checksum
+        index = self.dist.get_indexes()[0]
+        url = index['url']
+        digest = hashlib.sha256('full').hexdigest()
+        variant_url = url[:-len('.gz')] + '.bz2'
+        by_hash_url = url.rsplit('/', 1)[0] + '/by-hash/SHA256/' + digest
+        index.update({'size': 4, 'sha256': digest, 'variant_url': variant_url,
+                      'by_hash_url': by_hash_url})
+        downloader, mock_curl_constructor.side_effect = self._served_downloader(
+            {variant_url: 'full'})
+
+        # Test
+        downloader.download_resources([index], self.mock_progress_report)
+
+        # Verify - cached under the usual URL, which the next sync looks for
+        self.assertEqual(self.requested, [by_hash_url, variant_url])
+        self.assertEqual(index['url'], url)
+        self.assertEqual(index['path'], cache.MetadataCache(self.working_dir).filename(url))
+        self.assertEqual(open(index['path']).read(), 'full')
+        self.assertEqual(downloader.by_hash_stats, {'retrieved': 0, 'cached': 0, 'fallbacks': 1})
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_pdiff_variant(self, mock_curl_constructor):
+        # Setup - a bzip2 variant was cached under the usual URL of the index
+        index = self.dist.get_indexes()[1]
+        filename = os.path.join(self.working_dir, 'index.bz2')
+        f = bz2.BZ2File(filename, 'wb')
+        f.write('a\nb\n')
+        f.close()
+        cache.MetadataCache(self.working_dir).store(index['url'], filename, {})
+
+        old, new, patch = 'a\nb\n', 'a\nB\n', '2c\nB\n.\n'
+        diff_index = ('SHA1-Current: %s %s\n' % (hashlib.sha1(new).hexdigest(), len(new)) +
+                      'SHA1-History:\n %s %s p1\n' % (hashlib.sha1(old).hexdigest(), len(old)) +
+                      'SHA1-Patches:\n %s %s p1\n' % (hashlib.sha1(patch).hexdigest(), len(patch)))
+        downloader, mock_curl_constructor.side_effect = self._served_downloader({
+            pdiff.diff_index_url(index['url']): diff_index,
+            pdiff.patch_url(index['url'], 'p1'): self._gzip(patch),
+        })
+
+        # Test
+        downloader.download_resources([index], self.mock_progress_report)
+
+        # Verify
+        self.assertEqual(downloader.statistics()['pdiff']['patched'], 1)
+        self.assertEqual(gzip.open(index['path']).read(), new)
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_by_hash_no_diffs(self, mock_curl_constructor):
+        # Setup
+        index = self.dist.get_indexes()[1]
+        self._cache_index(index['url'], 'a\nb\n')
+        digest = hashlib.sha256('full').hexdigest()
+        by_hash_url = index['url'].rsplit('/', 1)[0] + '/by-hash/SHA256/' + digest
+        index.update({'size': 4, 'sha256': digest, 'by_hash_url': by_hash_url})
+        downloader, mock_curl_constructor.side_effect = self._served_downloader(
+            {index['url']: 'full', by_hash_url: 'full'})
+
+        # Test
+        downloader.download_resources([index], self.mock_progress_report)
+
+        # Verify - the missing diff index is not looked for at the usual URL
+        # of the index
+        self.assertEqual(self.requested, [pdiff.diff_index_url(index['url']), by_hash_url])
+        self.assertEqual(open(index['path']).read(), 'full')
+        self.assertEqual(downloader.statistics()['pdiff']['fallbacks'], 1)
+        self.assertEqual(downloader.by_hash_stats['fallbacks'], 0)
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_blob_cache(self, mock_curl_constructor):
+        # Setup
+        index = self.dist.get_indexes()[0]
+        digest = hashlib.sha256('full').hexdigest()
+        index.update({'size': 4, 'sha256': digest, 'index_checksum': 'a' * 64})
+        downloaded = os.path.join(self.working_dir, 'blob')
+        open(downloaded, 'w').write('full')
+        downloader, mock_curl_constructor.side_effect = self._served_downloader({})
+        downloader.blob_cache.add(digest, downloaded)
+
+        # Test
+        downloader.download_resources([index], self.mock_progress_report)
+
+        # Verify - nothing is requested and the copy lands in the metadata
+        # cache, so it is current for the next sync
+        metadata_cache = cache.MetadataCache(self.working_dir)
+        self.assertEqual(self.requested, [])
+        self.assertEqual(index['path'], metadata_cache.filename(index['url']))
+        self.assertEqual(open(index['path']).read(), 'full')
+        self.assertEqual(metadata_cache.checksum(index['url']), 'a' * 64)
+        self.assertEqual(self.mock_progress_report.query_finished_count, 1)
+
+    @mock.patch('pycurl.Curl')
+    def test_download_packages_blob_cache(self, mock_curl_constructor):
+        # Setup
+        digest = hashlib.sha256('abc').hexdigest()
+        cached = {'url': URL + '/pool/main/a/abc/abc_1.0_amd64.deb', 'size': '3',
+                  'sha256': digest}
+        other = {'url': URL + '/pool/main/a/abd/abd_1.0_amd64.deb', 'size': '3',
+                 'sha256': hashlib.sha256('abd').hexdigest()}
+        downloaded = os.path.join(self.working_dir, 'blob')
+        open(downloaded, 'w').write('abc')
+        downloader, mock_curl_constructor.side_effect = self._served_downloader(
+            {other['url']: 'abd'})
+        downloader.blob_cache.add(digest, downloaded)
+
+        # Test
+        downloader.download_resources([cached, other], self.mock_progress_report)
+
+        # Verify - only the other file is requested, and is cached in turn
+        self.assertEqual(self.requested, [other['url']])
+        self.assertEqual(open(cached['path']).read(), 'abc')
+        self.assertTrue(cached['temporary'])
+        self.assertEqual(cached['verified'], {'size': 3, 'sha256': digest})
+        self.assertEqual(open(downloader.blob_cache.get(other['sha256'])).read(), 'abd')
+        self.assertEqual(downloader.statistics()['blob_cache'],
+                         {'hits': 1, 'misses': 1, 'bytes_saved': 3})
+        self.assertEqual(self.mock_progress_report.add_finished_bytes.call_args_list,
+                         [mock.call(3), mock.call(3)])
+        self.assertEqual(self.mock_progress_report.query_finished_count, 2)
+
+    @mock.patch('pycurl.Curl')
+    def test_download_resources_timings(self, mock_curl_constructor):
+        # Setup
+        resource = {'url': URL + '/pool/main/a/abc/abc_1.0_amd64.deb'}
+        config = PluginCallConfiguration({constants.CONFIG_DUMP_TIMINGS: 'true'}, {})
+        downloader, mock_curl_constructor.side_effect = self._served_downloader(
+            {resource['url']: 'abc'}, config)
+
+        # Test
+        downloader.download_resources([resource], self.mock_progress_report)
+        downloader.close()
+
+        # Verify
+        host = urlparse.urlparse(URL).netloc
+        self.assertEqual(downloader.statistics()['timings'][host]['transfers'], 1)
+        self.assertTrue(os.path.exists(os.path.join(self.working_dir, 'transfer-timings.json')))
+
+    def test_mirrors_config(self):
+        # Setup
+        config = PluginCallConfiguration({constants.CONFIG_DIST: {'url': URL},
+                                          constants.CONFIG_MIRRORS: [MIRROR_URL + '/']}, {})
+
+        # Test
+        downloader = HttpDownloader(self.repo, None, config, self.mock_cancelled_callback)
+
+        # Verify
+        self.assertEqual([m.url for m in downloader.mirrors.mirrors], [URL, MIRROR_URL])
+        self.assertTrue(self.downloader.mirrors is None)
+
     @mock.patch('pulp_deb.plugins.importers.downloaders.web.HttpDownloader._create_and_configure_curl')
     def test_download_file(self, mock_curl_create):
         mock_curl = mock.MagicMock()
@@ -129,9 +1167,14 @@ class HttpDownloaderTests(base_downloader.BaseDownloaderTests):
         self.assertEqual(opts_by_key[pycurl.URL], url)
         self.assertEqual(opts_by_key[pycurl.WRITEFUNCTION], destination.update)
 
-        self.assertEqual(1, mock_curl.perform.call_count)
-        self.assertEqual(1, mock_curl.getinfo.call_count)
+        self.assertEqual(0, len(self.multi.handles))
+        mock_curl.getinfo.assert_any_call(pycurl.HTTP_CODE)
+
+        # The handle is kept for reuse until the downloader is closed
+        self.assertEqual(0, mock_curl.close.call_count)
+        self.downloader.close()
         self.assertEqual(1, mock_curl.close.call_count)
+        self.assertTrue(self.multi.closed)
 
     @mock.patch('pulp_deb.plugins.importers.downloaders.web.HttpDownloader._create_and_configure_curl')
     def test_download_file_unauthorized(self, mock_curl_create):
@@ -199,6 +1242,15 @@ class HttpDownloaderTests(base_downloader.BaseDownloaderTests):
         self.assertEqual(opts_by_key[pycurl.VERBOSE], 0)
         self.assertEqual(opts_by_key[pycurl.LOW_SPEED_LIMIT], 1000)
         self.assertEqual(opts_by_key[pycurl.LOW_SPEED_TIME], 5 * 60)
+        self.assertEqual(opts_by_key[pycurl.NOPROGRESS], 0)
+        self.assertEqual(opts_by_key[pycurl.XFERINFOFUNCTION], self.downloader._transfer_progress)
+
+    def test_transfer_progress(self):
+        # Test
+        self.assertEqual(self.downloader._transfer_progress(100, 10, 0, 0), 0)
+
+        self.mock_cancelled_callback.return_value = True
+        self.assertEqual(self.downloader._transfer_progress(100, 10, 0, 0), 1)
 
     def test_create_download_tmp_dir(self):
         # Test
@@ -209,7 +1261,103 @@ class HttpDownloaderTests(base_downloader.BaseDownloaderTests):
         self.assertEqual(created, os.path.join(self.working_dir, web.DOWNLOAD_TMP_DIR))
 
 
+class ErrorMappingTests(unittest.TestCase):
+    def test_curl_error(self):
+        # Setup
+        transfer = web.Transfer(URL, None)
+        error = pycurl.error(pycurl.E_OPERATION_TIMEDOUT, 'timed out')
+
+        # Test - before and after the server answered
+        before = web._curl_error(URL, error, transfer)
+        transfer.status = 200
+        after = web._curl_error(URL, error, transfer)
+
+        # Verify
+        self.assertTrue(isinstance(before, exceptions.ConnectionException))
+        self.assertFalse(isinstance(before, exceptions.TransferException))
+        self.assertTrue(isinstance(after, exceptions.TransferException))
+        self.assertEqual(after.message, 'timed out')
+
+        other = pycurl.error(pycurl.E_WRITE_ERROR, 'failed writing body')
+        self.assertTrue(web._curl_error(URL, other, transfer) is other)
+
+    def test_status_error(self):
+        error = web._status_error(URL, 503, {'retry-after': '120'})
+        self.assertTrue(isinstance(error, exceptions.ServerErrorException))
+        self.assertEqual(error.retry_after, 120)
+
+        error = web._status_error(URL, 429, {'retry-after': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        self.assertTrue(isinstance(error, exceptions.ServerErrorException))
+        self.assertTrue(error.retry_after is None)
+
+        error = web._status_error(URL, 403)
+        self.assertFalse(isinstance(error, exceptions.ServerErrorException))
+
+
+class TransferTests(unittest.TestCase):
+    def test_header(self):
+        # Setup
+        transfer = web.Transfer('http://localhost/a', mock.MagicMock())
+        lines = ['HTTP/1.1 100 Continue\r\n', 'Server: test\r\n', '\r\n',
+                 'HTTP/1.1 200 OK\r\n', 'ETag: "1"\r\n',
+                 'Last-Modified: Mon, 01 Oct 2012 10:00:00 GMT\r\n', '\r\n']
+
+        # Test
+        for line in lines:
+            transfer.header(line)
+
+        # Verify
+        self.assertEqual(transfer.response_headers,
+                         {'etag': '"1"', 'last-modified': 'Mon, 01 Oct 2012 10:00:00 GMT'})
+
+    def test_header_resumable(self):
+        # Setup
+        destination = mock.MagicMock()
+        transfer = web.Transfer('http://localhost/a', destination)
+        transfer.resumable = True
+        lines = ['HTTP/1.1 100 Continue\r\n', '\r\n',
+                 'HTTP/1.1 206 Partial Content\r\n', 'ETag: "1"\r\n', '\r\n']
+
+        # Test
+        for line in lines:
+            transfer.header(line)
+
+        # Verify
+        self.assertEqual(transfer.status, 206)
+        destination.response_started.assert_called_once_with(206, {'etag': '"1"'})
+
+    def test_header_error(self):
+        # Setup
+        working_dir = tempfile.mkdtemp(prefix='transfer-tests')
+        self.addCleanup(shutil.rmtree, working_dir)
+        destination = web.StoredDownloadedContent(os.path.join(working_dir, 'a'))
+        destination.open()
+        transfer = web.Transfer('http://localhost/a', destination)
+
+        # Test
+        for line in ['HTTP/1.1 500 Internal Server Error\r\n', '\r\n']:
+            transfer.header(line)
+        destination.update('error page')
+        destination.close()
+
+        # Verify - not resumable, the body is dropped all the same
+        self.assertEqual(os.path.getsize(destination.filename), 0)
+
+
 class InMemoryDownloadedContentTests(unittest.TestCase):
+    def test_update_error(self):
+        # Setup
+        content = web.InMemoryDownloadedContent()
+        content.open()
+
+        # Test
+        content.response_started(404, {})
+        content.update('Not Found')
+
+        # Verify
+        self.assertEqual(content.content, '')
+        self.assertEqual(content.size, 0)
+
     def test_update(self):
         # Setup
         data = ['abc', 'de', 'fgh']
@@ -221,6 +1369,28 @@ class InMemoryDownloadedContentTests(unittest.TestCase):
 
         # Verify
         self.assertEqual(content.content, ''.join(data))
+        self.assertEqual(content.chunks, [''.join(data)])
+        self.assertEqual(content.size, 8)
+
+    def test_lines(self):
+        # Setup
+        data = ['Package: a\nVer', 'sion: 1', '\n', '\nPackage: b\n', 'Version: 2']
+
+        # Test
+        content = web.InMemoryDownloadedContent()
+        for d in data:
+            content.update(d)
+
+        # Verify
+        expected = ['Package: a\n', 'Version: 1\n', '\n', 'Package: b\n', 'Version: 2']
+        self.assertEqual(list(content.lines()), expected)
+        self.assertEqual(list(content), expected)
+        self.assertEqual(len(content.chunks), 5)
+
+    def test_lines_empty(self):
+        content = web.InMemoryDownloadedContent()
+        self.assertEqual(list(content), [])
+        self.assertEqual(content.content, '')
 
 
 class StoredDownloadedContentTests(unittest.TestCase):
@@ -254,6 +1424,142 @@ class StoredDownloadedContentTests(unittest.TestCase):
         # Clean Up
         shutil.rmtree(tmp_dir)
 
+    @mock.patch('pulp_deb.plugins.importers.storage.preallocate')
+    def test_open_preallocates(self, mock_preallocate):
+        # Setup
+        tmp_dir = tempfile.mkdtemp(prefix='stored-downloaded-content')
+        filename = os.path.join(tmp_dir, 'storage-test.txt')
+
+        # Test
+        content = web.StoredDownloadedContent(filename, size=3)
+        content.open()
+        content.update('abc')
+        content.close()
+
+        # Verify
+        self.assertEqual(mock_preallocate.call_args_list, [mock.call(content.file, 3)])
+        self.assertEqual(open(filename).read(), 'abc')
+
+        # Clean Up
+        shutil.rmtree(tmp_dir)
+
+    def test_resume(self):
+        # Setup
+        tmp_dir = tempfile.mkdtemp(prefix='stored-downloaded-content')
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        filename = os.path.join(tmp_dir, 'storage-test.txt')
+
+        content = web.StoredDownloadedContent(filename, url='http://localhost/a')
+        content.open()
+        content.response_started(200, {'etag': 'W/"weak"', 'last-modified': 'yesterday'})
+        content.update('abc')
+        content.close()
+
+        # Test
+        resumed = web.StoredDownloadedContent(filename, url='http://localhost/a')
+        resumed.open()
+        resumed.response_started(206, {})
+        resumed.update('def')
+        resumed.close()
+
+        # Verify
+        self.assertEqual(resumed.validator, 'yesterday')
+        self.assertEqual(resumed.offset, 6)
+        self.assertEqual(open(filename).read(), 'abcdef')
+        self.assertTrue(resumed.is_resumable())
+
+        resumed.complete()
+        self.assertTrue(not resumed.is_resumable())
+
+    def test_resume_verified(self):
+        # Setup
+        tmp_dir = tempfile.mkdtemp(prefix='stored-downloaded-content')
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        filename = os.path.join(tmp_dir, 'storage-test.txt')
+
+        content = web.StoredDownloadedContent(filename, url='http://localhost/a')
+        content.open()
+        content.response_started(200, {'etag': '"1"'})
+        content.update('ab')
+        content.close()
+
+        # Test
+        verifier = verification.StreamVerifier('http://localhost/a', {'size': 3, 'md5sum': ABC_MD5})
+        resumed = web.StoredDownloadedContent(filename, url='http://localhost/a', verifier=verifier)
+        resumed.open()
+        resumed.response_started(206, {})
+        resumed.update('c')
+        resumed.close()
+
+        # Verify
+        self.assertEqual(verifier.verify(), {'size': 3, 'md5sum': ABC_MD5})
+
+    def test_resume_other_url(self):
+        # Setup
+        tmp_dir = tempfile.mkdtemp(prefix='stored-downloaded-content')
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        filename = os.path.join(tmp_dir, 'storage-test.txt')
+
+        content = web.StoredDownloadedContent(filename, url='http://localhost/a')
+        content.open()
+        content.response_started(200, {'etag': '"1"'})
+        content.update('abc')
+        content.close()
+
+        # Test
+        other = web.StoredDownloadedContent(filename, url='http://mirror/a')
+        other.open()
+        other.close()
+
+        # Verify
+        self.assertEqual(other.offset, 0)
+        self.assertEqual(open(filename).read(), '')
+        self.assertTrue(not other.is_resumable())
+
+    def test_response_started_full_document(self):
+        # Setup
+        tmp_dir = tempfile.mkdtemp(prefix='stored-downloaded-content')
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        filename = os.path.join(tmp_dir, 'storage-test.txt')
+
+        content = web.StoredDownloadedContent(filename, url='http://localhost/a')
+        content.open()
+        content.response_started(200, {'etag': '"1"'})
+        content.update('old')
+        content.close()
+
+        # Test - the document changed, the server sends all of it
+        content.open()
+        content.response_started(200, {'etag': '"2"'})
+        content.update('new')
+        content.close()
+
+        # Verify
+        self.assertEqual(open(filename).read(), 'new')
+        self.assertEqual(content.validator, '"2"')
+
+    def test_response_started_error(self):
+        # Setup
+        tmp_dir = tempfile.mkdtemp(prefix='stored-downloaded-content')
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        filename = os.path.join(tmp_dir, 'storage-test.txt')
+
+        content = web.StoredDownloadedContent(filename, url='http://localhost/a')
+        content.open()
+        content.response_started(200, {'etag': '"1"'})
+        content.update('abc')
+        content.close()
+
+        # Test
+        content.open()
+        content.response_started(503, {})
+        content.update('Service Unavailable')
+        content.close()
+
+        # Verify
+        self.assertEqual(open(filename).read(), 'abc')
+        self.assertTrue(content.is_resumable())
+
 
 def curl_opts_by_key(call_args_list):
     opts_by_key = dict([(c[0][0], c[0][1]) for c in call_args_list])
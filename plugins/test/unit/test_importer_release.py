@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import unittest
+
+import mock
+
+from pulp_deb.common import samples
+from pulp_deb.plugins.importers import release
+
+
+URL = 'http://ubuntu.uib.no/archive'
+RELEASE_URL = URL + '/dists/precise/Release'
+
+RELEASE = """Origin: Ubuntu
+Suite: precise
+SHA256:
+ %(p)s 1346 main/binary-amd64/Packages
+ %(gz)s 790 main/binary-amd64/Packages.gz
+ %(bz2)s 770 main/binary-amd64/Packages.bz2
+ %(xz)s 700 main/binary-amd64/Packages.xz
+ %(s)s 731 main/source/Sources.gz
+""" % {'p': 'a' * 64, 'gz': 'b' * 64, 'bz2': 'c' * 64, 'xz': 'd' * 64, 's': 'e' * 64}
+
+
+class ReleaseTests(unittest.TestCase):
+    def setUp(self):
+        self.release = release.Release(RELEASE_URL, RELEASE.splitlines(True))
+
+    def test_files(self):
+        self.assertEqual(self.release.base_url, URL + '/dists/precise')
+        self.assertEqual(len(self.release.files), 5)
+        self.assertEqual(self.release.files['main/source/Sources.gz'],
+                         {'size': 731, 'sha256': 'e' * 64})
+
+    def test_fixture(self):
+        # Setup
+        url = samples.local_repo_location() + '/valid/dists/precise/Release'
+
+        # Test
+        parsed = release.Release(url, open(url[len('file://'):]).readlines())
+
+        # Verify
+        self.assertEqual(parsed.files['main/binary-amd64/Packages.gz'],
+                         {'size': 790, 'md5sum': '39c81b6f140f2a776e07e789dbd57ce5',
+                          'sha1': parsed.files['main/binary-amd64/Packages.gz']['sha1'],
+                          'sha256': '9e7acb9875270bb8439669481632f0a099b76c1f88b1c302297f0de2e1417af4'})
+
+    @mock.patch('pulp_deb.common.utils.lzma', None)
+    def test_select_index(self):
+        # Test
+        path, listed = self.release.select_index('main/binary-amd64/Packages')
+
+        # Verify - xz cannot be read without lzma
+        self.assertEqual(path, 'main/binary-amd64/Packages.bz2')
+        self.assertEqual(listed, {'size': 770, 'sha256': 'c' * 64})
+
+    @mock.patch('pulp_deb.common.utils.lzma', object())
+    def test_select_index_xz(self):
+        path, listed = self.release.select_index('main/binary-amd64/Packages')
+        self.assertEqual(path, 'main/binary-amd64/Packages.xz')
+
+    def test_select_index_not_listed(self):
+        self.assertTrue(self.release.select_index('main/binary-i386/Packages') is None)
+
+    def test_index_checksum(self):
+        # The uncompressed index identifies the version when it is listed
+        self.assertEqual(self.release.index_checksum('main/binary-amd64/Packages.gz'), 'a' * 64)
+        self.assertEqual(self.release.index_checksum('main/source/Sources.gz'), 'e' * 64)
+
+    @mock.patch('pulp_deb.common.utils.lzma', None)
+    def test_update_indexes(self):
+        # Setup
+        indexes = samples.get_repo(url=URL).get_indexes()
+
+        # Test
+        self.release.update_indexes(indexes)
+
+        # Verify - the usual URL is kept to identify the index
+        by_type = dict([(i['type'] + i.get('arch', ''), i) for i in indexes])
+        self.assertEqual(by_type['packagesamd64']['url'],
+                         URL + '/dists/precise/main/binary-amd64/Packages.gz')
+        self.assertEqual(by_type['packagesamd64']['variant_url'],
+                         URL + '/dists/precise/main/binary-amd64/Packages.bz2')
+        self.assertEqual(by_type['packagesamd64']['size'], 770)
+        self.assertEqual(by_type['packagesamd64']['sha256'], 'c' * 64)
+        self.assertEqual(by_type['packagesamd64']['index_checksum'], 'a' * 64)
+
+        # Not listed, left alone
+        self.assertEqual(by_type['packagesi386']['url'],
+                         URL + '/dists/precise/main/binary-i386/Packages.gz')
+        self.assertTrue('size' not in by_type['packagesi386'])
+        self.assertTrue('variant_url' not in by_type['packagesi386'])
+
+    def test_by_hash_url_not_advertised(self):
+        self.assertFalse(self.release.acquire_by_hash)
+        self.assertTrue(self.release.by_hash_url('main/source/Sources.gz') is None)
+
+    @mock.patch('pulp_deb.common.utils.lzma', None)
+    def test_update_indexes_by_hash(self):
+        # Setup
+        lines = RELEASE.replace('Suite: precise\n', 'Suite: precise\nAcquire-By-Hash: yes\n')
+        by_hash = release.Release(RELEASE_URL, lines.splitlines(True))
+        indexes = samples.get_repo(url=URL).get_indexes()
+
+        # Test
+        by_hash.update_indexes(indexes)
+
+        # Verify
+        by_type = dict([(i['type'] + i.get('arch', ''), i) for i in indexes])
+        self.assertTrue(by_hash.acquire_by_hash)
+        self.assertEqual(by_type['packagesamd64']['by_hash_url'],
+                         URL + '/dists/precise/main/binary-amd64/by-hash/SHA256/' + 'c' * 64)
+        self.assertEqual(by_type['sources']['by_hash_url'],
+                         URL + '/dists/precise/main/source/by-hash/SHA256/' + 'e' * 64)
+        self.assertTrue('by_hash_url' not in by_type['packagesi386'])
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import errno
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pulp_deb.common import constants
+from pulp_deb.plugins.importers import storage
+
+
+REAL_RENAME = os.rename
+
+class StorageTests(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp(prefix='storage-tests')
+        self.source = os.path.join(self.working_dir, 'downloaded.deb')
+        self.destination = os.path.join(self.working_dir, 'storage', 'a', 'a.deb')
+
+        f = open(self.source, 'w')
+        f.write('package')
+        f.close()
+        os.chmod(self.source, 0640)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_move_into_place(self):
+        # Test
+        result = storage.move_into_place(self.source, self.destination)
+
+        # Verify
+        self.assertEqual(result, (storage.METHOD_RENAME, 0))
+        self.assertTrue(not os.path.exists(self.source))
+        self.assertEqual(open(self.destination).read(), 'package')
+
+    @mock.patch('os.rename')
+    def test_move_into_place_other_filesystem(self, mock_rename):
+        # Setup - only the rename of the temporary copy succeeds
+        def rename(source, destination):
+            if source == self.source:
+                raise OSError(errno.EXDEV, 'Invalid cross-device link')
+            REAL_RENAME(source, destination)
+        mock_rename.side_effect = rename
+
+        # Test
+        storage.move_into_place(self.source, self.destination)
+
+        # Verify
+        self.assertTrue(not os.path.exists(self.source))
+        self.assertEqual(open(self.destination).read(), 'package')
+        self.assertEqual(os.listdir(os.path.dirname(self.destination)), ['a.deb'])
+
+    @mock.patch('os.rename')
+    def test_move_into_place_error(self, mock_rename):
+        # Setup
+        mock_rename.side_effect = OSError(errno.EACCES, 'Permission denied')
+
+        # Test
+        self.assertRaises(OSError, storage.move_into_place, self.source, self.destination)
+
+        # Verify
+        self.assertTrue(os.path.exists(self.source))
+
+    def test_copy_into_place(self):
+        # Test
+        storage.copy_into_place(self.source, self.destination)
+
+        # Verify
+        self.assertEqual(open(self.source).read(), 'package')
+        self.assertEqual(open(self.destination).read(), 'package')
+        self.assertEqual(os.stat(self.destination).st_mode & 0777, 0640)
+        self.assertEqual(os.listdir(os.path.dirname(self.destination)), ['a.deb'])
+
+    @mock.patch('shutil.copyfileobj')
+    def test_copy_into_place_error(self, mock_copy):
+        # Setup
+        mock_copy.side_effect = IOError(errno.ENOSPC, 'No space left on device')
+
+        # Test
+        self.assertRaises(IOError, storage.copy_into_place, self.source, self.destination)
+
+        # Verify
+        self.assertEqual(os.listdir(os.path.dirname(self.destination)), [])
+
+
+class IngestTests(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp(prefix='ingest-tests')
+        self.source = os.path.join(self.working_dir, 'pool.deb')
+        self.destination = os.path.join(self.working_dir, 'storage', 'a', 'a.deb')
+
+        f = open(self.source, 'w')
+        f.write('package')
+        f.close()
+        os.chmod(self.source, 0640)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def assert_ingested(self, linked=False):
+        self.assertEqual(open(self.source).read(), 'package')
+        self.assertEqual(open(self.destination).read(), 'package')
+        self.assertEqual(os.stat(self.destination).st_mode & 0777, 0640)
+        self.assertEqual(os.listdir(os.path.dirname(self.destination)), ['a.deb'])
+        self.assertEqual(os.path.samefile(self.source, self.destination), linked)
+
+    def test_ingest_hardlink(self):
+        # Test
+        result = storage.ingest(self.source, self.destination, constants.LOCAL_INGEST_HARDLINK)
+
+        # Verify
+        self.assertEqual(result, (constants.LOCAL_INGEST_HARDLINK, 0))
+        self.assert_ingested(linked=True)
+
+    @mock.patch('fcntl.ioctl')
+    @mock.patch('os.link')
+    def test_ingest_reflink(self, mock_link, mock_ioctl):
+        # Setup
+        mock_link.side_effect = OSError(errno.EXDEV, 'Invalid cross-device link')
+
+        def clone(dest_fd, request, src_fd):
+            os.write(dest_fd, os.read(src_fd, 1024))
+        mock_ioctl.side_effect = clone
+
+        # Test
+        result = storage.ingest(self.source, self.destination)
+
+        # Verify
+        self.assertEqual(result, (constants.LOCAL_INGEST_REFLINK, 0))
+        self.assertEqual(mock_ioctl.call_args[0][1], storage.FICLONE)
+        self.assert_ingested()
+
+    @mock.patch('fcntl.ioctl')
+    def test_ingest_copy_range(self, mock_ioctl):
+        # Setup
+        mock_ioctl.side_effect = IOError(errno.EOPNOTSUPP, 'Operation not supported')
+
+        # Test
+        result = storage.ingest(self.source, self.destination, constants.LOCAL_INGEST_REFLINK)
+
+        # Verify
+        self.assertEqual(result, (constants.LOCAL_INGEST_COPY_RANGE, 7))
+        self.assert_ingested()
+
+    @mock.patch('pulp_deb.plugins.importers.storage._libc')
+    def test_ingest_copy(self, mock_libc):
+        # Setup - neither copy_file_range nor sendfile is available
+        mock_libc.return_value = object()
+
+        # Test
+        result = storage.ingest(self.source, self.destination, constants.LOCAL_INGEST_COPY_RANGE)
+
+        # Verify
+        self.assertEqual(result, (constants.LOCAL_INGEST_COPY, 7))
+        self.assert_ingested()
+
+    @mock.patch('os.link')
+    def test_ingest_error(self, mock_link):
+        # Setup
+        mock_link.side_effect = OSError(errno.EACCES, 'Permission denied')
+
+        # Test
+        self.assertRaises(OSError, storage.ingest, self.source, self.destination)
+
+        # Verify
+        self.assertEqual(os.listdir(os.path.dirname(self.destination)), [])
+
+    def test_link_into_place(self):
+        # Test
+        result = storage.link_into_place(self.source, self.destination)
+
+        # Verify
+        self.assertEqual(result, constants.LOCAL_INGEST_HARDLINK)
+        self.assert_ingested(linked=True)
+
+    @mock.patch('fcntl.ioctl')
+    @mock.patch('os.link')
+    def test_link_into_place_unsupported(self, mock_link, mock_ioctl):
+        # Setup - another filesystem, without shared extents
+        mock_link.side_effect = OSError(errno.EXDEV, 'Invalid cross-device link')
+        mock_ioctl.side_effect = IOError(errno.EXDEV, 'Invalid cross-device link')
+
+        # Test
+        result = storage.link_into_place(self.source, self.destination)
+
+        # Verify - nothing is copied
+        self.assertTrue(result is None)
+        self.assertEqual(os.listdir(os.path.dirname(self.destination)), [])
+
+
+class FreeSpaceTests(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp(prefix='storage-tests')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    @mock.patch('pulp_deb.plugins.importers.storage.free_space')
+    def test_check_free_space(self, mock_free_space):
+        # Setup - both locations are on the same filesystem, the storage
+        # does not exist yet
+        mock_free_space.return_value = 100
+        storage_dir = os.path.join(self.working_dir, 'storage', 'a')
+
+        # Test & Verify - the requirements do not add up
+        storage.check_free_space([(self.working_dir, 60), (storage_dir, 100)])
+        self.assertEqual(mock_free_space.call_args_list, [mock.call(self.working_dir)])
+
+    def test_same_filesystem(self):
+        self.assertTrue(storage.same_filesystem(
+            os.path.join(self.working_dir, 'a', 'b'), self.working_dir))
+        self.assertFalse(storage.same_filesystem(self.working_dir, '/proc/self'))
+
+    @mock.patch('pulp_deb.plugins.importers.storage.free_space')
+    def test_check_free_space_insufficient(self, mock_free_space):
+        # Setup
+        mock_free_space.return_value = 100
+
+        # Test
+        try:
+            storage.check_free_space([(self.working_dir, 60), (self.working_dir, 101)])
+            self.fail()
+        except storage.InsufficientSpaceException, e:
+            # Verify
+            self.assertEqual((e.path, e.required, e.available), (self.working_dir, 101, 100))
+            self.assertTrue('101' in str(e))
+
+    def test_preallocate(self):
+        # Setup
+        f = open(os.path.join(self.working_dir, 'a.deb'), 'wb')
+
+        # Test
+        storage.preallocate(f, 1024 * 1024)
+        f.write('package')
+        f.close()
+
+        # Verify - the size of the file is left alone
+        self.assertEqual(os.path.getsize(f.name), 7)
+
+    @mock.patch('pulp_deb.plugins.importers.storage._libc')
+    def test_preallocate_unsupported(self, mock_libc):
+        # Setup
+        mock_libc.return_value = object()
+        f = open(os.path.join(self.working_dir, 'a.deb'), 'wb')
+
+        # Test & Verify
+        self.assertFalse(storage.preallocate(f, 1024))
+        f.close()
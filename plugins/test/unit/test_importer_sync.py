@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2012 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public
+# License as published by the Free Software Foundation; either version
+# 2 of the License (GPLv2) or (at your option) any later version.
+# There is NO WARRANTY for this software, express or implied,
+# including the implied warranties of MERCHANTABILITY,
+# NON-INFRINGEMENT, or FITNESS FOR A PARTICULAR PURPOSE. You should
+# have received a copy of GPLv2 along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pulp.plugins.config import PluginCallConfiguration
+from pulp.plugins.model import Repository
+
+from pulp_deb.common import constants, samples
+from pulp_deb.plugins.importers import sync
+from pulp_deb.plugins.importers.downloaders import exceptions
+
+
+class FakeDownloader(object):
+    """
+    Retrieves the files of the given resources into the working directory,
+    except those whose name is listed in failing, which fail with a
+    transient error.
+    """
+
+    def __init__(self, working_dir, failing):
+        self.working_dir = working_dir
+        self.failing = failing
+
+    def download_resources(self, resources, progress_report, raise_on_error=True):
+        for resource in resources:
+            if resource['name'] in self.failing:
+                resource['error'] = exceptions.TransferException(resource['url'], 'reset')
+                continue
+
+            resource['path'] = os.path.join(self.working_dir, resource['name'])
+            f = open(resource['path'], 'w')
+            f.write('x' * int(resource['size']))
+            f.close()
+            resource['temporary'] = True
+            progress_report.add_finished_bytes(int(resource['size']))
+
+
+class AddNewPackagesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp(prefix='sync-tests')
+        self.storage_dir = os.path.join(self.working_dir, 'storage')
+        repo = Repository('test-repo', working_dir=self.working_dir)
+
+        conduit = mock.MagicMock()
+        conduit.init_unit.side_effect = lambda type_id, key, metadata, path: \
+            mock.MagicMock(storage_path=os.path.join(self.storage_dir, path))
+
+        config = PluginCallConfiguration(
+            {constants.CONFIG_DIST: samples.get_repo(load_model=False)}, {})
+        self.run = sync.PackageSyncRun(repo, conduit, config, lambda: False)
+        self.run.progress_report.packages_finished_count = 0
+        self.run.progress_report.packages_error_count = 0
+
+        resources = self.run.dist.get_indexes()
+        for resource in resources:
+            resource['path'] = resource['url'][len('file://'):]
+        self.run.dist.update_from_resources(resources)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_add_new_packages_retried_bytes(self):
+        # Setup - one of the files of the source package fails
+        package = [p for p in self.run.dist.packages if p.package_type == 'source'][0]
+        names = [f['name'] for f in package.files]
+        self.assertTrue(len(names) > 1)
+        report = self.run.progress_report
+        report.set_packages_total_bytes(package.size)
+        downloader = FakeDownloader(self.working_dir, names[-1:])
+
+        # Test
+        retry_packages = self.run._add_new_packages(downloader, [package])
+
+        # Verify - the files retrieved are retrieved again with the retry
+        self.assertEqual(retry_packages, [package])
+        self.assertEqual(report.packages_finished_bytes, 0)
+        self.assertEqual(report.packages_finished_count, 0)
+
+        # Test - it fails again on the final attempt
+        retry_packages = self.run._add_new_packages(downloader, [package], final=True)
+
+        # Verify
+        self.assertEqual(retry_packages, [])
+        self.assertEqual(report.packages_finished_bytes, report.packages_total_bytes)
+        self.assertEqual(report.packages_error_count, 1)
+
+    def test_add_new_packages_retried_bytes_recovered(self):
+        # Setup
+        package = [p for p in self.run.dist.packages if p.package_type == 'source'][0]
+        names = [f['name'] for f in package.files]
+        report = self.run.progress_report
+        report.set_packages_total_bytes(package.size)
+        self.run._add_new_packages(FakeDownloader(self.working_dir, names[:1]), [package])
+
+        # Test
+        self.run._add_new_packages(FakeDownloader(self.working_dir, []), [package], final=True)
+
+        # Verify
+        self.assertEqual(report.packages_finished_bytes, report.packages_total_bytes)
+        self.assertEqual(report.packages_finished_count, 1)